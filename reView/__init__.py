@@ -11,6 +11,9 @@ REVIEW_DIR = os.path.dirname(os.path.realpath(__file__))
 REVIEW_DATA_DIR = os.path.join(REVIEW_DIR, "data")
 REVIEW_CONFIG_DIR = os.path.join(os.path.dirname(REVIEW_DIR), "configs")
 TEST_DATA_DIR = os.path.join(os.path.dirname(REVIEW_DIR), "tests", "data")
+REVIEW_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".review", "cache-directory"
+)
 
 # May want to move this somewhere in utils
 UNITS = UnitRegistry()
@@ -5,6 +5,8 @@ Created on Sun Aug 23 16:39:45 2020
 
 @author: travis
 """
+import os
+
 from pathlib import Path
 
 import dash
@@ -12,12 +14,21 @@ import dash_bootstrap_components as dbc
 
 from flask_caching import Cache
 
+from reView import REVIEW_CACHE_DIR
 from reView.layout.layout import layout
+from reView.utils.cache import SharedTableStore
+from reView.utils.jobs import JobQueue
 
 
-DATA_DIR = Path("~/.review/cache-directory").expanduser()
+DATA_DIR = Path(REVIEW_CACHE_DIR)
 DATA_DIR.mkdir(exist_ok=True, parents=True)
 
+# Total disk space (GB) shared by the data caches below
+CACHE_DISK_LIMIT = float(os.environ.get("REVIEW_CACHE_DISK_LIMIT", 8))
+CACHE_TYPE = "reView.utils.cache.ArrowFileSystemCache"
+LOCK_DIR = DATA_DIR.joinpath("locks")
+JOB_WORKERS = int(os.environ.get("REVIEW_JOB_WORKERS", 2))
+
 
 app = dash.Dash(
     __name__,
@@ -35,39 +46,48 @@ for handler in app.logger.handlers:
 # Create simple cache for storing updated supply curve tables
 cache = Cache(
     config={
-        "CACHE_TYPE": "filesystem",
+        "CACHE_TYPE": CACHE_TYPE,
         "CACHE_DIR": DATA_DIR.joinpath("cache"),
-        "CACHE_THRESHOLD": 10,
+        "CACHE_BYTE_LIMIT": 0.2 * CACHE_DISK_LIMIT * 1e9,
     }
 )
 
 # Create another cache for storing filtered supply curve tables
 cache2 = Cache(
     config={
-        "CACHE_TYPE": "filesystem",
+        "CACHE_TYPE": CACHE_TYPE,
         "CACHE_DIR": DATA_DIR.joinpath("cache2"),
-        "CACHE_THRESHOLD": 10,
+        "CACHE_BYTE_LIMIT": 0.2 * CACHE_DISK_LIMIT * 1e9,
     }
 )
 
 # Create another cache for storing filtered supply curve tables
 cache3 = Cache(
     config={
-        "CACHE_TYPE": "filesystem",
+        "CACHE_TYPE": CACHE_TYPE,
         "CACHE_DIR": DATA_DIR.joinpath("cache3"),
-        "CACHE_THRESHOLD": 10,
+        "CACHE_BYTE_LIMIT": 0.2 * CACHE_DISK_LIMIT * 1e9,
     }
 )
 
 # Cache for reeds build out tables
 cache4 = Cache(
     config={
-        "CACHE_TYPE": "filesystem",
+        "CACHE_TYPE": CACHE_TYPE,
         "CACHE_DIR": DATA_DIR.joinpath("cache4"),
-        "CACHE_THRESHOLD": 10,
+        "CACHE_BYTE_LIMIT": 0.1 * CACHE_DISK_LIMIT * 1e9,
     }
 )
 
+# Scenario tables shared by all workers
+table_store = SharedTableStore(
+    DATA_DIR.joinpath("tables"),
+    byte_limit=0.3 * CACHE_DISK_LIMIT * 1e9,
+)
+
+# Background jobs for long composite builds, recalculations and downloads
+job_queue = JobQueue(DATA_DIR.joinpath("jobs"), max_workers=JOB_WORKERS)
+
 # Should we just toss everything in one big cache?
 cache.init_app(server)
 cache2.init_app(server)
@@ -0,0 +1,31 @@
+/*
+ * Restyle maps in the browser.
+ *
+ * The basemap, point size, and reverse color controls only change how a
+ * map looks, so these functions update the figure that is already on the
+ * page instead of asking the server to rebuild it. They are registered by
+ * `reView.components.callbacks.restyle_map_in_browser`.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    map_style: {
+        restyle: function(basemap, pointSize, reverseClicks, figure) {
+            if (!figure || !figure.data) {
+                return window.dash_clientside.no_update;
+            }
+
+            // Copy only what changes, so the (large) data arrays are shared
+            const reverse = (reverseClicks || 0) % 2 === 1;
+            const layout = Object.assign({}, figure.layout);
+            layout.mapbox = Object.assign({}, layout.mapbox, {style: basemap});
+            const data = figure.data.map(function(trace) {
+                const marker = Object.assign({}, trace.marker, {
+                    size: pointSize,
+                    reversescale: reverse
+                });
+                return Object.assign({}, trace, {marker: marker});
+            });
+
+            return Object.assign({}, figure, {data: data, layout: layout});
+        }
+    }
+});
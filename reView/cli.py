@@ -18,6 +18,7 @@ import mapclassify as mc
 from reView.utils.bespoke import batch_unpack_from_supply_curve
 from reView.utils import characterizations, plots
 from reView.utils.functions import find_capacity_column
+from reView.utils.sidecars import write_sidecar
 from reView import __version__, REVIEW_DATA_DIR
 
 logger = logging.getLogger(__name__)
@@ -141,6 +142,30 @@ def unpack_characterizations(
     char_df.to_csv(out_csv, header=True, index=False, mode="x")
 
 
+@main.command()
+@click.argument('project_dir',
+                type=click.Path(exists=True, dir_okay=True, file_okay=False))
+@click.option('--overwrite', default=False,
+              show_default=True,
+              required=False,
+              is_flag=True,
+              help='Rewrite sidecars that are already up to date. '
+                   'Default is False.')
+def make_sidecars(project_dir, overwrite):
+    """
+    Write typed Parquet sidecars for every CSV under PROJECT_DIR so that
+    the first load of each supply curve in reView is fast. Sidecars are
+    otherwise written the first time each CSV is read.
+    """
+
+    csvs = sorted(Path(project_dir).rglob("*.csv"))
+    for csv in tqdm.tqdm(csvs, desc="Writing sidecars"):
+        try:
+            write_sidecar(csv, overwrite=overwrite)
+        except (pd.errors.ParserError, UnicodeDecodeError) as exc:
+            logger.warning("Skipping %s: %s", csv, exc)
+
+
 def validate_breaks_scheme(ctx, param, value):
     # pylint: disable=unused-argument
     """
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 """Common reView callbacks. """
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
 
 from reView.app import app
 from reView.layout.styles import RC_STYLES
@@ -122,3 +122,31 @@ def capacity_print(id_prefix):
         return format_capacity_title(map_capacity, map_selection)
 
     return _capacity_print
+
+
+def restyle_map_in_browser(id_prefix):
+    """Apply the basemap, point size, and reverse color map controls.
+
+    These controls only change how the map looks, so they restyle the
+    figure already in the browser (see "assets/map-style.js") without a
+    request to the server. This method assumes you have the map elements
+    added by `reView.components.divs.above_map_options_div` and
+    `reView.components.divs.below_map_options_div` in your layout.
+
+    Parameters
+    ----------
+    id_prefix : str
+        A string representing the prefix of the map. It is expected that
+        the id of the map is "<id_prefix>_map" and the ids of the controls
+        follow the format "<id_prefix>_map_basemap_options",
+        "<id_prefix>_map_point_size", and "<id_prefix>_map_rev_color".
+    """
+    app.clientside_callback(
+        ClientsideFunction(namespace="map_style", function_name="restyle"),
+        Output(f"{id_prefix}_map", "figure", allow_duplicate=True),
+        Input(f"{id_prefix}_map_basemap_options", "value"),
+        Input(f"{id_prefix}_map_point_size", "value"),
+        Input(f"{id_prefix}_map_rev_color", "n_clicks"),
+        State(f"{id_prefix}_map", "figure"),
+        prevent_initial_call=True,
+    )
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 """Component logic functions."""
-import json
+import hashlib
 
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 
 from reView import Q_
+from reView.app import cache2
+from reView.utils.spatial import SiteIndex
 
 
 def tab_styles(tab_choice, options):
@@ -29,23 +34,19 @@ def tab_styles(tab_choice, options):
     return styles
 
 
-def format_capacity_title(
-    map_capacity, map_selection=None, capacity_col_name="capacity"
-):
+def format_capacity_title(map_capacity, map_selection=None):
     """Calculate total remaining capacity after all filters are applied.
 
     Parameters
     ----------
     map_capacity : str
-        Serialized dictionary containing data. This input will be loaded
-        as a pandas DataFrame and used to calculate capacity.
+        Cache key of the capacity summary of the map table (see
+        `store_capacity`).
     map_selection : dict, optional
-        Dictionary with a "points" key containing a list of the selected
-        points, which have a `customdata` with gid values attached. By
-        default, `None`.
-    capacity_col_name : str, optional
-        Name of column containing capacity values. By default,
-        "print_capacity".
+        Plotly `selectedData` from the map. Box and lasso selections are
+        resolved from their geometry if the summary has site coordinates,
+        otherwise from the `customdata` gid values of the selected
+        points. By default, `None`.
 
     Returns
     -------
@@ -54,22 +55,93 @@ def format_capacity_title(
     str
         Number of selected sites, formatted as a string.
     """
-
     if not map_capacity:
         return "--", "--"
 
-    df = pd.DataFrame(json.loads(map_capacity))
-    if df.empty:
+    summary = cache2.get(map_capacity)
+    if summary is None or summary.empty:
         return "--", "--"
 
+    capacity = summary["capacity"].values
+    sites = summary["sites"].values
     if map_selection:
-        gids = [
-            p.get("customdata", [None])[0] for p in map_selection["points"]     # Unintuitive
-        ]
-        df = df[df["sc_point_gid"].isin(gids)]
+        gids = None
+        if {"latitude", "longitude"}.issubset(summary.columns):
+            gids = _capacity_index(map_capacity).select(map_selection)
 
-    total_capacity = Q_(df[capacity_col_name].sum(), "MW")                      # Q_ is also unintuitive
+        # Grid cells (see reView.utils.lod) are not sites
+        if gids is None:
+            gids = pd.to_numeric(
+                [p.get("customdata", [None])[0]
+                 for p in map_selection.get("points", [])],
+                errors="coerce"
+            )
+            gids = gids[gids >= 0]
+
+        rows = _gid_positions(summary["sc_point_gid"].values, gids)
+        capacity = capacity[rows]
+        sites = sites[rows]
+
+    total_capacity = Q_(capacity.sum(), "MW")
     total_capacity = f"{total_capacity.to_compact():~H.2f}"
-    num_sites = f"{df.shape[0]:,}"
+    num_sites = f"{sites.sum():,}"
 
     return total_capacity, num_sites
+
+
+def store_capacity(df, capacity_col_name="capacity"):
+    """Store the capacity of each site in a map table on the server.
+
+    Only the returned key is sent to the browser, and
+    `format_capacity_title` reads the totals back from the cache.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Map table with "sc_point_gid" and capacity columns. Site
+        "latitude" and "longitude" columns are kept too, if present, so
+        map selections can be resolved from their geometry.
+    capacity_col_name : str, optional
+        Name of column containing capacity values. By default,
+        "capacity".
+
+    Returns
+    -------
+    str
+        Cache key of the capacity summary, which is the same for tables
+        with the same sites and capacities.
+    """
+    aggs = {
+        "capacity": (capacity_col_name, "sum"),
+        "sites": (capacity_col_name, "size"),
+    }
+    for col in ["latitude", "longitude"]:
+        if col in df:
+            aggs[col] = (col, "first")
+    summary = df.groupby("sc_point_gid", sort=True).agg(**aggs).reset_index()
+
+    sha1 = hashlib.sha1()
+    for col in summary:
+        sha1.update(np.ascontiguousarray(summary[col].values).tobytes())
+    key = f"capacity_{sha1.hexdigest()}"
+    if not cache2.has(key):
+        cache2.set(key, summary, timeout=0)
+
+    return key
+
+
+@lru_cache(maxsize=8)
+def _capacity_index(map_capacity):
+    """Build the spatial index over the sites of a capacity summary."""
+    summary = cache2.get(map_capacity)
+    summary = summary.dropna(subset=["latitude", "longitude"])
+    return SiteIndex.from_frame(summary)
+
+
+def _gid_positions(sorted_gids, gids):
+    """Return the unique positions of gids found in a sorted gid array."""
+    positions = np.searchsorted(sorted_gids, gids)
+    inside = positions < len(sorted_gids)
+    positions = positions[inside]
+    found = sorted_gids[positions] == gids[inside]
+    return np.unique(positions[found])
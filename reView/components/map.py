@@ -10,19 +10,23 @@ import os
 from pathlib import Path
 
 import numpy as np
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from dash import Patch
 from pandas.errors import EmptyDataError
 
 from reView import Q_
 from reView.utils.classes import DiffUnitOptions
 from reView.utils.config import Config
 from reView.utils.constants import COLORS, DEFAULT_LAYOUT
+from reView.utils.figures import compact_figure
 from reView.utils.functions import (
     convert_to_title,
     strip_rev_filename_endings
 )
+from reView.utils.spatial import site_index
 from reView.pages.rev.model import point_filter
 
 logger = logging.getLogger(__name__)
@@ -75,6 +79,45 @@ def make_view(df):
     return view
 
 
+def restyle(style, colorscale, color_range=(None, None)):
+    """Return a partial update that recolors a map without its data.
+
+    The basemap, point size and reverse color controls are applied in the
+    browser instead (see
+    `reView.components.callbacks.restyle_map_in_browser`).
+
+    Parameters
+    ----------
+    style : dict
+        Style state of the map on screen (see `Map.style`).
+    colorscale : str
+        Name of a colorscale in `reView.utils.constants.COLORS`.
+    color_range : tuple, optional
+        User color minimum and maximum (see `ColorRange`). By default,
+        `(None, None)`.
+
+    Returns
+    -------
+    dash.Patch
+        Update for the map figure. Categorical maps keep their discrete
+        colors, so nothing is updated for them.
+    """
+    patch = Patch()
+    if style["category"]:
+        return patch
+
+    data = pd.DataFrame({style["color_var"]: style["range"]})
+    cmin, cmax = ColorRange(data, style["color_var"], style["project"],
+                            *color_range)
+    for i in range(style["traces"]):
+        marker = patch["data"][i]["marker"]
+        marker["colorscale"] = COLORS[colorscale]
+        marker["cmin"] = None if cmin is None else float(cmin)
+        marker["cmax"] = None if cmax is None else float(cmax)
+
+    return patch
+
+
 class Title:
     """Methods for building map and chart titles."""
 
@@ -204,9 +247,11 @@ class Title:
 
     def _apply_aggregation(self, units, agg_type):
         """Return the result of aggregation of the variable."""
-        # Apply map filter
+        # Apply map filter, resolving box and lasso selections from their
+        # geometry since grid cells (see reView.utils.lod) are not sites
         if self.map_selection and len(self.map_selection["points"]) > 0:
-            gids = point_filter(self.map_selection)
+            index = site_index(self.signal_dict["path"])
+            gids = point_filter(self.map_selection, index=index)
             df = self.df[self.df["sc_point_gid"].isin(gids)]
         else:
             df = self.df
@@ -277,6 +322,8 @@ class Title:
 class Map:
     """Methods for building the mapbox scatter plot."""
 
+    COORDINATE_DECIMALS = 5  # About a meter, well below a point's size
+
     def __init__(
         self,
         df,
@@ -322,9 +369,27 @@ class Map:
         msg = f"<{name} object: {param_str}>"
         return msg
 
+    def compact(self, figure):
+        """Return a compact version of a map figure to send to the browser.
+
+        Coordinates are rounded to `COORDINATE_DECIMALS` and other values
+        to display precision (see `reView.utils.figures.compact_figure`).
+
+        Parameters
+        ----------
+        figure : plotly.graph_objs._figure.Figure
+            Map figure from `figure`.
+
+        Returns
+        -------
+        dict
+        """
+        decimals = {"lat": self.COORDINATE_DECIMALS,
+                    "lon": self.COORDINATE_DECIMALS}
+        return compact_figure(figure, decimals=decimals)
+
     def figure(self, point_size, reverse_color=False):
         """Build scatter plot figure."""
-        self.df["text"] = self.hover_text
         if self.df.empty:
             figure = go.Figure()
             figure.update_layout(
@@ -343,7 +408,8 @@ class Map:
 
         elif self.units == "category":
             # Create data object
-            self.df[self.color_var][self.df[self.color_var].isnull()] = "nan"
+            data = self.hover_data
+            data[self.color_var] = data[self.color_var].fillna("nan")
 
             # Check for color mapping
             var = self.color_var.replace("_mode", "")
@@ -356,41 +422,43 @@ class Map:
                     colormap = {lookup[k]: c for k, c in colormap.items()}
 
                 figure = px.scatter_mapbox(
-                    data_frame=self.df,
+                    data_frame=data,
                     color=self.color_var,
                     lon="longitude",
                     lat="latitude",
                     color_discrete_map=colormap,
-                    custom_data=["sc_point_gid", "capacity"],
-                    hover_name="text",
+                    custom_data=self.custom_data,
+                    hover_name=self.hover_name,
                 )
             else:
                 figure = px.scatter_mapbox(
-                    data_frame=self.df,
+                    data_frame=data,
                     color=self.color_var,
                     lon="longitude",
                     lat="latitude",
                     color_discrete_sequence=px.colors.qualitative.Safe,
-                    custom_data=["sc_point_gid", "capacity"],
-                    hover_name="text",
+                    custom_data=self.custom_data,
+                    hover_name=self.hover_name,
                 )
-            figure.update_traces(marker=self.marker(point_size, reverse_color))
+            figure.update_traces(marker=self.marker(point_size, reverse_color),
+                                 hovertemplate=self.hover_template)
         else:
             # Create data object
             figure = px.scatter_mapbox(
-                data_frame=self.df,
+                data_frame=self.hover_data,
                 lon="longitude",
                 lat="latitude",
-                custom_data=["sc_point_gid", "capacity"],
-                hover_name="text",
+                custom_data=self.custom_data,
+                hover_name=self.hover_name,
             )
 
             figure.update_traces(
-                marker=self.marker(point_size, reverse_color)
+                marker=self.marker(point_size, reverse_color),
+                hovertemplate=self.hover_template
             )
 
             if self.demand_data is not None:
-                self.demand_data["text"] = (
+                text = (
                     self.demand_data["sera_node"]
                     + ", "
                     + self.demand_data["State"]
@@ -400,7 +468,7 @@ class Map:
                 )
 
                 fig2 = px.scatter_mapbox(
-                    self.demand_data,
+                    self.demand_data.assign(text=text),
                     lon="longitude",
                     lat="latitude",
                     color_discrete_sequence=["red"],
@@ -420,92 +488,85 @@ class Map:
         return figure
 
     @property
-    def hover_text(self):
-        """Return hover text column."""
-        # Convert NaNs to strings for international projects
-        if "state" in self.df:
-            if self.df["state"].isnull().all():
-                self.df["state"] = ""
-            else:
-                self.df["state"][self.df["state"].isnull()] = "N/A"
-                self.df["state"][self.df["state"] != "nan"] = \
-                    self.df["state"] + ":"
-        else:
-            self.df["state"] = ""
+    def custom_data(self):
+        """Return the numeric columns sent with each point.
+
+        The site ID and capacity always come first, since selections and
+        capacity totals read them by position.
+        """
+        optional = ["hydrogen_annual_kg", "dist_to_selected_load",
+                    "site_count"]
+        return ["sc_point_gid", "capacity"] + [
+            col for col in optional if self._has_values(col)
+        ]
 
-        if "county" in self.df:
-            if self.df["county"].isnull().all():
-                self.df["county"] = ""
-            else:
-                self.df["county"][self.df["county"].isnull()] = "N/A"
-                self.df["county"][self.df["county"] != "nan"] = \
-                    self.df["county"] + " County, "
-        else:
-            self.df["county"] = ""
-
-        # Include demand data fro hydrogen runs
-        if self.demand_data is not None:
-            text = (
-                self.demand_data["sera_node"]
-                + ", "
-                + self.demand_data["State"]
-                + ". <br>Demand:   "
-                + self.demand_data["load"].astype(str)
-                + " kg"
+    @property
+    def hover_data(self):
+        """Return a compact copy of the columns needed to draw the map.
+
+        Counties and states are joined into one "location" label, with
+        missing values labeled "N/A". `self.df` itself is left unchanged.
+        """
+        columns = ["longitude", "latitude", self.color_var, *self.custom_data]
+        data = pd.DataFrame(
+            {col: self.df[col].values for col in dict.fromkeys(columns)}
+        )
+
+        location = []
+        if self._has_values("county"):
+            county = self.df["county"].fillna("N/A").astype(str).values
+            location.append(county + " County")
+        if self._has_values("state"):
+            state = self.df["state"].fillna("N/A").astype(str).values
+            location.append(state + ":")
+        if location:
+            data["location"] = location[0]
+            if len(location) > 1:
+                data["location"] += ", " + location[1]
+
+        return data
+
+    @property
+    def hover_name(self):
+        """Return the column with each point's location label, if any."""
+        return "location" if self._has_location else None
+
+    @property
+    def hover_template(self):
+        """Return the hover template the browser formats hover labels with.
+
+        This replaces a per-point string of formatted HTML with the
+        point's location, custom data (see `custom_data`), and color.
+        """
+        fields = {col: i for i, col in enumerate(self.custom_data)}
+        template = "%{hovertext}" if self._has_location else ""
+
+        # The category is the trace name, numeric values the point color
+        if self.units == "category":
+            return template + "<br>   %{fullData.name} category<extra></extra>"
+
+        if "site_count" in fields:
+            template += (
+                f"<br>    Sites:    %{{customdata[{fields['site_count']}]:,}}"
+                " (mean value)    "
+            )
+        if "hydrogen_annual_kg" in fields:
+            idx = fields["hydrogen_annual_kg"]
+            template += (
+                f"<br>    H2 Supply:    %{{customdata[{idx}]:,}} kg    "
+            )
+        if "dist_to_selected_load" in fields:
+            idx = fields["dist_to_selected_load"]
+            template += (
+                f"<br>    Dist to load:    %{{customdata[{idx}]:,.2f}} km    "
             )
-        elif self.units == "category":
-            try:
-                text = (
-                    self.df["county"]
-                    + self.df["state"]
-                    + "<br>   "
-                    + self.df[self.color_var].astype(str)
-                    + " "
-                    + self.units
-                )
-            except KeyError:
-                text = (
-                    round(self.df[self.color_var], 2).astype(str)
-                    + " "
-                    + self.units
-                )
-        else:
-            extra_str = ""
-            if "hydrogen_annual_kg" in self.df:
-                extra_str += (
-                    "<br>    H2 Supply:    "
-                    + self.df["hydrogen_annual_kg"].apply(lambda x: f"{x:,}")
-                    + " kg    "
-                )
-            if "dist_to_selected_load" in self.df:
-                extra_str += (
-                    "<br>    Dist to load:    "
-                    + self.df["dist_to_selected_load"].apply(
-                        lambda x: f"{x:,.2f}"
-                    )
-                    + " km    "
-                )
 
-            try:
-                text = (
-                    self.df["county"]
-                    + self.df["state"]
-                    + extra_str
-                    + f"<br>    {convert_to_title(self.color_var)}:   "
-                    + self.df[self.color_var].round(2).astype(str)
-                    + " "
-                    + self.units
-                )
-            except KeyError:
-                text = (
-                    extra_str
-                    + f"<br>    {convert_to_title(self.color_var)}:   "
-                    + self.df[self.color_var].round(2).astype(str)
-                    + " "
-                    + self.units
-                )
+        template += (
+            f"<br>    {convert_to_title(self.color_var)}:   "
+            f"%{{marker.color:.2f}} {self.units}<extra></extra>"
+        )
 
-        return text
+        return template
 
     @property
     def layout(self):
@@ -552,11 +613,49 @@ class Map:
 
         return marker
 
+    def style(self, figure):
+        """Return the map state that `restyle` needs to update a figure.
+
+        Parameters
+        ----------
+        figure : plotly.graph_objs._figure.Figure
+            Map figure from `figure`.
+
+        Returns
+        -------
+        dict
+            Project, color variable, whether it is categorical, data range
+            of the color variable, and number of traces in `figure`.
+        """
+        category = self.units == "category"
+        values = self.df[self.color_var]
+        if category or values.empty:
+            data_range = [None, None]
+        else:
+            data_range = [float(values.min()), float(values.max())]
+
+        return {
+            "project": self.project,
+            "color_var": self.color_var,
+            "category": category,
+            "range": data_range,
+            "traces": len(figure.data),
+        }
+
     @property
     def show_legend(self):
         """Boolean switch to show/hide legend."""
         return self.units == "category"
 
+    @property
+    def _has_location(self):
+        """Check if the map table has county or state names."""
+        return self._has_values("county") or self._has_values("state")
+
+    def _has_values(self, col):
+        """Check if a column is in the map table with any values."""
+        return col in self.df and not self.df[col].isnull().all()
+
 
 class ColorRange:
     """Helper class to represent the color range."""
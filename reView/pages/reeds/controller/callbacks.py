@@ -5,7 +5,6 @@ Created on Mon May 23 21:07:15 2022
 
 @author: twillia2
 """
-import json
 import logging
 import os
 
@@ -19,7 +18,9 @@ from reView.app import app
 from reView.components.callbacks import (
     capacity_print,
     display_selected_tab_above_map,
+    restyle_map_in_browser,
 )
+from reView.components.logic import store_capacity
 from reView.components.map import Map
 from reView.pages.reeds.model import cache_reeds
 from reView.utils import calls
@@ -30,6 +31,8 @@ COMMON_CALLBACKS = [
     capacity_print(id_prefix="reeds_2"),
     display_selected_tab_above_map(id_prefix="reeds_1"),
     display_selected_tab_above_map(id_prefix="reeds_2"),
+    restyle_map_in_browser(id_prefix="reeds_1"),
+    restyle_map_in_browser(id_prefix="reeds_2"),
 ]
 CAPACITY_COLUMNS = ["capacity_MW", "built_capacity", "capacity"]
 
@@ -102,25 +105,29 @@ for i in [1, 2]:
         Output(f"reeds_{i}_mapcap", "children"),
         Input(f"project_reeds_{i}", "value"),
         Input("years_reeds", "value"),
-        Input(f"reeds_{i}_map_basemap_options", "value"),
         Input(f"reeds_{i}_map_color_options", "value"),
-        Input(f"reeds_{i}_map_point_size", "value"),
-        Input(f"reeds_{i}_map_rev_color", "n_clicks"),
         Input(f"reeds_{i}_map_color_min", "value"),
         Input(f"reeds_{i}_map_color_max", "value"),
+        State(f"reeds_{i}_map_basemap_options", "value"),
+        State(f"reeds_{i}_map_point_size", "value"),
+        State(f"reeds_{i}_map_rev_color", "n_clicks"),
     )
     @calls.log
     def figure_map_reeds(
         project,
         year,
-        basemap,
         color,
-        point_size,
-        reverse_color_clicks,
         color_ymin,
         color_ymax,
+        basemap,
+        point_size,
+        reverse_color_clicks,
     ):
-        """Return buildout table from single year as map."""
+        """Return buildout table from single year as map.
+
+        The basemap, point size and reverse color controls are applied in
+        the browser (see `restyle_map_in_browser`).
+        """
         # If there is no year, the dropdowns haven't populated yet
         if not year:
             raise PreventUpdate
@@ -151,10 +158,9 @@ for i in [1, 2]:
             point_size=point_size,
             reverse_color=reverse_color_clicks % 2 == 1,
         )
+        figure = mapper.compact(figure)
 
-        mapcap = df[["sc_point_gid", "capacity"]].to_dict()
-
-        return figure, json.dumps(mapcap)
+        return figure, store_capacity(df)
 
     @app.callback(
         Output(f"reeds_{i}_map_below_options", "is_open"),
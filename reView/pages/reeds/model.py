@@ -7,15 +7,17 @@ Created on Mon May 23 21:48:04 2022
 """
 import pandas as pd
 
-from reView.app import cache4
+from reView.app import LOCK_DIR, cache4, table_store
+from reView.utils.cache import single_flight
 
 pd.set_option("mode.chained_assignment", None)
 
 
+@single_flight(LOCK_DIR)
 @cache4.memoize()
 def cache_reeds(path, year):
     """Create table of single year buildout."""
-    df = pd.read_csv(path)
+    df = table_store.load(path, pd.read_csv)
     if year not in df["year"].values:
         df = df[df["year"] == year - 1]
     else:
@@ -21,16 +21,17 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
-from dash import dcc, html, Input, Output, State, ALL
+from dash import dcc, html, no_update, Input, Output, State, ALL
 from dash.exceptions import PreventUpdate
 
-from reView.app import app
+from reView.app import app, job_queue
 from reView.components.callbacks import (
     capacity_print,
     display_selected_tab_above_map,
+    restyle_map_in_browser,
 )
-from reView.components.logic import tab_styles
-from reView.components.map import Map, Title
+from reView.components.logic import store_capacity, tab_styles
+from reView.components.map import Map, Title, restyle
 from reView.layout.options import (
     CHART_OPTIONS,
     COLOR_OPTIONS,
@@ -47,22 +48,36 @@ from reView.pages.rev.model import (
     apply_filters,
     cache_chart_tables,
     cache_map_data,
+    cache_map_pyramid,
     cache_table,
     cache_timeseries,
     calc_least_cost,
+    export_map,
+    map_table_cached,
+    point_filter,
+    prepare_map_table,
     ReCalculatedData
 )
 from reView.pages.rev.view import DEFAULT_PROJECT
 from reView.utils.bespoke import BespokeUnpacker
+from reView.utils.cache import remove_file
+from reView.utils.composite import (
+    CompositeManifest,
+    composite_digest,
+    read_wins
+)
 from reView.utils.constants import SKIP_VARS
+from reView.utils.decimate import store_chart_index
 from reView.utils.functions import (
     convert_to_title,
     callback_trigger,
     read_file,
-    strip_rev_filename_endings,
-    to_geo
+    strip_rev_filename_endings
 )
 from reView.utils.config import Config
+from reView.utils.jobs import report_progress
+from reView.utils.lod import LevelOfDetail, map_view
+from reView.utils.spatial import compact_selection
 from reView.utils import calls
 
 logger = logging.getLogger(__name__)
@@ -71,6 +86,7 @@ logger = logging.getLogger(__name__)
 COMMON_CALLBACKS = [
     capacity_print(id_prefix="rev"),
     display_selected_tab_above_map(id_prefix="rev"),
+    restyle_map_in_browser(id_prefix="rev"),
 ]
 
 
@@ -168,9 +184,14 @@ def build_specs(scenario, project):
 
 def build_spec_split(path, project):
     """Calculate the percentage of each scenario present."""
-    df = cache_table(project, y_var="capacity", x_var="mean_lcoe", path=path)
-    scenarios, counts = np.unique(df["scenario"], return_counts=True)
-    total = df.shape[0]
+    wins = read_wins(path)
+    if wins is not None:
+        scenarios, counts = wins.index.values, wins.values
+    else:
+        df = cache_table(project, y_var="capacity", x_var="mean_lcoe",
+                         path=path)
+        scenarios, counts = np.unique(df["scenario"], return_counts=True)
+    total = counts.sum()
     percentages = [counts[i] / total for i in range(len(counts))]
     percentages = [round(p * 100, 4) for p in percentages]
     pdf = pd.DataFrame({"p": percentages, "s": scenarios})
@@ -233,9 +254,10 @@ def composite_fname(paths, composite_function, composite_variable):
     if len(tag) > 75:
         tag = hashlib.sha1(str.encode(str(paths))).hexdigest()
 
-    # Build full file name
+    # Build full file name, with a digest so that similar names can't clash
+    digest = composite_digest(paths, composite_function, composite_variable)
     identifier = f"{composite_function}_{composite_variable}_{tag}"
-    fname = f"composite_{identifier}_supply-curve.csv"
+    fname = f"composite_{identifier}_{digest[:8]}_supply-curve.csv"
 
     return fname
 
@@ -320,6 +342,18 @@ def files_to_dropdown(files):
     return scenario_options
 
 
+def job_message(label, status=None):
+    """Describe the progress of a background job."""
+    if status is None or status["status"] == "queued":
+        return f"{label}: waiting to start..."
+    if status["status"] == "running":
+        progress = round(100 * status.get("progress", 0))
+        return f"{label}: {progress}% done..."
+    if status["status"] == "failed":
+        return f"{label} failed: {status.get('error')}"
+    return f"{label}: {status['status']}"
+
+
 @calls.log
 def options_chart_type(project, y_var=None):
     """Add characterization plot option, if necessary."""
@@ -382,7 +416,9 @@ def download_chart(chart_info):
 
 # pylint: disable=too-many-locals
 @app.callback(
-    Output("download_map", "data"),
+    Output("download_job", "children"),
+    Output("download_job_interval", "disabled"),
+    Output("job_status", "children", allow_duplicate=True),
     Input("rev_map_download_button", "n_clicks"),
     State("map_signal", "children"),
     State("project", "value"),
@@ -391,25 +427,15 @@ def download_chart(chart_info):
     State("variable", "value"),
     State("rev_chart_x_var_options", "value"),
     State("rev_chart_options", "value"),
+    State("rev_chart_index", "children"),
     prevent_initial_call=True
 )
 @calls.log
 def download_map(__, signal, project, map_selection, chart_selection, y_var,
-                 x_var, chart_type):
-    """Download geopackage file from map."""
-    # Retrieve the data frame
+                 x_var, chart_type, chart_key):
+    """Start building a geopackage file from the map in the background."""
     signal_dict = json.loads(signal)
-    df = cache_map_data(signal_dict)
-    df = apply_all_selections(
-        df=df,
-        signal_dict=signal_dict,
-        project=project,
-        chart_selection=chart_selection,
-        map_selection=map_selection,
-        y_var=y_var,
-        x_var=x_var,
-        chart_type=chart_type
-    )
+    signal_dict["project"] = project
 
     # Create the table name
     name = os.path.splitext(os.path.basename(signal_dict["path"]))[0]
@@ -417,14 +443,60 @@ def download_map(__, signal, project, map_selection, chart_selection, y_var,
         name2 = os.path.splitext(os.path.basename(signal_dict["path2"]))[0]
         name = f"{name}_vs_{name2}_diff"
 
-    # Build geopackage and send it
+    # Build the geopackage in a job, download_map_job sends it
     layer = f"review_{name}_{y_var}"
-    with tempfile.NamedTemporaryFile() as tmp:
+    with tempfile.NamedTemporaryFile(dir=job_queue.downloads,
+                                     suffix=".gpkg", delete=False) as tmp:
         dst = tmp.name
-        fname = layer + ".gpkg"
-        to_geo(df, dst, layer)
+    job_id = job_queue.submit(
+        export_map,
+        signal_dict,
+        dst,
+        layer,
+        map_selection=compact_selection(map_selection),
+        chart_selection=chart_selection,
+        y_var=y_var,
+        x_var=x_var,
+        chart_type=chart_type,
+        chart_key=chart_key
+    )
+
+    job = {"id": job_id, "label": "Building download", "fname": layer,
+           "dst": dst}
+    return json.dumps(job), False, job_message(job["label"])
+
 
-        return dcc.send_file(dst, fname)
+@app.callback(
+    Output("download_map", "data"),
+    Output("download_job_interval", "disabled", allow_duplicate=True),
+    Output("job_status", "children", allow_duplicate=True),
+    Input("download_job_interval", "n_intervals"),
+    State("download_job", "children"),
+    prevent_initial_call=True
+)
+@calls.log
+def download_map_job(__, job):
+    """Send the map geopackage once its job is done."""
+    if not job:
+        return no_update, True, no_update
+
+    job = json.loads(job)
+    status = job_queue.status(job["id"])
+    if status["status"] in ("queued", "running"):
+        return no_update, False, job_message(job["label"], status)
+    if status["status"] != "done":
+        remove_file(job["dst"])
+        return no_update, True, job_message(job["label"], status)
+
+    # The interval may fire again before it is disabled, by which time
+    # the file has already been sent and removed
+    dst = status["result"]
+    try:
+        data = dcc.send_file(dst, job["fname"] + ".gpkg")
+    except FileNotFoundError:
+        return no_update, True, no_update
+    remove_file(dst)
+    return data, True, ""
 
 
 @app.callback(
@@ -886,6 +958,7 @@ def dropdown_x_variables(
     Output("rev_chart", "figure"),
     Output("rev_chart_loading", "style"),
     Output("download_info_chart", "children"),
+    Output("rev_chart_index", "children"),
     Input("rev_chart_options", "value"),
     Input("rev_map", "selectedData"),
     Input("rev_chart_point_size", "value"),
@@ -998,16 +1071,30 @@ def figure_chart(
         tmp_dir = config.directory.joinpath("temp")
         tmp_dir.mkdir(exist_ok=True)
         tmp_path = str(tmp_dir.joinpath("temp_chart.csv"))
-        df = fig_to_df(fig)
+
+        # Box plots are drawn from statistics and large cumulative sum
+        # and scatter charts are decimated, but download every value
+        if chart_type == "box":
+            df = fig_to_df(plotter.box(y_var, statistics=False))
+        elif chart_type == "cumsum":
+            df = fig_to_df(plotter.cumulative_sum(x_var, y_var,
+                                                  decimated=False))
+        elif chart_type == "scatter":
+            df = fig_to_df(plotter.scatter(x_var, y_var, decimated=False))
+        else:
+            df = fig_to_df(fig)
         df.to_csv(tmp_path, index=False)
 
+    fig = plotter.compact(fig)
+
     # Package returns
+    chart_key = store_chart_index(plotter.chart_points)
     loading_style = {"margin-right": "500px"}
     download_info = json.dumps(
         {"path": "review_chart_data.csv", "tmp_path": tmp_path}
     )
 
-    return fig, loading_style, download_info
+    return fig, loading_style, download_info, chart_key
 
 
 # pylint: disable=too-many-arguments,too-many-locals,unused-argument
@@ -1015,37 +1102,59 @@ def figure_chart(
     Output("rev_map", "figure"),
     Output("rev_mapcap", "children"),
     Output("rev_map_loading", "style"),
-    Input("rev_map_basemap_options", "value"),
-    Input("rev_map_color_options", "value"),
+    Output("rev_map_lod", "children"),
+    Output("rev_map_style", "children"),
     Input("rev_chart", "selectedData"),
-    Input("rev_map_point_size", "value"),
-    Input("rev_map_rev_color", "n_clicks"),
-    Input("rev_map_color_min", "value"),
-    Input("rev_map_color_max", "value"),
     Input("rev_map", "selectedData"),
     Input("rev_map", "clickData"),
     Input("map_signal", "children"),
+    Input("rev_map", "relayoutData"),
     State("map_function", "value"),
     State("rev_chart_x_var_options", "value"),
-    State("rev_chart_options", "value")
+    State("rev_chart_options", "value"),
+    State("rev_map_lod", "children"),
+    State("rev_map_basemap_options", "value"),
+    State("rev_map_color_options", "value"),
+    State("rev_map_point_size", "value"),
+    State("rev_map_rev_color", "n_clicks"),
+    State("rev_map_color_min", "value"),
+    State("rev_map_color_max", "value"),
+    State("rev_chart_index", "children")
 )
 @calls.log
 def figure_map(
-    basemap,
-    color,
     chart_selection,
-    point_size,
-    reverse_color_clicks,
-    color_ymin,
-    color_ymax,
     map_selection,
     map_click,
     signal,
+    relayout,
     map_function,
     x_var,
-    chart_type
+    chart_type,
+    lod_state,
+    basemap,
+    color,
+    point_size,
+    reverse_color_clicks,
+    color_ymin,
+    color_ymax,
+    chart_key=None
 ):
-    """Make the scatter plot map."""
+    """Make the scatter plot map.
+
+    Maps with more sites than `reView.utils.lod.MAX_POINTS` are drawn
+    from aggregated grid cells, or from just the sites in view once they
+    fit. Panning and zooming only redraw the map when that changes.
+    Style controls are applied to the current figure by `restyle_map` and
+    `restyle_map_in_browser`.
+    """
+    # Pans and zooms only matter if the map is drawn at a level of detail
+    view = map_view(relayout)
+    lod_state = json.loads(lod_state) if lod_state else None
+    if "relayoutData" in callback_trigger():
+        if view is None or lod_state is None:
+            raise PreventUpdate
+
     # Unpack signal and retrieve data frame
     signal_dict = json.loads(signal)
     df = cache_map_data(signal_dict)
@@ -1072,17 +1181,22 @@ def figure_map(
         map_selection=map_selection,
         y_var=y_var,
         x_var=x_var,
-        chart_type=chart_type
+        chart_type=chart_type,
+        chart_key=chart_key
     )
 
     # Apply filters again for characterizations
     filters = signal_dict["filters"]
     df = apply_filters(df, filters)
 
-    # Unpack bespoke turbines if needed
-    if "clickData" in callback_trigger() and "turbine_y_coords" in df:
+    # Unpack bespoke turbines if needed (grid cells are not sites)
+    unpacked = False
+    clicked = point_filter(map_click=map_click) if map_click else []
+    if ("clickData" in callback_trigger() and "turbine_y_coords" in df
+            and df["sc_point_gid"].isin(clicked).any()):
         unpacker = BespokeUnpacker(df, map_click)
         df = unpacker.unpack_turbines()
+        unpacked = True
 
     # Use demand counts if available
     if "demand_connect_count" in df:
@@ -1090,6 +1204,16 @@ def figure_map(
     else:
         color_var = y_var
 
+    # Choose what to draw for this view, using the cached pyramid if the
+    # table is the cached map table
+    lod = LevelOfDetail(df, color_var)
+    if "relayoutData" in callback_trigger():
+        if not lod.needs_update(lod_state, view):
+            raise PreventUpdate
+    if lod.enabled and not (chart_selection or map_selection or unpacked):
+        lod.pyramid = cache_map_pyramid(signal_dict, color_var)
+    map_df, lod_state = lod.render(view)
+
     # Build the title
     title_builder = Title(df, signal_dict, color_var, project,
                           map_selection=map_selection)
@@ -1097,7 +1221,7 @@ def figure_map(
 
     # Build figure
     map_builder = Map(
-        df=df,
+        df=map_df,
         color_var=color_var,
         plot_title=title,
         project=project,
@@ -1110,13 +1234,40 @@ def figure_map(
         point_size=point_size,
         reverse_color=reverse_color_clicks % 2 == 1,
     )
-    mapcap = df[["sc_point_gid", "capacity"]].to_dict()
+
+    # Keep the user's view when the map is redrawn for it
+    figure.update_layout(uirevision=project)
+    style = map_builder.style(figure)
+    figure = map_builder.compact(figure)
 
     # Package returns
-    mapcap = json.dumps(mapcap)
+    mapcap = store_capacity(df)
     loading_style = {"margin-right": "500px"}
 
-    return figure, mapcap, loading_style
+    return (figure, mapcap, loading_style, json.dumps(lod_state),
+            json.dumps(style))
+
+
+@app.callback(
+    Output("rev_map", "figure", allow_duplicate=True),
+    Input("rev_map_color_options", "value"),
+    Input("rev_map_color_min", "value"),
+    Input("rev_map_color_max", "value"),
+    State("rev_map_style", "children"),
+    prevent_initial_call=True
+)
+@calls.log
+def restyle_map(color, color_ymin, color_ymax, style):
+    """Recolor the scatter plot map without redrawing its data.
+
+    The other style controls are applied in the browser (see
+    `restyle_map_in_browser`).
+    """
+    if not style:
+        raise PreventUpdate
+
+    return restyle(json.loads(style), colorscale=color,
+                   color_range=(color_ymin, color_ymax))
 
 
 # pylint: disable=too-many-arguments,unused-argument
@@ -1131,7 +1282,8 @@ def figure_map(
     Input("rev_chart", "selectedData"),
     Input("rev_map", "selectedData"),
     Input("rev_map", "clickData"),
-    State("project", "value")
+    State("project", "value"),
+    State("rev_chart_index", "children")
 )
 @calls.log
 def figure_timeseries(
@@ -1143,7 +1295,8 @@ def figure_timeseries(
         chart_selection,
         map_selection,
         map_click,
-        project
+        project,
+        chart_key=None
     ):
     """Render timeseries plots if possible."""
     # read in signal
@@ -1168,9 +1321,10 @@ def figure_timeseries(
         try:
             data = cache_timeseries(
                 file,
-                map_selection,
+                compact_selection(map_selection),
                 chart_selection,
-                map_click
+                map_click,
+                chart_key
             )
         except (KeyError, ValueError) as exc:
             raise PreventUpdate from exc
@@ -1481,6 +1635,9 @@ def retrieve_filters(__, ___, var1, var2, var3, var4, q1, q2, q3, q4):
     Output("map_signal", "children"),
     Output("pca_plot_1", "clickData"),
     Output("pca_plot_2", "clickData"),
+    Output("signal_job", "children"),
+    Output("signal_job_interval", "disabled"),
+    Output("job_status", "children"),
     Input("submit", "n_clicks"),
     Input("rev_map_state_options", "value"),
     Input("rev_map_region_options", "value"),
@@ -1537,7 +1694,11 @@ def retrieve_signal(
     pca_plot_value,
     pca_plot_region,
 ):
-    """Create signal for sharing data between map and chart with dependence."""
+    """Create signal for sharing data between map and chart with dependence.
+
+    Composite builds and recalculations run as background jobs, in which
+    case the signal is sent by `retrieve_signal_job` once the job is done.
+    """
     # The first call is sometimes triggered before the initial project is set
     if project is None:
         raise PreventUpdate
@@ -1556,6 +1717,9 @@ def retrieve_signal(
     if recalc_table:
         recalc_table = json.loads(recalc_table)
 
+    # Long builds run in the background
+    job = None
+
     # If 'least cost', build the composite dataset
     lowest_scenario_open = (
         composite_div_style
@@ -1572,11 +1736,21 @@ def retrieve_signal(
 
         fname = composite_fname(paths, composite_function, composite_variable)
 
-        # Build full paths and create the target file
+        # Build full paths and create the target file, unless it's current
         dst = config.directory.joinpath("review_outputs", fname)
         dst.parent.mkdir(parents=True, exist_ok=True)
-        calc_least_cost(paths, dst, composite_function=composite_function,
-                        composite_variable=composite_variable)
+        manifest = CompositeManifest(dst.parent)
+        if not manifest.is_current(dst, paths, composite_function,
+                                   composite_variable):
+            job_id = job_queue.submit(
+                calc_least_cost,
+                paths,
+                dst,
+                composite_function=composite_function,
+                composite_variable=composite_variable,
+                progress=report_progress
+            )
+            job = {"id": job_id, "label": "Building composite"}
 
         if composite_plot_value == "Variable":
             y = composite_variable
@@ -1661,7 +1835,41 @@ def retrieve_signal(
             "y": y
         }
 
-    return json.dumps(signal), None, None
+        # Recalculating tables can take a while, unless they are cached
+        if recalc == "on" and not map_table_cached(signal):
+            job_id = job_queue.submit(prepare_map_table, signal)
+            job = {"id": job_id, "label": "Recalculating"}
+
+    if job is None:
+        return json.dumps(signal), None, None, None, True, ""
+
+    job["signal"] = signal
+    message = job_message(job["label"])
+    return no_update, None, None, json.dumps(job), False, message
+
+
+@app.callback(
+    Output("map_signal", "children", allow_duplicate=True),
+    Output("signal_job_interval", "disabled", allow_duplicate=True),
+    Output("job_status", "children", allow_duplicate=True),
+    Input("signal_job_interval", "n_intervals"),
+    State("signal_job", "children"),
+    prevent_initial_call=True
+)
+@calls.log
+def retrieve_signal_job(__, job):
+    """Send the signal from `retrieve_signal` once its job is done."""
+    if not job:
+        return no_update, True, no_update
+
+    job = json.loads(job)
+    status = job_queue.status(job["id"])
+    if status["status"] in ("queued", "running"):
+        return no_update, False, job_message(job["label"], status)
+    if status["status"] != "done":
+        return no_update, True, job_message(job["label"], status)
+
+    return json.dumps(job["signal"]), True, ""
 
 
 @app.callback(
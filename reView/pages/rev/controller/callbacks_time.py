@@ -58,6 +58,7 @@ from reView.pages.rev.model import (
     ReCalculatedData
 )
 from reView.utils.bespoke import BespokeUnpacker
+from reView.utils.composite import composite_digest, read_wins
 from reView.utils.constants import SKIP_VARS
 from reView.utils.functions import (
     convert_to_title,
@@ -92,9 +93,14 @@ def build_specs(scenario, project):
 
 def build_spec_split(path, project):
     """Calculate the percentage of each scenario present."""
-    df = cache_table(project, y_var="capacity", x_var="mean_lcoe", path=path)
-    scenarios, counts = np.unique(df["scenario"], return_counts=True)
-    total = df.shape[0]
+    wins = read_wins(path)
+    if wins is not None:
+        scenarios, counts = wins.index.values, wins.values
+    else:
+        df = cache_table(project, y_var="capacity", x_var="mean_lcoe",
+                         path=path)
+        scenarios, counts = np.unique(df["scenario"], return_counts=True)
+    total = counts.sum()
     percentages = [counts[i] / total for i in range(len(counts))]
     percentages = [round(p * 100, 4) for p in percentages]
     pdf = pd.DataFrame(dict(p=percentages, s=scenarios))
@@ -177,9 +183,10 @@ def composite_fname(paths, composite_function, composite_variable):
     else:
         tag = hashlib.sha1(str.encode(str(paths))).hexdigest()
 
-    # Build full file name
+    # Build full file name, with a digest so that similar names can't clash
+    digest = composite_digest(paths, composite_function, composite_variable)
     identifier = f"{composite_function}_{composite_variable}_{tag}"
-    fname = f"composite_{identifier}_supply-curve.csv"
+    fname = f"composite_{identifier}_{digest[:8]}_supply-curve.csv"
 
     return fname
 
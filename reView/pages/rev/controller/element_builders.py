@@ -11,17 +11,31 @@ Created on Fri May 20 12:07:29 2022
 """
 import copy
 import datetime as dt
-import json
+import hashlib
 from collections import Counter
 from itertools import cycle
 
 import pandas as pd
 import numpy as np
 import plotly.express as px
-
+import plotly.graph_objects as go
+
+from reView.app import cache2
+from reView.utils.binning import (
+    bin_edges,
+    box_statistics,
+    group_codes,
+    grouped_counts,
+    grouped_means,
+    lower_edge_index,
+    upper_edge_index
+)
+from reView.utils.characterizations import CharacterizationMatrix
 from reView.utils.classes import DiffUnitOptions
 from reView.utils.config import Config
 from reView.utils.constants import DEFAULT_POINT_SIZE, DEFAULT_LAYOUT
+from reView.utils.decimate import MAX_POINTS, decimate
+from reView.utils.figures import compact_figure
 from reView.utils.functions import convert_to_title
 
 
@@ -29,6 +43,33 @@ CHART_LAYOUT = copy.deepcopy(DEFAULT_LAYOUT)
 CHART_LAYOUT.update({"legend_title_font_color": "black"})
 
 
+def _box_statistics(scenario, df, y_var):
+    """Return a scenario's box statistics and sampled outlier rows.
+
+    Statistics are cached for each version of a scenario's variable, so
+    charts are redrawn (e.g., with a new point size) without computing
+    them again.
+    """
+    columns = [y_var, "sc_point_gid", "capacity"]
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).values
+    sha1 = hashlib.sha1(f"{scenario}/{y_var}".encode())
+    sha1.update(hashes.tobytes())
+    key = f"box_{sha1.hexdigest()}"
+
+    cached = cache2.get(key)
+    if cached is None:
+        stats, outliers = box_statistics(df[y_var].values)
+        if stats is None:
+            return None, None
+        cached = {
+            "stats": pd.DataFrame([stats]),
+            "outliers": df[columns].iloc[outliers].reset_index(drop=True),
+        }
+        cache2.set(key, cached)
+
+    return cached["stats"].iloc[0], cached["outliers"]
+
+
 def _fix_doubles(df):
     """Check and/or fix columns names when they match."""
     if not isinstance(df, pd.core.frame.Series):
@@ -64,14 +105,23 @@ class Plots:
         point_size=DEFAULT_POINT_SIZE,
         user_scale=(None, None),
         alpha=1,
+        max_points=MAX_POINTS,
     ):
-        """Initialize plotting object for a reV project."""
+        """Initialize plotting object for a reV project.
+
+        Cumulative sum and scatter charts with more than `max_points`
+        points are decimated (see `reView.utils.decimate`). The x, y, and
+        "sc_point_gid" of every point of the last of these charts are
+        kept in `chart_points`, to resolve selections against.
+        """
         self.datasets = datasets
         self.plot_title = plot_title
         self.point_size = point_size
         self.user_scale = user_scale
         self.alpha = alpha
+        self.max_points = max_points
         self.config = Config(project)
+        self.chart_points = None
 
     def __repr__(self):
         """Print representation string."""
@@ -81,27 +131,20 @@ class Plots:
     def binned(self, x_var, y_var, bins=100):
         """Return a line plot."""
         # The clustered scatter plot part
-        main_df = None
-        for key, df in self.datasets.items():
-            df = _fix_doubles(df)
-            if main_df is None:
-                df = df.sort_values(x_var)
-                main_df = df.copy()
-                main_df[self.GROUP] = key
-            else:
-                df[self.GROUP] = key
-                df = df.sort_values(x_var)
-                main_df = pd.concat([main_df, df])
+        main_df = pd.concat(
+            [
+                _fix_doubles(df).assign(**{self.GROUP: key})
+                for key, df in self.datasets.items()
+            ]
+        )
 
-        # Assign bins as max bin value
+        # Assign bins as max bin value, with the mean y value of each bin
         main_df = self._assign_bins(main_df, y_var, x_var, bins)
+        main_df = main_df.sort_values([x_var, self.GROUP], kind="stable")
+        main_df["yagg"] = main_df["ybin"]
 
         # The simpler line plot part
-        main_df = main_df.sort_values([x_var, self.GROUP])
-        grouped_by_x = main_df.groupby(["xbin", self.GROUP])
-        main_df["yagg"] = grouped_by_x[y_var].transform("mean")
-        line_df = main_df.copy()
-        line_df = line_df[["xbin", "yagg", self.GROUP]].drop_duplicates()
+        line_df = main_df[["xbin", "yagg", self.GROUP]].drop_duplicates()
 
         xtitle, ytitle = self._axis_title(x_var), self._axis_title(y_var)
 
@@ -140,8 +183,14 @@ class Plots:
 
         return self._update_fig_layout(fig, y_var)
 
-    def box(self, y_var):
-        """Return a box plot."""
+    def box(self, y_var, statistics=True):
+        """Return a box plot.
+
+        By default, boxes are drawn from statistics computed here, with a
+        sample of each scenario's outliers, rather than from every value
+        (see `reView.utils.binning.box_statistics`). Set `statistics` to
+        `False` to send every value to plotly instead.
+        """
 
         units = self.config.units.get(
             DiffUnitOptions.remove_from_variable_name(y_var), ""
@@ -153,6 +202,9 @@ class Plots:
                 key = str(key) + units
             return key
 
+        if statistics:
+            return self._box_from_statistics(y_var, fix_key)
+
         # Infer the y variable and units
         dfs = self.datasets
         df = dfs[list(dfs.keys())[0]]
@@ -198,17 +250,12 @@ class Plots:
     def char_hist(self, x_var):
         """Make a histogram of the characterization column."""
         main_df = list(self.datasets.values())[0]
-        counts = {}
-        for str_dict in main_df[x_var]:
-            if not isinstance(str_dict, str):
-                continue
-            counts_for_sc_point = json.loads(str_dict)
-            for label, count in counts_for_sc_point.items():
-                counts[label] = counts.get(label, 0) + count
+        matrix = CharacterizationMatrix.from_series(main_df[x_var])
+        counts = matrix.sums()
+        counts = counts.iloc[np.argsort(-counts.values, kind="stable")]
 
-        labels = sorted(counts, key=lambda k: -counts[k])
-        areas = [(counts[label] * 90 * 90) / 1_000_000 for label in labels]
-        labels = [str(int(float(label))) for label in labels]
+        areas = list((counts.values * 90 * 90) / 1_000_000)
+        labels = [str(int(float(label))) for label in counts.index]
 
         lookup = None
         if "lookup" in self.config.characterization_cols[x_var]:
@@ -261,8 +308,30 @@ class Plots:
 
         return self._update_fig_layout(fig)
 
-    def cumulative_sum(self, x_var, y_var):
-        """Return a cumulative capacity scatter plot."""
+    def compact(self, fig):
+        """Return a compact version of a chart to send to the browser.
+
+        Parameters
+        ----------
+        fig : plotly.graph_objs._figure.Figure | None
+            Chart from `figure`.
+
+        Returns
+        -------
+        dict | None
+            Compact figure (see `reView.utils.figures.compact_figure`), or
+            `None` if there is no chart.
+        """
+        if fig is None:
+            return fig
+        return compact_figure(fig)
+
+    def cumulative_sum(self, x_var, y_var, decimated=True):
+        """Return a cumulative capacity scatter plot.
+
+        Each curve is drawn from the lowest and highest point in each of
+        a number of capacity buckets, unless `decimated` is `False`.
+        """
         main_df = None
         for key, df in self.datasets.items():
             df = _fix_doubles(df)
@@ -278,7 +347,9 @@ class Plots:
                 main_df = pd.concat([main_df, df])
 
         x_title, y_title = self._axis_title(x_var), self._axis_title(y_var)
-        main_df = main_df.sort_values(self.GROUP)
+        main_df = main_df.sort_values(self.GROUP, kind="stable")
+        main_df = self._decimate(main_df, "cumsum", y_var, "envelope",
+                                 decimated)
         fig = px.scatter(
             main_df,
             x="cumsum",
@@ -360,8 +431,12 @@ class Plots:
 
         return self._update_fig_layout(fig, y_var)
 
-    def scatter(self, x_var, y_var):
-        """Return a regular scatter plot."""
+    def scatter(self, x_var, y_var, decimated=True):
+        """Return a regular scatter plot.
+
+        Large charts are drawn from one point in each cell of a grid over
+        the chart, unless `decimated` is `False`.
+        """
         main_df = None
         for key, df in self.datasets.items():
             df = _fix_doubles(df)
@@ -374,7 +449,8 @@ class Plots:
 
         x_title, y_title = self._axis_title(x_var), self._axis_title(y_var)
 
-        main_df = main_df.sort_values(self.GROUP)
+        main_df = main_df.sort_values(self.GROUP, kind="stable")
+        main_df = self._decimate(main_df, x_var, y_var, "grid", decimated)
         fig = px.scatter(
             main_df,
             x=x_var,
@@ -527,17 +603,80 @@ class Plots:
     def _assign_bins(self, main_df, y_var, x_var, bins):
         """Assign bin values to variable in dataframe."""
         main_df = main_df.dropna(subset=x_var)
-        main_df = main_df.sort_values(x_var)
         minx, maxx = main_df[x_var].min(), main_df[x_var].max()
         xrange = maxx - minx
         bin_size = np.ceil(xrange / bins)
-        bins = np.arange(minx, maxx + bin_size, bin_size)
-        main_df["xbin"] = bins[-1]
-        for xbin in bins[::-1]:
-            main_df["xbin"][main_df[x_var] <= xbin] = xbin
-        grouper = main_df.groupby(["xbin", self.GROUP])
-        main_df["ybin"] = grouper[y_var].transform("mean")
-        return main_df
+        edges = np.arange(minx, maxx + bin_size, bin_size)
+
+        # Each value goes in the bin of the first edge at or above it
+        xbins = upper_edge_index(main_df[x_var].values, edges)
+        codes, names = group_codes(main_df[self.GROUP])
+        means = grouped_means(main_df[y_var].values, xbins, codes,
+                              len(edges), len(names))
+
+        return main_df.assign(xbin=edges[xbins], ybin=means[codes, xbins])
+
+    def _box_from_statistics(self, y_var, fix_key):
+        """Build a box plot from each scenario's box statistics."""
+        keys = list(self.datasets)
+        if all(_is_integer(key) for key in keys):
+            keys = sorted(keys, key=int)
+        else:
+            keys = sorted(keys)
+
+        fig = go.Figure()
+        colors = cycle(px.colors.qualitative.Safe)
+        for key, color in zip(keys, colors):
+            df = _fix_doubles(self.datasets[key])
+            stats, outliers = _box_statistics(key, df, y_var)
+            if stats is None:
+                continue
+
+            # Outliers are points so they can be selected like the map's
+            name = fix_key(key)
+            fig.add_trace(
+                go.Box(
+                    x=[name],
+                    name=name,
+                    legendgroup=name,
+                    q1=[stats["q1"]],
+                    median=[stats["median"]],
+                    q3=[stats["q3"]],
+                    lowerfence=[stats["lowerfence"]],
+                    upperfence=[stats["upperfence"]],
+                    boxpoints=False,
+                    marker={"color": color},
+                )
+            )
+            fig.add_trace(
+                go.Scatter(
+                    x=np.full(len(outliers), name),
+                    y=outliers[y_var].values,
+                    customdata=outliers[["sc_point_gid", "capacity"]].values,
+                    mode="markers",
+                    name=name,
+                    legendgroup=name,
+                    showlegend=False,
+                    marker={"color": color},
+                )
+            )
+
+        fig.update_layout(
+            boxmode="overlay",
+            xaxis_title=self.GROUP,
+            yaxis_title=self._axis_title(y_var),
+        )
+        fig.update_traces(
+            marker={
+                "size": self.point_size,
+                "opacity": 1,
+                "line": {"width": 0}
+            },
+            unselected={"marker": {"color": "grey"}},
+            selector={"type": "scatter"},
+        )
+
+        return self._update_fig_layout(fig, y_var)
 
     def _axis_title(self, var):
         """Make a title out of variable name and units."""
@@ -561,6 +700,20 @@ class Plots:
 
         return " ".join(title)
 
+    def _decimate(self, main_df, x_var, y_var, method, decimated=True):
+        """Keep every chart point and return the points to draw."""
+        self.chart_points = pd.DataFrame(
+            {
+                "x": main_df[x_var].values,
+                "y": main_df[y_var].values,
+                "sc_point_gid": main_df["sc_point_gid"].values,
+            }
+        )
+        if not decimated or self.max_points is None:
+            return main_df
+        return decimate(main_df, x_var, y_var, group_col=self.GROUP,
+                        max_points=self.max_points, method=method)
+
     def _distributions(self, data, y_var, nbins=100):
         """Build a data frame with CDF and PDF curves."""
         data = data.sort_values(y_var)
@@ -577,23 +730,25 @@ class Plots:
         """Build grouped bin count dataframe for histogram."""
         # Get bin ranges for full value range
         main_df = main_df.dropna(subset=y_var)
-        _, xbins = np.histogram(main_df[y_var], bins=bins)
+        values = main_df[y_var].values
+        xbins = bin_edges(values, bins)
         bin_size = np.diff(xbins)[0]
 
-        # Build grouped binned counts
-        df = pd.DataFrame(columns=["count", y_var, "group"])
-        for group, values in main_df.groupby(self.GROUP)[y_var]:
-            sdf = pd.DataFrame({"y": values})
-            sdf[y_var] = sdf["y"].apply(
-                lambda y: [xbin for xbin in xbins[:-1] if y >= xbin][-1]
-            )
-            sdf["count"] = sdf.groupby(y_var)[y_var].transform("count")
-            sdf = sdf[[y_var, "count"]].drop_duplicates()
-            sdf["group"] = group
-            df = pd.concat([df, sdf])
+        # Count each group's values in the shared bins
+        codes, names = group_codes(main_df[self.GROUP])
+        counts = grouped_counts(lower_edge_index(values, xbins), codes,
+                                len(xbins) - 1, len(names))
+        groups, ybins = np.nonzero(counts)
 
         # Add bin size for chart selection filtering later
-        df["bin_size"] = bin_size
+        df = pd.DataFrame(
+            {
+                "count": counts[groups, ybins],
+                y_var: xbins[ybins],
+                "group": names[groups],
+                "bin_size": bin_size,
+            }
+        )
 
         return df
 
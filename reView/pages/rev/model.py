@@ -2,24 +2,40 @@
 """Scenario page data model."""
 import json
 import logging
-import multiprocessing as mp
-import operator
 import os
-import platform
 
-from collections import Counter
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
-from pandarallel import pandarallel as pdl
-from sklearn.neighbors import BallTree
-from sklearn.metrics import DistanceMetric
-from tqdm import tqdm
-
-from reView.app import cache, cache2, cache3, cache4
+from reView.app import (
+    LOCK_DIR,
+    cache,
+    cache2,
+    cache3,
+    cache4,
+    table_store
+)
 from reView.layout.options import REGIONS
+from reView.utils.cache import key_lock, single_flight
+from reView.utils.characterizations import CharacterizationMatrix
+from reView.utils.composite import (
+    CompositeBuilder,
+    CompositeManifest,
+    build_composite,
+    write_rankings
+)
+from reView.utils.constants import MAP_COLUMNS
+from reView.utils.decimate import read_chart_index
+from reView.utils.demand import (
+    allocate_supply,
+    closest_demand_to_coords,
+    demand_connections,
+    filter_on_load_selection
+)
+from reView.utils.filters import filter_columns, filter_mask
+from reView.utils.lod import build_pyramid
 from reView.utils.functions import (
     adjust_cf_for_losses,
     as_float,
@@ -29,35 +45,20 @@ from reView.utils.functions import (
     safe_convert_percentage_to_decimal,
     read_file,
     read_timeseries,
-    strip_rev_filename_endings
+    strip_rev_filename_endings,
+    to_geo
 )
 from reView.utils.config import Config
+from reView.utils.spatial import selection_gids, site_index
 
 
 pd.set_option("mode.chained_assignment", None)
-pdl.initialize(progress_bar=True, verbose=0)
 logger = logging.getLogger(__name__)
 
 
-DIST_METRIC = DistanceMetric.get_metric("haversine")
-
-
 # pylint: disable=too-many-locals, too-many-branches, too-many-statements
 def adjust_capacities(df, project, signal_dict, x_var, chart_selection):
     """Adjust capacities and lcoes for given characterization selection."""
-    def adjust_capacity(row, x_var, cats, res, density):
-        """Keep given categorical capacity, remove the rest."""
-        if not isinstance(row[x_var], float):
-            row[x_var] = json.loads(row[x_var])
-            if row[x_var]:
-                remove = {k: v for k, v in row[x_var].items() if k not in cats}
-                removed_cells = sum(remove.values())
-                removed_km2 = (res * res * removed_cells) / 1_000_000
-                removed_cap = removed_km2 * density
-                row["capacity"] -= removed_cap
-                row["area_sq_km"] -= removed_km2
-        return row
-
     def adjust_lcoe(df, sam, eos):
         """Adjust for economies of scale if possible."""
         # Unpack SAM info
@@ -95,14 +96,14 @@ def adjust_capacities(df, project, signal_dict, x_var, chart_selection):
     density = config.capacity_density
     res = config.resolution
 
-    # Adjust capacities for each row
+    # Keep given categorical capacity, remove the rest
     if res and density:
-        if platform.system() == "Windows":
-            df = df.apply(adjust_capacity, cats=cats, x_var=x_var, res=res,
-                          density=density, axis=1)
-        else:
-            df = df.parallel_apply(adjust_capacity, cats=cats, x_var=x_var,
-                                   res=res, density=density, axis=1)
+        matrix = CharacterizationMatrix.from_series(df[x_var])
+        removed_cells = matrix.removed_cells(cats)
+        removed_km2 = (res * res * removed_cells) / 1_000_000
+        removed_cap = removed_km2 * density
+        df["capacity"] = df["capacity"] - removed_cap
+        df["area_sq_km"] = df["area_sq_km"] - removed_km2
 
         # Adjust LCOEs if possible
         if config.sam and config.eos:
@@ -124,7 +125,8 @@ def adjust_capacities(df, project, signal_dict, x_var, chart_selection):
 
 # pylint: disable=too-many-locals, too-many-branches, too-many-statements
 def apply_all_selections(df, signal_dict, project, chart_selection,
-                         map_selection, y_var, x_var, chart_type):
+                         map_selection, y_var, x_var, chart_type,
+                         chart_key=None):
     """_summary_
 
     Parameters
@@ -141,6 +143,10 @@ def apply_all_selections(df, signal_dict, project, chart_selection,
         _description_
     clicksel : _type_
         _description_
+    chart_key : str, optional
+        Cache key of every point in the chart, to resolve box and lasso
+        chart selections with (see
+        `reView.utils.decimate.store_chart_index`). By default, `None`.
 
     Returns
     -------
@@ -166,11 +172,14 @@ def apply_all_selections(df, signal_dict, project, chart_selection,
                 sdf = df[(df[y_var] >= bottom_bin) & (df[y_var] < top_bin)]
                 sdfs.append(sdf)
             df = pd.concat(sdfs)
-        gids = point_filter(map_selection, chart_selection=None)
+        gids = point_filter(map_selection, chart_selection=None,
+                            index=site_index(signal_dict["path"]))
         if gids:
             df = df[df["sc_point_gid"].isin(gids)]
     else:
-        gids = point_filter(map_selection, chart_selection)
+        gids = point_filter(map_selection, chart_selection,
+                            index=site_index(signal_dict["path"]),
+                            chart_index=read_chart_index(chart_key))
         if gids:
             df = df[df["sc_point_gid"].isin(gids)]
 
@@ -179,24 +188,7 @@ def apply_all_selections(df, signal_dict, project, chart_selection,
 
 def apply_filters(df, filters):
     """Apply filters from string entries to dataframe."""
-
-    ops = {
-        ">=": operator.ge,
-        ">": operator.gt,
-        "<=": operator.le,
-        "<": operator.lt,
-        "==": operator.eq,
-    }
-
-    for filter_ in filters:
-        if filter_:
-            var, operator_, value = filter_.split()
-            if var in df.columns:
-                operator_ = ops[operator_]
-                value = float(value)
-                df = df[operator_(df[var], value)]
-
-    return df
+    return df[filter_mask(df, filters)]
 
 
 def build_name(path):
@@ -208,58 +200,73 @@ def build_name(path):
 
 
 def calc_least_cost(paths, dst, composite_function="min",
-                    composite_variable="total_lcoe"):
-    """Build the single least cost table from a list of tables."""
-    # Not including an overwrite option for now
-    if not os.path.exists(dst):
-
-        # Collect all data frames - biggest lift of all
-        paths = [Path(path) for path in paths]
-        dfs = []
-        ncpu = min([len(paths), mp.cpu_count() - 1])
-        with mp.pool.ThreadPool(ncpu) as pool:
-            for data in tqdm(pool.imap(read_file, paths), total=ncpu):
-                dfs.append(data)
-
-        # Make one big data frame and save
-        data = composite(
-            dfs,
+                    composite_variable="total_lcoe", top_k=3,
+                    content_hash=False, progress=None):
+    """Build the single least cost table from a list of tables.
+
+    The `top_k` scenarios for each point and the number of points each
+    scenario wins are written next to the table (see `ranking_paths`).
+    The table is only rebuilt if it is missing or any of its inputs have
+    changed since it was built, as recorded in the composite manifest of
+    the table's directory (see `CompositeManifest`). `progress` is passed
+    on to `build_composite`. Returns the path to the table.
+    """
+    paths = [Path(path) for path in paths]
+    manifest = CompositeManifest(Path(dst).parent, content_hash)
+    args = (paths, composite_function, composite_variable)
+
+    with key_lock(str(dst), LOCK_DIR):
+        if manifest.is_current(dst, *args):
+            return str(dst)
+
+        # Fold scenarios in one at a time rather than reading them all
+        builder = build_composite(
+            paths,
             composite_function=composite_function,
-            composite_variable=composite_variable
+            composite_variable=composite_variable,
+            k=top_k,
+            progress=progress
         )
-        data.to_csv(dst, index=False)
+        builder.result().to_csv(dst, index=False)
+        write_rankings(builder, dst)
+
+        with key_lock(str(manifest.path), LOCK_DIR):
+            manifest.record(dst, *args)
+
+    return str(dst)
 
 
 # pylint: disable=no-member
 # pylint: disable=unsubscriptable-object
 # pylint: disable=unsupported-assignment-operation
+def cache_raw_table(project, path, recalc_table=None, recalc="off",
+                    columns=None):
+    """Return a single table from the table store shared by all workers."""
+    return table_store.load(path, read_raw_table, project=project,
+                            recalc_table=recalc_table, recalc=recalc,
+                            columns=columns)
+
+
+@single_flight(LOCK_DIR)
 @cache.memoize()
-def cache_table(project, path, y_var, x_var, recalc_table=None, recalc="off"):
-    """Read in just a single table."""
+def cache_char_table(project, path, y_var, x_var, recalc_table=None,
+                     recalc="off", columns=None):
+    """Add modal characterization categories to a single table."""
     # Get config
     config = Config(project)
 
     # Get the table
-    if recalc == "on":
-        data = ReCalculatedData(
-            config=Config(project)).build(
-                path, recalc_table
-        )
-    else:
-        data = read_file(path)
-
-    # We want some consistent fields
-    if "capacity" not in data.columns and "hybrid_capacity" in data.columns:
-        data["capacity"] = data["hybrid_capacity"].copy()
+    data = cache_raw_table(project, path, recalc_table, recalc, columns)
 
     # If characterization, use modal category
     if x_var in config.characterization_cols:
         ncol = x_var + "_mode"
-        cdata = data[(~data[y_var].isnull()) & (data[y_var] != "{}")]
-        odata = data[(data[y_var].isnull()) | (data[y_var] == "{}")]
+        keep = ((~data[y_var].isnull()) & (data[y_var] != "{}")).values
+        modes = CharacterizationMatrix.from_series(data[x_var]).modes()
+        cdata = data[keep]
+        odata = data[~keep]
         odata[ncol] = "nan"
-        cdata[ncol] = cdata[x_var].map(json.loads)
-        cdata[ncol] = cdata[ncol].apply(key_mode)
+        cdata[ncol] = modes[keep]
         if "lookup" in config.characterization_cols[x_var]:
             lookup = config.characterization_cols[x_var]["lookup"]
             cdata[ncol] = cdata[ncol].map(lookup)
@@ -268,11 +275,12 @@ def cache_table(project, path, y_var, x_var, recalc_table=None, recalc="off"):
     # If characterization, use modal category
     if y_var in config.characterization_cols:
         ncol = y_var + "_mode"
-        cdata = data[(~data[y_var].isnull()) & (data[y_var] != "{}")]
-        odata = data[(data[y_var].isnull()) | (data[y_var] == "{}")]
+        keep = ((~data[y_var].isnull()) & (data[y_var] != "{}")).values
+        modes = CharacterizationMatrix.from_series(data[y_var]).modes()
+        cdata = data[keep]
+        odata = data[~keep]
         odata[ncol] = "nan"
-        cdata[ncol] = cdata[x_var].map(json.loads)
-        cdata[ncol] = cdata[ncol].apply(key_mode)
+        cdata[ncol] = modes[keep]
         if "lookup" in config.characterization_cols[y_var]:
             lookup = config.characterization_cols[y_var]["lookup"]
             cdata[ncol] = cdata[ncol].astype(float).astype(int).astype(str)
@@ -282,6 +290,38 @@ def cache_table(project, path, y_var, x_var, recalc_table=None, recalc="off"):
     return data
 
 
+def cache_table(project, path, y_var, x_var, recalc_table=None, recalc="off",
+                columns=None):
+    """Return a single table with any characterization columns needed.
+
+    The table itself is cached once by `cache_raw_table`, and only
+    tables with a characterization variable selected get a second,
+    derived entry from `cache_char_table`.
+    """
+    config = Config(project)
+    if {x_var, y_var} & set(config.characterization_cols):
+        return cache_char_table(project, path, y_var, x_var, recalc_table,
+                                recalc, columns)
+    return cache_raw_table(project, path, recalc_table, recalc, columns)
+
+
+@single_flight(LOCK_DIR)
+@cache2.memoize()
+def cache_difference(project, path, path2, y_var, x_var, recalc_tables,
+                     recalc="off", diff_units=False, columns=None):
+    """Calculate and store the difference between two whole tables."""
+    df1 = cache_table(project, path, y_var, x_var,
+                      recalc_tables["scenario_a"], recalc, columns)
+    df2 = cache_table(project, path2, y_var, x_var,
+                      recalc_tables["scenario_b"], recalc, columns)
+    calculator = Difference(
+        index_col="sc_point_gid",
+        diff_units=diff_units
+    )
+    return calculator.calc(df1, df2, y_var)
+
+
+@single_flight(LOCK_DIR)
 @cache3.memoize()
 def  cache_chart_tables(
     signal_dict
@@ -333,228 +373,241 @@ def  cache_chart_tables(
     return dfs
 
 
+def cache_map_data(signal_dict, projected=True):
+    """Return the map table for the config and options given.
+
+    The table is assembled from cached stages, each keyed only by the
+    options it depends on:
+
+        1. `cache_raw_table` reads in a scenario table, and
+           `cache_char_table` adds any characterization columns.
+        2. `cache_difference` compares two whole scenario tables.
+        3. `cache_map_index` stores the positions of the rows that pass
+           the filter, mask, state, and region selections.
+
+    Changing a filter or state selection only reruns the last stage,
+    which stores an index into the cached table rather than a new copy.
+
+    Parameters
+    ----------
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+    projected : bool, optional
+        Read in only the columns needed to render the map and chart for
+        this signal (see `signal_columns`). Set to `False` to read in
+        every column (e.g., for downloads). By default, `True`.
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+    """
+    df = map_table(signal_dict, projected)
+    index = cache_map_index(signal_dict, projected)
+    return df.iloc[index]
+
+
+@single_flight(LOCK_DIR)
 @cache2.memoize()
-def cache_map_data(signal_dict):
-    """Read and store a data frame from the config and options given."""
+def cache_map_index(signal_dict, projected=True):
+    """Return the positions of the rows selected by a map signal.
+
+    Parameters
+    ----------
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+    projected : bool, optional
+        Whether the map table was read in with only the columns needed
+        (see `map_table`). By default, `True`.
+
+    Returns
+    -------
+    np.ndarray
+        Positions of the selected rows in the table returned by
+        `map_table` for this signal.
+    """
     # Get signal elements
     filters = signal_dict["filters"]
     mask = signal_dict["mask"]
-    path = signal_dict["path"]
     path2 = signal_dict["path2"]
-    project = signal_dict["project"]
-    recalc_tables = signal_dict["recalc_table"]
-    recalc = signal_dict["recalc"]
     states = signal_dict["states"]
     regions = signal_dict["regions"]
-    diff_units = signal_dict["diff_units"]
-    y_var = signal_dict["y"]
-    x_var = signal_dict["x"]
-
-    # Unpack recalc table
-    recalc_a = recalc_tables["scenario_a"]
-    recalc_b = recalc_tables["scenario_b"]
-
-    # Read and cache first table
-    df1 = cache_table(project, path, y_var, x_var, recalc_a, recalc)
 
     # Apply filters
-    df1 = apply_filters(df1, filters)
+    df = map_table(signal_dict, projected)
+    keep = filter_mask(df, filters)
 
-    # If there's a second table, read/cache the difference
+    # Differences keep sites that pass the filters in both tables
     if path2 and os.path.isfile(path2):
-        # Match the format of the first dataframe
-        df2 = cache_table(project, path2, y_var, x_var, recalc_b, recalc)
-        df2 = apply_filters(df2, filters)
-
-        # If the difference option is specified difference
-        calculator = Difference(
-            index_col="sc_point_gid",
-            diff_units=diff_units
-        )
-        df = calculator.calc(df1, df2, y_var)
+        df1 = map_table(signal_dict, projected, scenario="a")
+        df2 = map_table(signal_dict, projected, scenario="b")
+        gids = df["sc_point_gid"]
+        passed = df2["sc_point_gid"][filter_mask(df2, filters)]
+        keep &= gids.isin(passed).values
 
         # If mask, try that here
         if mask == "on":
-            df = calc_mask(df1, df)
-    else:
-        df = df1
+            passed = df1["sc_point_gid"][filter_mask(df1, filters)]
+            keep &= ~gids.isin(passed).values
 
     # Filter for states
     if states:
-        if any(df["state"].isin(states)):
-            df = df[df["state"].isin(states)]
+        in_states = df["state"].isin(states).values
+        if any(in_states & keep):
+            keep &= in_states
 
         if "offshore" in states:
-            df = df[df["offshore"] == 1]
+            keep &= (df["offshore"] == 1).values
         if "onshore" in states:
-            df = df[df["offshore"] == 0]
+            keep &= (df["offshore"] == 0).values
 
     # Filter for regions
     if regions:
         states = sum([REGIONS[region] for region in regions], [])
-        df = df[df["state"].isin(states)]
-
-    return df
-
-
-@cache4.memoize()
-def cache_timeseries(file, map_selection, chart_selection, map_click=None):
-    """Read and store a timeseries data frame with site selections."""
-    # Convert map and chart selections into site indices
-    gids = point_filter(map_selection, chart_selection, map_click)
-
-    # Read in data frame
-    data = read_timeseries(file, gids)
+        keep &= df["state"].isin(states).values
 
-    return data
-
-
-def calc_mask(df1, df2, unique_id_col="sc_point_gid"):
-    """Remove the areas in df2 that are in df1."""
-    # How to deal with mismatching grids?
-    df = df2[~df2[unique_id_col].isin(df1[unique_id_col])]
-    return df
+    return np.flatnonzero(keep)
 
 
-def closest_demand_to_coords(selection_coords, demand_data):
-    """_summary_
+@single_flight(LOCK_DIR)
+@cache2.memoize()
+def cache_map_pyramid(signal_dict, color_var):
+    """Return the level-of-detail grid pyramid of a map.
 
     Parameters
     ----------
-    selection_coords : _type_
-        _description_
-    demand_data : _type_
-        _description_
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+    color_var : str
+        Variable the map is colored by.
 
     Returns
     -------
-    _type_
-        _description_
+    pd.core.frame.DataFrame
+        Grid cells of every zoom level of the table returned by
+        `cache_map_data` for this signal (see
+        `reView.utils.lod.build_pyramid`).
     """
-    demand_coords = demand_data[["latitude", "longitude"]].values
-    demand_coords_rad = np.radians(demand_coords)
-    out = DIST_METRIC.pairwise(np.r_[selection_coords, demand_coords_rad])
-    load_center_ind = np.argmin(out[0][1:])
-    return load_center_ind
+    df = cache_map_data(signal_dict)
+    return build_pyramid(df, color_var)
 
 
-def closest_load_center(load_center_ind, demand_data):
-    """_summary_
+@single_flight(LOCK_DIR)
+@cache4.memoize()
+def cache_timeseries(file, map_selection, chart_selection, map_click=None,
+                     chart_key=None):
+    """Read and store a timeseries data frame with site selections.
+
+    Map box and lasso selections are resolved against the file's site
+    meta, so they can be passed through `compact_selection` to keep
+    their points out of the cache key. Chart box and lasso selections
+    are resolved against the chart stored under `chart_key`.
+    """
+    # Convert map and chart selections into site indices
+    gids = point_filter(map_selection, chart_selection, map_click,
+                        index=site_index(file),
+                        chart_index=read_chart_index(chart_key))
 
-    Parameters
-    ----------
-    load_center_ind : _type_
-        _description_
-    demand_data : _type_
-        _description_
+    # Read in data frame
+    data = read_timeseries(file, gids)
 
-    Returns
-    -------
-    _type_
-        _description_
-    """
-    demand_coords = demand_data[["latitude", "longitude"]].values
-    demand_coords_rad = np.radians(demand_coords)
-    load_center_info = demand_data.iloc[load_center_ind]
-    load_center_coords = demand_coords_rad[load_center_ind]
-    load = load_center_info[["load"]].values[0]
-    return load_center_coords, load
+    return data
 
 
-def filter_on_load_selection(df, load_center_ind, demand_data):
-    """_summary_
+def export_map(signal_dict, dst, layer, map_selection=None,
+               chart_selection=None, y_var=None, x_var=None,
+               chart_type=None, chart_key=None):
+    """Write the selected map data to a geopackage.
 
     Parameters
     ----------
-    df : _type_
-        _description_
-    load_center_ind : _type_
-        _description_
-    demand_data : _type_
-        _description_
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+    dst : str
+        Path to the geopackage to write.
+    layer : str
+        Name of the geopackage layer.
+    map_selection, chart_selection : dict, optional
+        Points selected on the map and chart. By default, `None`.
+    y_var, x_var, chart_type : str, optional
+        Chart variables and type the chart selection was made with. By
+        default, `None`.
+    chart_key : str, optional
+        Cache key of every point in the chart (see
+        `reView.utils.decimate.store_chart_index`). By default, `None`.
 
     Returns
     -------
-    _type_
-        _description_
+    str
+        Path to the geopackage.
     """
-    load_center_coords, load = closest_load_center(
-        load_center_ind, demand_data
+    df = cache_map_data(signal_dict, projected=False)
+    df = apply_all_selections(
+        df=df,
+        signal_dict=signal_dict,
+        project=signal_dict["project"],
+        chart_selection=chart_selection,
+        map_selection=map_selection,
+        y_var=y_var,
+        x_var=x_var,
+        chart_type=chart_type,
+        chart_key=chart_key
     )
-    demand_data = demand_data.iloc[load_center_ind: load_center_ind + 1]
-    df = filter_points_by_demand(df, load_center_coords, load)
-    return df, demand_data
+    to_geo(df, dst, layer)
+    return str(dst)
 
 
-def filter_points_by_demand(df, load_center_coords, load):
-    """_summary_
+def composite(dfs, composite_variable="total_lcoe",
+              composite_function="min", group_col="sc_point_gid"):
+    """Return a single least cost df from a list dfs."""
+    builder = CompositeBuilder(composite_variable, composite_function,
+                               group_col)
+    for df in dfs:
+        builder.add(df)
+    return builder.result()
+
+
+def map_table(signal_dict, projected=True, scenario=None):
+    """Return the cached table that a map signal is selected from.
 
     Parameters
     ----------
-    df : _type_
-        _description_
-    load_center_coords : _type_
-        _description_
-    load : _type_
-        _description_
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+    projected : bool, optional
+        Read in only the columns needed to render the map and chart for
+        this signal (see `signal_columns`). By default, `True`.
+    scenario : str, optional
+        Return just the table for scenario "a" or "b" instead of their
+        difference. By default, `None`.
 
     Returns
     -------
-    _type_
-        _description_
+    pd.core.frame.DataFrame
+        The scenario table, or the difference between two scenario
+        tables if a second scenario is selected.
     """
-    sc_coords = df[["latitude", "longitude"]].values
-    sc_coords = np.radians(sc_coords)
-    load_center_coords = np.array(load_center_coords).reshape(-1, 2)
-    out = DIST_METRIC.pairwise(load_center_coords, sc_coords)
-    # print(out.shape, df.shape)
-    df["dist_to_selected_load"] = out.reshape(-1) * 6373.0
-    df["selected_load_pipe_lcoh_component"] = (
-        df["pipe_lcoh_component"]
-        / df["dist_to_h2_load_km"]
-        * df["dist_to_selected_load"]
-    )
-    df["selected_lcoh"] = (
-        df["no_pipe_lcoh_fcr"] + df["selected_load_pipe_lcoh_component"]
-    )
-    df = df.sort_values("selected_lcoh")
-    df["h2_supply"] = df["hydrogen_annual_kg"].cumsum()
-    where_inds = np.where(df["h2_supply"] >= load)[0]
-    # print(f'{load=}')
-    # max_supply = df["h2_supply"].max()
-    # print(f'{max_supply=}')
-    # print(f'{where_inds=}')
-    if where_inds.size > 0:
-        final_ind = np.where(df["h2_supply"] >= load)[0].min() + 1
-        df = df.iloc[0:final_ind]
-    # print(f'{df=}')
-    return df
-
-
-def key_mode(dct):
-    """Return the key associated with the modal value in a dictionary."""
-    if dct:
-        value = Counter(dct).most_common()[0][0]
-    else:
-        value = "nan"
-    return value
+    path = signal_dict["path"]
+    path2 = signal_dict["path2"]
+    project = signal_dict["project"]
+    recalc_tables = signal_dict["recalc_table"]
+    recalc = signal_dict["recalc"]
+    y_var = signal_dict["y"]
+    x_var = signal_dict["x"]
 
+    # Only read in what we need unless we want everything
+    columns = signal_columns(signal_dict) if projected else None
 
-def composite(dfs, composite_variable="total_lcoe",
-              composite_function="min", group_col="sc_point_gid"):
-    """Return a single least cost df from a list dfs."""
-    # Make one big data frame
-    bdf = pd.concat(dfs)
-    bdf.reset_index(drop=True, inplace=True)
+    if scenario is None and path2 and os.path.isfile(path2):
+        return cache_difference(project, path, path2, y_var, x_var,
+                                recalc_tables, recalc,
+                                signal_dict["diff_units"], columns)
 
-    # Group, find minimum, and subset
-    if composite_function == "min":
-        idx = bdf.groupby(group_col)[composite_variable].idxmin()
-    else:
-        idx = bdf.groupby(group_col)[composite_variable].idxmax()
-    data = bdf.iloc[idx]
+    if scenario == "b":
+        path = path2
+    recalc_table = recalc_tables[f"scenario_{scenario or 'a'}"]
 
-    return data
+    return cache_table(project, path, y_var, x_var, recalc_table, recalc,
+                       columns)
 
 
 def meet_demand(df, map_function, project, click_selection, map_selection):
@@ -576,25 +629,17 @@ def meet_demand(df, map_function, project, click_selection, map_selection):
             if not selected_demand_points:
                 mean_lat = np.mean([p["lat"] for p in map_selection["points"]])
                 mean_lon = np.mean([p["lon"] for p in map_selection["points"]])
-                selection_coords = np.radians([[mean_lat, mean_lon]])
                 load_center_ind = closest_demand_to_coords(
-                    selection_coords, demand_data
+                    [mean_lat, mean_lon], Config(project).demand_index
                 )
                 df, demand_data = filter_on_load_selection(
                     df, load_center_ind, demand_data
                 )
             else:
-                df["demand_connect_count"] = 0
-                demand_idxs = []
-                for point in selected_demand_points:
-                    demand_idxs.append(point["pointIndex"])
-                    selected_df, __ = filter_on_load_selection(
-                        df, point["pointIndex"], demand_data
-                    )
-                    df.loc[
-                        df.sc_point_gid.isin(selected_df.sc_point_gid),
-                        "demand_connect_count",
-                    ] += 1
+                demand_idxs = [p["pointIndex"] for p in selected_demand_points]
+                df["demand_connect_count"] = demand_connections(
+                    df, demand_data.iloc[demand_idxs]
+                )
                 df = df[df["demand_connect_count"] > 0]
                 demand_data = demand_data.iloc[demand_idxs]
 
@@ -603,26 +648,11 @@ def meet_demand(df, map_function, project, click_selection, map_selection):
         demand_data["load"] = demand_data["H2_MT"] * 1e3  # convert to kg
 
         # add h2 data
-        demand_coords = demand_data[["latitude", "longitude"]].values
         sc_coords = df[["latitude", "longitude"]].values
-        demand_coords = np.radians(demand_coords)
-        sc_coords = np.radians(sc_coords)
-        tree = BallTree(demand_coords, metric="haversine")
-        __, ind = tree.query(sc_coords, return_distance=True, k=1)
-        df["h2_load_id"] = demand_data["OBJECTID"].values[ind]
-        filtered_points = []
-        for d_id in df["h2_load_id"].unique():
-            temp_df = df[df["h2_load_id"] == d_id].copy()
-            temp_df = temp_df.sort_values("total_lcoh_fcr")
-            temp_df["h2_supply"] = temp_df["hydrogen_annual_kg"].cumsum()
-            load = demand_data[demand_data["OBJECTID"] == d_id]["load"].iloc[0]
-            where_inds = np.where(temp_df["h2_supply"] <= load)[0]
-            if where_inds.size > 0:
-                final_ind = where_inds.max() + 1
-                filtered_points.append(temp_df.iloc[0:final_ind])
-            else:
-                filtered_points.append(temp_df)
-        df = pd.concat(filtered_points)
+        __, ind = Config(project).demand_index.nearest(sc_coords)
+        df["h2_load_id"] = demand_data["OBJECTID"].values[ind[:, 0]]
+        demand = demand_data.set_index("OBJECTID")["load"]
+        df = allocate_supply(df, demand)
         demand_data = demand_data[
             demand_data["OBJECTID"].isin(df["h2_load_id"].unique())
         ]
@@ -630,8 +660,90 @@ def meet_demand(df, map_function, project, click_selection, map_selection):
     return df
 
 
-def point_filter(map_selection=None, chart_selection=None, map_click=None):
-    """Filter a dataframe by points selected from the chart."""
+def prepare_map_table(signal_dict):
+    """Build and cache the tables a map signal needs (e.g., in a job).
+
+    Recalculated and difference tables are stored in the caches shared
+    by all workers, so callbacks that later read them are quick.
+
+    Parameters
+    ----------
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+    """
+    map_table(signal_dict)
+
+
+def map_table_cached(signal_dict, projected=True):
+    """Check if the table a map signal is selected from is cached.
+
+    Parameters
+    ----------
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+    projected : bool, optional
+        Whether to check the table with only the columns needed (see
+        `map_table`). By default, `True`.
+
+    Returns
+    -------
+    bool
+        Whether `map_table` would return the table without building it,
+        in which case there is no need to prepare it in a job (see
+        `prepare_map_table`).
+    """
+    path = signal_dict["path"]
+    path2 = signal_dict["path2"]
+    project = signal_dict["project"]
+    recalc_tables = signal_dict["recalc_table"]
+    recalc = signal_dict["recalc"]
+    y_var = signal_dict["y"]
+    x_var = signal_dict["x"]
+    columns = signal_columns(signal_dict) if projected else None
+
+    if path2 and os.path.isfile(path2):
+        key = cache_difference.cache_key(project, path, path2, y_var, x_var,
+                                         recalc_tables, recalc,
+                                         signal_dict["diff_units"], columns)
+        return cache2.has(key)
+
+    recalc_table = recalc_tables["scenario_a"]
+    if {x_var, y_var} & set(Config(project).characterization_cols):
+        key = cache_char_table.cache_key(project, path, y_var, x_var,
+                                         recalc_table, recalc, columns)
+        return cache.has(key)
+
+    return table_store.has(path, read_raw_table, project=project,
+                           recalc_table=recalc_table, recalc=recalc,
+                           columns=columns)
+
+
+def point_filter(map_selection=None, chart_selection=None, map_click=None,
+                 index=None, chart_index=None):
+    """Filter a dataframe by points selected from the chart.
+
+    Parameters
+    ----------
+    map_selection, chart_selection, map_click : dict, optional
+        Plotly `selectedData` from the map and chart, and `clickData`
+        from the map. By default, `None`.
+    index : reView.utils.spatial.SiteIndex, optional
+        Spatial index over the sites of the mapped table (see
+        `reView.utils.spatial.site_index`). If given, map box and lasso
+        selections are resolved from their geometry instead of their
+        points, so they may be passed through `compact_selection`. By
+        default, `None`.
+    chart_index : reView.utils.decimate.ChartIndex, optional
+        Index over every point of the chart (see
+        `reView.utils.decimate.read_chart_index`). If
+        given, chart box and lasso selections include the points that
+        were left out of a decimated chart. By default, `None`.
+
+    Returns
+    -------
+    list | set | None
+        Selected "sc_point_gid" values, or `None` if nothing is selected.
+    """
     # Start with no gids
     gids = None
 
@@ -644,24 +756,62 @@ def point_filter(map_selection=None, chart_selection=None, map_click=None):
     if check1 or check2 or check3:
         # If a click, override
         if check3:
-            point = map_click["points"]  
+            point = map_click["points"]
             gids = [point[0]["customdata"][0]]
         if check1 and check2:
-            points = chart_selection["points"]
-            chart_gids = [p.get("customdata", [None])[0] for p in points]
-            points = map_selection["points"]
-            map_gids = [p.get("customdata", [None])[0] for p in points]
+            chart_gids = selection_gids(chart_selection, chart_index)
+            map_gids = selection_gids(map_selection, index)
             gids = set(chart_gids).intersection(map_gids)
         elif chart_selection is not None:
-            points = chart_selection["points"]
-            gids = [p.get("customdata", [None])[0] for p in points]
+            gids = selection_gids(chart_selection, chart_index)
         elif map_selection is not None:
-            points = map_selection["points"]
-            gids = [p.get("customdata", [None])[0] for p in points]
+            gids = selection_gids(map_selection, index)
 
     return gids
 
 
+def read_raw_table(path, project, recalc_table=None, recalc="off",
+                   columns=None):
+    """Read in just a single table, optionally only the given columns."""
+    # Get the table
+    if recalc == "on":
+        data = ReCalculatedData(
+            config=Config(project)).build(
+                path, recalc_table, columns=columns
+        )
+    else:
+        data = read_file(path, columns=columns)
+
+    # We want some consistent fields
+    if "capacity" not in data.columns and "hybrid_capacity" in data.columns:
+        data["capacity"] = data["hybrid_capacity"].copy()
+
+    return data
+
+
+def signal_columns(signal_dict):
+    """Return the table columns needed to render a map signal.
+
+    Parameters
+    ----------
+    signal_dict : dict
+        Dictionary of user selections from the scenario page.
+
+    Returns
+    -------
+    tuple
+        Sorted names of the columns needed for the map and charts. These
+        may include columns that are not in a given table.
+    """
+    config = Config(signal_dict["project"])
+    columns = set(MAP_COLUMNS)
+    columns.update(config.characterization_cols)
+    columns.update([signal_dict["x"], signal_dict["y"]])
+    columns.update(filter_columns(signal_dict["filters"]))
+    columns.discard(None)
+    return tuple(sorted(columns))
+
+
 class Difference:
     """Class to handle supply curve difference calculations."""
 
@@ -712,11 +862,13 @@ class Difference:
 class ReCalculatedData:
     """Class to handle data access and recalculations."""
 
+    COLUMNS = ["capacity", "mean_cf", "mean_lcoe", "trans_cap_cost"]
+
     def __init__(self, config):
         """Initialize Data object."""
         self.config = config
 
-    def build(self, path, recalc_table=None):
+    def build(self, path, recalc_table=None, columns=None):
         """Read in a data table given a scenario with re-calc.
 
         Parameters
@@ -726,6 +878,10 @@ class ReCalculatedData:
         recalc_table : dict
             A dictionary of parameter-value pairs needed to recalculate
             variables.
+        columns : list, optional
+            Names of the columns to read in. The columns needed for the
+            recalculation are always read in. By default, `None`, which
+            reads in every column.
 
         Returns
         -------
@@ -734,7 +890,9 @@ class ReCalculatedData:
             recalculated values if new parameters are given.
         """
         # This can be a path or a scenario
-        data = pd.read_csv(path, low_memory=False)
+        if columns is not None:
+            columns = [*columns, *self.COLUMNS]
+        data = read_file(path, columns=columns)
 
         # Recalculate if needed, else return original table
         if isinstance(recalc_table, str):
@@ -82,6 +82,9 @@ layout = html.Div(
         # More options that are shared between any two components
         SIDE_OPTIONS,
 
+        # Progress of background jobs (composites, recalcs, and downloads)
+        html.Div(id="job_status", style={"font-size": "14px"}),
+
         # Map and chart
         html.Div(
             children=[
@@ -150,9 +153,18 @@ layout = html.Div(
             style={"display": "none"},
         ),
 
-        # Capacity after make_map (avoiding duplicate calls)
+        # Cache key of the map's capacity per site (see store_capacity)
         html.Div(id="rev_mapcap", style={"display": "none"}),
 
+        # Level of detail drawn on the map (see reView.utils.lod)
+        html.Div(id="rev_map_lod", style={"display": "none"}),
+
+        # Style state of the map for restyling it (see Map.style)
+        html.Div(id="rev_map_style", style={"display": "none"}),
+
+        # Cache key of every point in the chart (see store_chart_index)
+        html.Div(id="rev_chart_index", style={"display": "none"}),
+
         # Filter list after being pieced together
         html.Div(id="filter_store", style={"display": "none"}),
 
@@ -160,5 +172,13 @@ layout = html.Div(
         dcc.Download(id="download_chart"),
         dcc.Download(id="download_map"),
         html.Div(id="download_info_chart", style={"display": "none"}),
+
+        # Background jobs and the intervals that poll them
+        html.Div(id="signal_job", style={"display": "none"}),
+        html.Div(id="download_job", style={"display": "none"}),
+        dcc.Interval(id="signal_job_interval", interval=1_000,
+                     disabled=True),
+        dcc.Interval(id="download_job_interval", interval=1_000,
+                     disabled=True),
     ],
 )
@@ -13,6 +13,7 @@ Created on Wed Apr 13 10:37:14 2022
 """
 import json
 from multiprocessing import cpu_count
+import numpy as np
 import pandas as pd
 import pyproj
 from pandarallel import pandarallel
@@ -151,16 +152,16 @@ class BespokeUnpacker:
         return df
 
     def _declick(self, clicksel):
-        """Set needed values from click selection as attributes."""
-        if self.clicksel:
+        """Set the position and location of the selected site."""
+        if clicksel:
+            # Map points carry their site ID first in their custom data
             point = clicksel["points"][0]
-            self.index = point["pointIndex"]
-            self.text = point["hovertext"].replace("<br>", "")
-        elif self.sc_point_gid:
-            query = self.df["sc_point_gid"] == self.sc_point_gid
-            self.index = self.df.index[query].values[0]
-        self.county = self.df.loc[self.index, "county"]
-        self.state = self.df.loc[self.index, "state"]
+            self.sc_point_gid = point["customdata"][0]
+        gids = self.df["sc_point_gid"].values
+        self.index = int(np.flatnonzero(gids == self.sc_point_gid)[0])
+        row = self.df.iloc[self.index]
+        self.county = row.get("county")
+        self.state = row.get("state")
 
 
 def batch_unpack_from_supply_curve(sc_df, n_workers=1):
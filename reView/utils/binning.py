@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Bin chart values for several groups (e.g., scenarios) at once.
+
+Charts compare groups on shared bins, so the bin edges are computed once
+for all groups. Each value is then assigned a bin index with a binary
+search, and the counts and means of every (group, bin) pair come from a
+single `np.bincount` over a combined group and bin key, rather than from
+grouping each scenario's table separately.
+
+Box plots are drawn from statistics computed here (see `box_statistics`)
+rather than from every value, so the browser only receives five numbers
+and a capped sample of outliers for each group.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_OUTLIERS = 1_000  # Largest number of outliers to draw for each box
+
+
+def bin_edges(values, nbins):
+    """Return evenly spaced bin edges over the finite values.
+
+    Parameters
+    ----------
+    values : array-like
+        Values to bin.
+    nbins : int
+        Number of bins.
+
+    Returns
+    -------
+    np.ndarray
+        `nbins` + 1 bin edges, the same as `np.histogram` would use.
+    """
+    values = np.asarray(values, dtype=float)
+    return np.histogram_bin_edges(values[np.isfinite(values)], bins=nbins)
+
+
+def box_statistics(values, max_outliers=MAX_OUTLIERS):
+    """Return the statistics of a box plot of one group's values.
+
+    Quartiles are linearly interpolated (as in `np.quantile`) and, as in
+    plotly's own box plots, whiskers reach the furthest values within 1.5
+    times the interquartile range of the quartiles.
+
+    Parameters
+    ----------
+    values : array-like
+        Values of the group. Missing and infinite values are ignored.
+    max_outliers : int, optional
+        Largest number of outliers to return. Larger sets of outliers
+        are sampled evenly in order of value, which keeps the most
+        extreme ones. By default, `MAX_OUTLIERS`.
+
+    Returns
+    -------
+    tuple
+        Dictionary with the "q1", "median", "q3", "lowerfence",
+        "upperfence", "mean", and "count" of the values (or `None` if
+        there are no finite values), and the positions of the sampled
+        outliers in `values`, in order of value.
+    """
+    values = np.asarray(values, dtype=float)
+    positions = np.flatnonzero(np.isfinite(values))
+    if positions.size == 0:
+        return None, positions
+
+    order = positions[np.argsort(values[positions], kind="stable")]
+    ordered = values[order]
+    lower_quartile, median, upper_quartile = np.quantile(
+        ordered, [0.25, 0.5, 0.75]
+    )
+    reach = 1.5 * (upper_quartile - lower_quartile)
+    inside = ((ordered >= lower_quartile - reach)
+              & (ordered <= upper_quartile + reach))
+    fences = ordered[inside]
+
+    stats = {
+        "q1": float(lower_quartile),
+        "median": float(median),
+        "q3": float(upper_quartile),
+        "lowerfence": float(fences[0]),
+        "upperfence": float(fences[-1]),
+        "mean": float(ordered.mean()),
+        "count": int(ordered.size),
+    }
+
+    outliers = order[~inside]
+    if outliers.size > max_outliers:
+        sample = np.linspace(0, outliers.size - 1, max_outliers)
+        outliers = outliers[np.unique(sample.round().astype(int))]
+
+    return stats, outliers
+
+
+def group_codes(groups):
+    """Return integer codes and sorted names of groups.
+
+    Parameters
+    ----------
+    groups : array-like
+        Group of each value.
+
+    Returns
+    -------
+    tuple
+        Code of each value's group, and the group names, in sorted order.
+    """
+    codes, names = pd.factorize(np.asarray(groups), sort=True)
+    return codes, np.asarray(names)
+
+
+def grouped_counts(bins, codes, nbins, ngroups):
+    """Count the values in each bin of each group.
+
+    Parameters
+    ----------
+    bins : np.ndarray
+        Bin index of each value.
+    codes : np.ndarray
+        Group code of each value (see `group_codes`).
+    nbins, ngroups : int
+        Number of bins and groups.
+
+    Returns
+    -------
+    np.ndarray
+        (groups, bins) array of counts.
+    """
+    keys = codes * nbins + bins
+    counts = np.bincount(keys, minlength=ngroups * nbins)
+    return counts.reshape(ngroups, nbins)
+
+
+def grouped_means(values, bins, codes, nbins, ngroups):
+    """Average the values in each bin of each group.
+
+    Parameters
+    ----------
+    values : array-like
+        Values to average. Missing values are ignored.
+    bins : np.ndarray
+        Bin index of each value.
+    codes : np.ndarray
+        Group code of each value (see `group_codes`).
+    nbins, ngroups : int
+        Number of bins and groups.
+
+    Returns
+    -------
+    np.ndarray
+        (groups, bins) array of means, which are NaN for bins without
+        any values.
+    """
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    keys = (codes * nbins + bins)[valid]
+    totals = np.bincount(keys, values[valid], minlength=ngroups * nbins)
+    counts = np.bincount(keys, minlength=ngroups * nbins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = totals / counts
+    return means.reshape(ngroups, nbins)
+
+
+def lower_edge_index(values, edges):
+    """Return the index of the last edge at or below each value.
+
+    Values on an edge belong to the bin above it, except for values on
+    the last edge, which belong to the last bin (as in `np.histogram`).
+
+    Parameters
+    ----------
+    values : array-like
+        Values within the range of `edges`.
+    edges : np.ndarray
+        Sorted bin edges.
+
+    Returns
+    -------
+    np.ndarray
+        Bin index of each value, from 0 to len(`edges`) - 2.
+    """
+    index = np.searchsorted(edges[:-1], values, side="right") - 1
+    return np.clip(index, 0, max(len(edges) - 2, 0))
+
+
+def upper_edge_index(values, edges):
+    """Return the index of the first edge at or above each value.
+
+    Parameters
+    ----------
+    values : array-like
+        Values to bin.
+    edges : np.ndarray
+        Sorted bin edges. Values above the last edge are assigned to it.
+
+    Returns
+    -------
+    np.ndarray
+        Edge index of each value, from 0 to len(`edges`) - 1.
+    """
+    index = np.searchsorted(edges, values, side="left")
+    return np.clip(index, 0, len(edges) - 1)
@@ -0,0 +1,656 @@
+# -*- coding: utf-8 -*-
+"""Data frame caches backed by memory-mapped Arrow IPC files.
+
+The default Flask-Caching filesystem backend pickles every cached value
+and limits each cache to a number of entries, regardless of their size.
+`ArrowFileSystemCache` writes data frames (and dictionaries of data
+frames) to Arrow IPC files that are memory-mapped on read, and evicts
+the least recently used entries once the cache grows past a byte budget.
+
+`SharedTableStore` publishes scenario tables as Arrow IPC files that
+every worker process attaches to, so that workers share one copy of
+each table in memory.
+
+`single_flight` makes concurrent calls to a memoized function with the
+same arguments wait on one computation instead of each running it.
+"""
+import atexit
+import functools
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from flask_caching.backends.filesystemcache import FileSystemCache
+
+try:
+    import fcntl
+except ImportError:  # Windows, file locks are skipped
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_KEY_LOCKS = {}
+_KEY_LOCKS_LOCK = threading.Lock()
+
+
+@contextmanager
+def key_lock(key, lock_dir=None):
+    """Hold an exclusive lock on a key.
+
+    Threads in this process that lock the same key wait for each other.
+    If `lock_dir` is given, processes that lock the same key also wait
+    for each other through a file lock in that directory (on platforms
+    with `fcntl`).
+
+    Parameters
+    ----------
+    key : str
+        Key to lock, e.g., a cache key.
+    lock_dir : str | pathlib.Path, optional
+        Directory for file locks shared between processes. By default,
+        `None`, which only locks within this process.
+    """
+    with _KEY_LOCKS_LOCK:
+        lock, count = _KEY_LOCKS.get(key, (threading.Lock(), 0))
+        _KEY_LOCKS[key] = (lock, count + 1)
+
+    try:
+        with lock:
+            if lock_dir is None or fcntl is None:
+                yield
+            else:
+                name = hashlib.sha1(key.encode()).hexdigest()
+                path = Path(lock_dir).joinpath(f"{name}.lock")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as file:
+                    fcntl.flock(file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(file, fcntl.LOCK_UN)
+    finally:
+        with _KEY_LOCKS_LOCK:
+            lock, count = _KEY_LOCKS[key]
+            if count == 1:
+                del _KEY_LOCKS[key]
+            else:
+                _KEY_LOCKS[key] = (lock, count - 1)
+
+
+def read_arrow(path):
+    """Memory-map a data frame from an Arrow IPC file.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        Path to an Arrow IPC file written by `write_arrow`.
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+        Data frame whose numeric columns are read-only views of the
+        memory-mapped file.
+    """
+    source = pa.memory_map(str(path))
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def remove_file(path):
+    """Remove a file, ignoring files that are already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("Could not remove cache file %s", path, exc_info=True)
+
+
+def single_flight(lock_dir=None):
+    """Coalesce concurrent calls to a memoized function.
+
+    Callers with the same cache key wait for the first caller to finish
+    and then read its result from the cache, instead of running the same
+    computation in parallel. Apply this on top of ``cache.memoize()``.
+    The decorated function's ``cache_key(*args, **kwargs)`` returns the
+    cache key of a call, e.g., to check if its result is cached.
+
+    Parameters
+    ----------
+    lock_dir : str | pathlib.Path, optional
+        Directory for file locks that also coalesce calls across worker
+        processes. By default, `None`, which only coalesces calls within
+        a process.
+
+    Returns
+    -------
+    callable
+        Decorator for a memoized function.
+    """
+    def decorator(memoized):
+        def cache_key(*args, **kwargs):
+            # The first key made for a function also sets its memoize
+            # version, so concurrent first calls must not race to set it
+            func = memoized.uncached
+            with key_lock(f"{func.__module__}.{func.__qualname__}",
+                          lock_dir):
+                return memoized.make_cache_key(func, *args, **kwargs)
+
+        @functools.wraps(memoized)
+        def wrapper(*args, **kwargs):
+            with key_lock(cache_key(*args, **kwargs), lock_dir):
+                return memoized(*args, **kwargs)
+
+        wrapper.cache_key = cache_key
+        return wrapper
+    return decorator
+
+
+def write_arrow(df, dst, suffix=".tmp"):
+    """Write a data frame to an Arrow IPC file.
+
+    The file is written to a temporary file first and then moved into
+    place, so readers never see a partially written file.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Data frame to write.
+    dst : str | pathlib.Path
+        Path to the output Arrow IPC file.
+    suffix : str, optional
+        Suffix for the temporary file. By default, ".tmp".
+
+    Returns
+    -------
+    bool
+        Whether the data frame was written. Data frames that Arrow can
+        not convert (e.g., object columns with mixed types) are not.
+    """
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError,
+            pa.ArrowNotImplementedError):
+        return False
+
+    handle, tmp = tempfile.mkstemp(suffix=suffix, dir=os.path.dirname(dst))
+    with os.fdopen(handle, "wb") as file:
+        with pa.ipc.new_file(file, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, dst)
+
+    return True
+
+
+# A placeholder only needs to carry the name of its Arrow file
+class _ArrowFrame:  # pylint: disable=too-few-public-methods
+    """Pickled in place of a data frame that was written to Arrow."""
+
+    def __init__(self, fname):
+        """Initialize _ArrowFrame object.
+
+        Parameters
+        ----------
+        fname : str
+            Name of the Arrow IPC file within the cache directory.
+        """
+        self.fname = fname
+
+
+class ArrowFileSystemCache(FileSystemCache):
+    """A filesystem cache that stores data frames as Arrow IPC files.
+
+    Data frames are read back through memory maps, so the numeric
+    columns of a cached data frame are read-only views of the cache
+    file. Copy a cached data frame before modifying its values in place.
+    Values other than data frames (e.g., memoize version keys) are
+    pickled as in the default filesystem cache, as are data frames that
+    Arrow cannot convert (e.g., object columns with mixed types).
+
+    Set ``CACHE_TYPE`` to ``"reView.utils.cache.ArrowFileSystemCache"``
+    and ``CACHE_BYTE_LIMIT`` to the number of bytes the cache may use to
+    use this backend in a Flask-Caching configuration.
+    """
+
+    #: used for the Arrow files written alongside each cache entry
+    _arrow_suffix = ".arrow"
+
+    #: grace period (seconds) for Arrow files written before their entry
+    _orphan_age = 60
+
+    def __init__(self, cache_dir, byte_limit=2e9, default_timeout=300,
+                 **kwargs):
+        """Initialize ArrowFileSystemCache object.
+
+        Parameters
+        ----------
+        cache_dir : str | pathlib.Path
+            The directory where cache files are stored. This cache must
+            be the only user of this directory.
+        byte_limit : int | float, optional
+            Number of bytes the cache may use on disk before the least
+            recently used entries are removed. A value of 0 indicates no
+            limit. By default, 2 GB.
+        default_timeout : int, optional
+            The default timeout (seconds) for cached values. A value of
+            0 indicates that cached values never expire. By default, 300.
+        **kwargs
+            Other keyword arguments to pass to
+            `flask_caching.backends.filesystemcache.FileSystemCache`.
+        """
+        kwargs["threshold"] = 0  # Entries are pruned by size instead
+        super().__init__(str(cache_dir), default_timeout=default_timeout,
+                         **kwargs)
+        self.byte_limit = byte_limit
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        """Build the cache from a Flask-Caching configuration."""
+        args.insert(0, config["CACHE_DIR"])
+        kwargs.update(
+            {
+                "byte_limit": config.get("CACHE_BYTE_LIMIT", 2e9),
+                "ignore_errors": config["CACHE_IGNORE_ERRORS"],
+            }
+        )
+        return cls(*args, **kwargs)
+
+    def clear(self):
+        """Remove every entry and Arrow file from the cache."""
+        for fname in self._arrow_files():
+            remove_file(fname)
+        return super().clear()
+
+    def delete(self, key, mgmt_element=False):
+        """Remove an entry and its Arrow files from the cache."""
+        for fname in self._arrow_files(self._get_filename(key)):
+            remove_file(fname)
+        return super().delete(key, mgmt_element=mgmt_element)
+
+    def get(self, key):
+        """Return a cached value, memory-mapping any stored data frames.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        obj
+            The cached value, or `None` if the key is not in the cache
+            or its Arrow files have been evicted.
+        """
+        value = super().get(key)
+        if not self._is_arrow(value):
+            return value
+
+        try:
+            if isinstance(value, dict):
+                value = {k: self._read(v) for k, v in value.items()}
+            else:
+                value = self._read(value)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            logger.debug("Arrow files for cache key %s are missing", key)
+            self.delete(key)
+            return None
+
+        # Reading an entry counts as using it for LRU eviction
+        try:
+            os.utime(self._get_filename(key))
+        except OSError:
+            pass
+
+        return value
+
+    def set(self, key, value, timeout=None, mgmt_element=False):
+        """Cache a value, writing data frames to Arrow IPC files.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        value : obj
+            Value to cache. Data frames and dictionaries of data frames
+            are written to Arrow; everything else is pickled.
+        timeout : int, optional
+            Timeout (seconds) for this value. By default, `None`, which
+            uses the cache's default timeout.
+        mgmt_element : bool, optional
+            Whether this is an internal management entry.
+            By default, `False`.
+
+        Returns
+        -------
+        bool
+            Whether the value was cached.
+        """
+        stem = self._get_filename(key)
+        for fname in self._arrow_files(stem):
+            remove_file(fname)
+
+        if isinstance(value, pd.DataFrame):
+            value = self._write(value, stem, 0)
+        elif self._is_frames(value):
+            value = {
+                k: self._write(df, stem, i)
+                for i, (k, df) in enumerate(value.items())
+            }
+
+        success = super().set(key, value, timeout=timeout,
+                              mgmt_element=mgmt_element)
+        if not mgmt_element:
+            self._prune_bytes()
+
+        return success
+
+    def _arrow_files(self, stem=None):
+        """List Arrow files, optionally only those for one entry."""
+        if stem is None:
+            pattern = os.path.join(glob.escape(self._path), "*")
+        else:
+            pattern = glob.escape(stem)
+        return glob.glob(f"{pattern}.*{self._arrow_suffix}")
+
+    @staticmethod
+    def _is_arrow(value):
+        """Check if a cached value refers to Arrow files."""
+        if isinstance(value, dict) and value:
+            return any(isinstance(v, _ArrowFrame) for v in value.values())
+        return isinstance(value, _ArrowFrame)
+
+    @staticmethod
+    def _is_frames(value):
+        """Check if a value is a non-empty dictionary of data frames."""
+        return (
+            isinstance(value, dict)
+            and bool(value)
+            and all(isinstance(v, pd.DataFrame) for v in value.values())
+        )
+
+    def _is_mgmt(self, name):
+        """Keep Arrow files out of the entry listing."""
+        return name.endswith(self._arrow_suffix) or super()._is_mgmt(name)
+
+    def _prune(self):
+        """Skip count-based pruning, entries are pruned by size."""
+
+    def _prune_bytes(self):
+        """Remove least recently used entries until under the budget."""
+        if not self.byte_limit:
+            return
+
+        # Group each entry with its Arrow files
+        sizes, mtimes = {}, {}
+        for fname in os.listdir(self._path):
+            if fname.endswith(self._fs_transaction_suffix):
+                continue
+            path = os.path.join(self._path, fname)
+            stem = os.path.join(self._path, fname.split(".")[0])
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            sizes[stem] = sizes.get(stem, 0) + stat.st_size
+            if not fname.endswith(self._arrow_suffix):
+                mtimes[stem] = stat.st_mtime
+
+        # Remove Arrow files left behind without an entry
+        for stem in set(sizes) - set(mtimes):
+            self._remove_orphans(stem)
+            del sizes[stem]
+
+        total = sum(sizes.values())
+        for stem in sorted(mtimes, key=mtimes.get):
+            if total <= self.byte_limit:
+                break
+            if self._is_mgmt(os.path.basename(stem)):
+                continue
+            for fname in [stem, *self._arrow_files(stem)]:
+                remove_file(fname)
+            total -= sizes[stem]
+            logger.debug("Evicted cache entry %s (%d bytes)", stem,
+                         sizes[stem])
+
+    def _remove_orphans(self, stem):
+        """Remove an entry's Arrow files once they are old enough."""
+        now = time.time()
+        for fname in self._arrow_files(stem):
+            try:
+                if now - os.stat(fname).st_mtime > self._orphan_age:
+                    remove_file(fname)
+            except FileNotFoundError:
+                pass
+
+    def _read(self, value):
+        """Memory-map a data frame from its Arrow IPC file."""
+        if not isinstance(value, _ArrowFrame):
+            return value
+        return read_arrow(os.path.join(self._path, value.fname))
+
+    def _write(self, df, stem, i):
+        """Write a data frame to an Arrow IPC file next to its entry."""
+        dst = f"{stem}.{i}{self._arrow_suffix}"
+        if not write_arrow(df, dst, suffix=self._fs_transaction_suffix):
+            return df
+        return _ArrowFrame(os.path.basename(dst))
+
+
+class SharedTableStore:
+    """Scenario tables shared between worker processes.
+
+    The first worker to load a table publishes it as an Arrow IPC file
+    in the store's directory, and every worker (including that one)
+    attaches to it through a read-only memory map, so the operating
+    system keeps one copy of the table in memory no matter how many
+    workers use it. Each worker keeps its most recently used tables
+    attached and holds a lease file on each of them. Tables are evicted,
+    least recently used first, once the store grows past its byte
+    budget, but only when no live worker holds a lease on them.
+    """
+
+    #: used for the published tables
+    _table_suffix = ".arrow"
+
+    #: used for the lease each attached worker holds on a table
+    _lease_suffix = ".lease"
+
+    def __init__(self, directory, byte_limit=0, max_attached=16):
+        """Initialize SharedTableStore object.
+
+        Parameters
+        ----------
+        directory : str | pathlib.Path
+            Directory to publish tables in. This store must be the only
+            user of this directory.
+        byte_limit : int | float, optional
+            Number of bytes the published tables may use on disk before
+            unleased tables are evicted. A value of 0 indicates no
+            limit. By default, 0.
+        max_attached : int, optional
+            Number of tables each worker keeps attached (and leased).
+            By default, 16.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.byte_limit = byte_limit
+        self.max_attached = max_attached
+        self._attached = OrderedDict()
+        self._lock = threading.Lock()
+        atexit.register(self.release_all)
+
+    def __repr__(self):
+        """Return representation string for SharedTableStore object."""
+        return (f"<SharedTableStore object: directory={self.directory}, "
+                f"attached={len(self._attached)}>")
+
+    def load(self, file, loader, **kwargs):
+        """Return a table from the store, loading and publishing if needed.
+
+        Parameters
+        ----------
+        file : str | pathlib.Path
+            Path to the source file of the table. Its modification time
+            and size are part of the key, so edited files are reloaded.
+        loader : callable
+            Function that reads the table, called as
+            ``loader(file, **kwargs)`` when the table is not published.
+        **kwargs
+            Keyword arguments for `loader`, which are also part of the
+            key.
+
+        Returns
+        -------
+        pd.core.frame.DataFrame
+            The table. Its numeric columns are read-only views of the
+            shared file, so copy it before modifying values in place.
+        """
+        name = self._name(file, loader, kwargs)
+
+        with self._lock:
+            if name in self._attached:
+                self._attached.move_to_end(name)
+                return self._attached[name].copy(deep=False)
+
+        # Only one worker loads and publishes a given table
+        path = self.directory.joinpath(name + self._table_suffix)
+        with key_lock(name, self.directory):
+            if not path.exists():
+                df = loader(file, **kwargs)
+                if not write_arrow(df, path):
+                    logger.debug("Could not publish %s, using a private "
+                                 "copy", file)
+                    return df
+                logger.debug("Published %s to %s", file, path)
+
+        try:
+            df = read_arrow(path)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            # Evicted by another worker in the meantime
+            return loader(file, **kwargs)
+
+        self._attach(name, df)
+        self._evict()
+
+        return df.copy(deep=False)
+
+    def has(self, file, loader, **kwargs):
+        """Check if a table is attached or published, without loading it.
+
+        Parameters
+        ----------
+        file : str | pathlib.Path
+            Path to the source file of the table.
+        loader : callable
+            Function that reads the table (see `load`).
+        **kwargs
+            Keyword arguments for `loader`.
+
+        Returns
+        -------
+        bool
+            Whether `load` would return the table without calling
+            `loader`.
+        """
+        try:
+            name = self._name(file, loader, kwargs)
+        except FileNotFoundError:
+            return False
+        path = self.directory.joinpath(name + self._table_suffix)
+        return name in self._attached or path.exists()
+
+    def release(self, name):
+        """Detach a table and drop this worker's lease on it."""
+        with self._lock:
+            self._attached.pop(name, None)
+        remove_file(self._lease(name))
+
+    def release_all(self):
+        """Detach every table and drop this worker's leases."""
+        for name in list(self._attached):
+            self.release(name)
+
+    def _attach(self, name, df):
+        """Keep a table attached and lease it for this worker."""
+        self._lease(name).touch()
+        os.utime(self.directory.joinpath(name + self._table_suffix))
+        with self._lock:
+            self._attached[name] = df
+            self._attached.move_to_end(name)
+            stale = list(self._attached)[:-self.max_attached]
+        for old in stale:
+            self.release(old)
+
+    def _evict(self):
+        """Remove least recently used unleased tables over the budget."""
+        if not self.byte_limit:
+            return
+
+        tables = {}
+        for path in self.directory.glob(f"*{self._table_suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            tables[path] = (stat.st_mtime, stat.st_size)
+
+        total = sum(size for _, size in tables.values())
+        for path in sorted(tables, key=tables.get):
+            if total <= self.byte_limit:
+                break
+            if self._leased(path.name[:-len(self._table_suffix)]):
+                continue
+            remove_file(path)
+            total -= tables[path][1]
+            logger.debug("Evicted shared table %s", path)
+
+    def _lease(self, name):
+        """Return the path to this worker's lease on a table."""
+        return self.directory.joinpath(
+            f"{name}.{os.getpid()}{self._lease_suffix}"
+        )
+
+    def _leased(self, name):
+        """Check if any live worker holds a lease on a table."""
+        leased = False
+        for lease in self.directory.glob(f"{name}.*{self._lease_suffix}"):
+            pid = int(lease.name.split(".")[1])
+            if _pid_alive(pid):
+                leased = True
+            else:
+                remove_file(lease)
+        return leased
+
+    @staticmethod
+    def _name(file, loader, kwargs):
+        """Build a table name from its source file and loader options."""
+        file = Path(file).expanduser().resolve()
+        stat = file.stat()
+        key = (f"{file}:{stat.st_mtime_ns}:{stat.st_size}:"
+               f"{loader.__module__}.{loader.__qualname__}:"
+               f"{sorted(kwargs.items())}")
+        return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _pid_alive(pid):
+    """Check if a process is still running."""
+    if os.name != "posix":
+        return True  # Without a safe check, assume it is
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -4,12 +4,20 @@ data can be accessed as proper columns rather than embedded JSON data.
 
 @author: Mike Gleason
 """
+import hashlib
 import json
+import threading
 import warnings
 
+from collections import OrderedDict
+from itertools import chain
+
+import numpy as np
 import pandas as pd
 import tqdm
 
+from scipy import sparse
+
 
 # pylint: disable=raise-missing-from
 def recast_categories(df, col, lkup, cell_size_sq_km):
@@ -279,3 +287,177 @@ def validate_characterization_remapper(  # noqa: C901
                     f"{col_name} - Invalid value for rename: {rename}. "
                     f"Must be None when method={method}."
                 )
+
+
+class CharacterizationMatrix:
+    """Sparse (rows x categories) matrix of a characterization column.
+
+    Characterization columns hold a JSON string for each supply curve
+    point mapping categories (e.g., land cover classes) to cell counts.
+    This parses a column once into a sparse matrix so that modal
+    categories, capacity adjustments for a category selection, and
+    category totals are vectorized operations instead of row-by-row JSON
+    parsing. Matrices are cached by the content of the column.
+    """
+
+    #: number of parsed columns to keep in memory
+    max_cached = 16
+
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, index, rows, cols, values, categories):
+        """Initialize CharacterizationMatrix object.
+
+        Parameters
+        ----------
+        index : pd.Index
+            Index of the characterization column, one entry per row.
+        rows : np.ndarray
+            Row position of each (row, category) count, in the order the
+            categories appear in each JSON string.
+        cols : np.ndarray
+            Category position of each count.
+        values : np.ndarray
+            Each count.
+        categories : np.ndarray
+            Category keys, as found in the JSON strings.
+        """
+        self.index = index
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.categories = categories
+        self.matrix = sparse.csr_matrix(
+            (values, (rows, cols)), shape=(len(index), len(categories))
+        )
+
+    def __repr__(self):
+        """Return representation string for CharacterizationMatrix object."""
+        return (f"<CharacterizationMatrix object: rows={len(self.index)}, "
+                f"categories={len(self.categories)}>")
+
+    @classmethod
+    def from_series(cls, series):
+        """Parse (or retrieve the cached parse of) a characterization column.
+
+        Parameters
+        ----------
+        series : pd.core.series.Series
+            Column of JSON strings. Non-string entries (e.g., NaN) are
+            treated as rows without categories.
+
+        Returns
+        -------
+        CharacterizationMatrix
+        """
+        hashes = pd.util.hash_pandas_object(series, index=True).values
+        key = hashlib.sha1(hashes.tobytes()).hexdigest()
+
+        with cls._cache_lock:
+            if key in cls._cache:
+                cls._cache.move_to_end(key)
+                return cls._cache[key]
+
+        # Parse every JSON string at once
+        strings = series.values
+        parsed = np.array([isinstance(x, str) for x in strings], dtype=bool)
+        dicts = json.loads(f"[{','.join(strings[parsed])}]")
+
+        lengths = np.array([len(dct) for dct in dicts], dtype=int)
+        rows = np.repeat(np.flatnonzero(parsed), lengths)
+        keys = np.array(list(chain.from_iterable(dicts)), dtype=str)
+        values = np.array(
+            list(chain.from_iterable(dct.values() for dct in dicts)),
+            dtype=float
+        )
+        categories, cols = np.unique(keys, return_inverse=True)
+        matrix = cls(series.index, rows, cols, values,
+                     categories.astype(object))
+
+        with cls._cache_lock:
+            cls._cache[key] = matrix
+            while len(cls._cache) > cls.max_cached:
+                cls._cache.popitem(last=False)
+
+        return matrix
+
+    def modes(self):
+        """Return the category with the largest count in each row.
+
+        Ties go to the category listed first in the JSON string, and
+        rows without categories get "nan".
+
+        Returns
+        -------
+        np.ndarray
+            Category key for each row.
+        """
+        maxes = np.full(len(self.index), -np.inf)
+        np.maximum.at(maxes, self.rows, self.values)
+        is_max = self.values == maxes[self.rows]
+        rows, first = np.unique(self.rows[is_max], return_index=True)
+
+        modes = np.full(len(self.index), "nan", dtype=object)
+        modes[rows] = self.categories[self.cols[is_max][first]]
+
+        return modes
+
+    def removed_cells(self, categories):
+        """Return the number of cells in each row outside of a selection.
+
+        Parameters
+        ----------
+        categories : list
+            Category keys to keep.
+
+        Returns
+        -------
+        np.ndarray
+            Sum of the counts for every other category in each row.
+        """
+        removed = ~np.isin(self.categories, list(categories))
+        return self.matrix @ removed.astype(float)
+
+    def subset(self, index):
+        """Return the matrix for the rows with the given index labels.
+
+        Parameters
+        ----------
+        index : pd.Index
+            Labels of the rows to keep, all of which must be in this
+            matrix's index.
+
+        Returns
+        -------
+        CharacterizationMatrix
+        """
+        positions = self.index.get_indexer(index)
+        if (positions < 0).any():
+            raise KeyError("Some rows are not in the characterization "
+                           "matrix.")
+
+        # Map each kept row's counts to its new position
+        new_rows = np.full(len(self.index), -1)
+        new_rows[positions] = np.arange(len(positions))
+        order = np.argsort(new_rows[self.rows], kind="stable")
+        order = order[new_rows[self.rows][order] >= 0]
+
+        return CharacterizationMatrix(
+            index, new_rows[self.rows][order], self.cols[order],
+            self.values[order], self.categories
+        )
+
+    def sums(self):
+        """Return the total count of each category across all rows.
+
+        Returns
+        -------
+        pd.core.series.Series
+            Total counts indexed by category key, in the order the
+            categories first appear in the column.
+        """
+        totals = np.asarray(self.matrix.sum(axis=0)).ravel()
+        present, first = np.unique(self.cols, return_index=True)
+        present = present[np.argsort(first)]
+        return pd.Series(totals[present], index=self.categories[present])
@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+"""Build composite supply curves from many scenarios.
+
+A composite keeps, for each supply curve point, the row from whichever
+scenario has the best (lowest or highest) value of a variable. Scenarios
+are folded in one at a time, so only the current top `k` rows for each
+point and the table being folded are ever held in memory, while the next
+tables are read in the background.
+
+Alongside the composite table, the builder reports each point's ranked
+scenarios (with the spread between the best and second best values) and
+how many points each scenario wins. `calc_least_cost` writes these next
+to the composite in "review_outputs" (see `ranking_paths`), and records
+the inputs each composite was built from in a `CompositeManifest` so
+that composites are rebuilt when a scenario file changes.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from tqdm import tqdm
+
+from reView.utils.functions import read_file
+
+MANIFEST_FNAME = "composite_manifest.json"
+
+
+class CompositeBuilder:
+    """Fold scenario tables into a running per-point composite."""
+
+    def __init__(self, composite_variable="total_lcoe",
+                 composite_function="min", group_col="sc_point_gid", k=1):
+        """Initialize CompositeBuilder object.
+
+        Parameters
+        ----------
+        composite_variable : str, optional
+            Variable to compare scenarios on. By default, "total_lcoe".
+        composite_function : str, optional
+            Keep the "min" or "max" value of `composite_variable` for each
+            point. By default, "min".
+        group_col : str, optional
+            Column identifying points across scenarios. By default,
+            "sc_point_gid".
+        k : int, optional
+            Number of best scenarios to keep for each point. By default,
+            1.
+        """
+        if composite_function not in ("min", "max"):
+            raise ValueError("composite_function must be 'min' or 'max', "
+                             f"not {composite_function!r}.")
+        self.composite_variable = composite_variable
+        self.composite_function = composite_function
+        self.group_col = group_col
+        self.k = max(int(k), 1)
+        self._scenarios = {}
+        self._table = None
+
+    def __repr__(self):
+        """Return representation string for CompositeBuilder object."""
+        npoints = 0
+        if self._table is not None:
+            npoints = self._table[self.group_col].nunique()
+        return (f"<CompositeBuilder object: {self.composite_function}"
+                f"({self.composite_variable}), k={self.k}, "
+                f"{npoints} points>")
+
+    def add(self, df):
+        """Fold a scenario table into the composite.
+
+        Ties go to the scenario added first and missing values always
+        lose, unless a point has no other value.
+
+        Parameters
+        ----------
+        df : pd.core.frame.DataFrame
+            Scenario table with `group_col` and `composite_variable`
+            columns, and (for rankings) a "scenario" column.
+        """
+        if "scenario" in df:
+            self._scenarios.update(dict.fromkeys(df["scenario"].unique()))
+        if self._table is None:
+            table = df.reset_index(drop=True)
+        else:
+            table = pd.concat([self._table, df], ignore_index=True)
+        self._table = table.iloc[self._winners(table)]
+
+    def result(self):
+        """Return the composite table, ordered by `group_col`.
+
+        Returns
+        -------
+        pd.core.frame.DataFrame
+            One row for each point seen in any scenario.
+        """
+        if self._table is None:
+            return pd.DataFrame()
+        best = self._ranks() == 0
+        return self._table[best].reset_index(drop=True)
+
+    def rankings(self):
+        """Return each point's best scenarios side by side.
+
+        Returns
+        -------
+        pd.core.frame.DataFrame
+            One row for each point with "scenario_{rank}" and
+            "{composite_variable}_{rank}" columns for ranks 1 to `k`, and
+            a "{composite_variable}_spread" column with the absolute
+            difference between the best and second best values.
+        """
+        var = self.composite_variable
+        if self._table is None:
+            return pd.DataFrame()
+
+        ranks = self._ranks()
+        best = self._table[ranks == 0]
+        rankings = pd.DataFrame({self.group_col: best[self.group_col].values})
+        for rank in range(self.k):
+            rows = self._table[ranks == rank].set_index(self.group_col)
+            for name in ["scenario", var]:
+                if name in rows:
+                    values = rows[name].reindex(rankings[self.group_col])
+                    rankings[f"{name}_{rank + 1}"] = values.values
+                else:
+                    rankings[f"{name}_{rank + 1}"] = None
+
+        if self.k > 1:
+            first = rankings[f"{var}_1"].astype(float)
+            second = rankings[f"{var}_2"].astype(float)
+            rankings[f"{var}_spread"] = (second - first).abs()
+
+        return rankings
+
+    def wins(self):
+        """Return the number of points each scenario wins.
+
+        Returns
+        -------
+        pd.Series
+            Number of points won, indexed by scenario name and sorted from
+            most to fewest wins. Scenarios without a win are included.
+        """
+        counts = pd.Series(0, index=list(self._scenarios), dtype=int)
+        if self._table is not None and "scenario" in self._table:
+            best = self._table["scenario"][self._ranks() == 0]
+            won = best.value_counts()
+            counts = counts.add(won, fill_value=0).astype(int)
+        counts = counts.rename("wins").rename_axis("scenario")
+        return counts.sort_values(ascending=False, kind="stable")
+
+    def _ranks(self):
+        """Return the rank of each row in the current table (0 is best)."""
+        return _group_ranks(self._table[self.group_col].values)
+
+    def _winners(self, table):
+        """Return the positions of each point's top `k` rows in a table."""
+        gids = table[self.group_col].values
+        values = pd.to_numeric(table[self.composite_variable],
+                               errors="coerce").to_numpy(dtype=float)
+        if self.composite_function == "max":
+            values = -values
+        missing = np.isnan(values)
+
+        # Sort by point, then value (missing last), then original position
+        order = np.lexsort((values, missing, gids))
+        return order[_group_ranks(gids[order]) < self.k]
+
+
+class CompositeManifest:
+    """Record the inputs that composite tables in a directory came from.
+
+    The manifest is a JSON file in the composite output directory with an
+    entry for each composite file name. Each entry holds the composite
+    function and variable and a fingerprint (size, modification time, and
+    optionally a SHA1 of the contents) of every input scenario.
+    """
+
+    def __init__(self, directory, content_hash=False):
+        """Initialize CompositeManifest object.
+
+        Parameters
+        ----------
+        directory : str | pathlib.Path
+            Directory holding composite tables (e.g., "review_outputs").
+        content_hash : bool, optional
+            Include a SHA1 hash of each input's contents in fingerprints.
+            This catches edits that keep a file's size and modification
+            time, at the cost of reading every input. By default,
+            `False`.
+        """
+        self.directory = Path(directory)
+        self.path = self.directory.joinpath(MANIFEST_FNAME)
+        self.content_hash = content_hash
+
+    def __repr__(self):
+        """Return representation string for CompositeManifest object."""
+        return f"<CompositeManifest object: path={self.path}>"
+
+    def entry(self, paths, composite_function, composite_variable):
+        """Build the manifest entry for a composite of the given inputs.
+
+        Parameters
+        ----------
+        paths : list
+            Paths to the scenario tables.
+        composite_function : str
+            "min" or "max".
+        composite_variable : str
+            Variable the scenarios are compared on.
+
+        Returns
+        -------
+        dict
+            Manifest entry.
+        """
+        return {
+            "function": composite_function,
+            "variable": composite_variable,
+            "inputs": [
+                fingerprint(path, self.content_hash)
+                for path in sorted(str(path) for path in paths)
+            ],
+        }
+
+    def is_current(self, dst, paths, composite_function,
+                   composite_variable):
+        """Check whether a composite table is up to date with its inputs.
+
+        Parameters
+        ----------
+        dst : str | pathlib.Path
+            Path to the composite table.
+        paths : list
+            Paths to the scenario tables.
+        composite_function : str
+            "min" or "max".
+        composite_variable : str
+            Variable the scenarios are compared on.
+
+        Returns
+        -------
+        bool
+            `True` if the composite and its rankings exist and were built
+            from the same function, variable, and input files.
+        """
+        dst = Path(dst)
+        outputs = [dst, *ranking_paths(dst).values()]
+        if not all(path.exists() for path in outputs):
+            return False
+        recorded = self.read().get(dst.name)
+        if recorded is None:
+            return False
+        entry = self.entry(paths, composite_function, composite_variable)
+        if self.content_hash:
+            return recorded == entry
+
+        # Entries recorded with hashes are still current without them
+        for fprint in recorded.get("inputs", []):
+            fprint.pop("sha1", None)
+        return recorded == entry
+
+    def read(self):
+        """Read the manifest.
+
+        Returns
+        -------
+        dict
+            Entries keyed by composite file name.
+        """
+        if not self.path.exists():
+            return {}
+        with open(self.path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def record(self, dst, paths, composite_function, composite_variable):
+        """Record the inputs a composite table was just built from.
+
+        Parameters
+        ----------
+        dst : str | pathlib.Path
+            Path to the composite table.
+        paths : list
+            Paths to the scenario tables.
+        composite_function : str
+            "min" or "max".
+        composite_variable : str
+            Variable the scenarios are compared on.
+        """
+        manifest = self.read()
+        manifest[Path(dst).name] = self.entry(paths, composite_function,
+                                              composite_variable)
+
+        # Drop entries whose composite files have been removed
+        manifest = {
+            fname: entry for fname, entry in manifest.items()
+            if self.directory.joinpath(fname).exists()
+        }
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False,
+            encoding="utf-8"
+        ) as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(file.name, self.path)
+
+
+def composite_digest(paths, composite_function, composite_variable):
+    """Return a digest identifying a composite's inputs and settings.
+
+    Parameters
+    ----------
+    paths : list
+        Paths to the scenario tables.
+    composite_function : str
+        "min" or "max".
+    composite_variable : str
+        Variable the scenarios are compared on.
+
+    Returns
+    -------
+    str
+        SHA1 hex digest of the sorted input paths, function, and variable.
+    """
+    key = [sorted(str(path) for path in paths), composite_function,
+           composite_variable]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+
+def fingerprint(path, content_hash=False):
+    """Return a fingerprint of a file's current contents.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        Path to a file.
+    content_hash : bool, optional
+        Include a SHA1 hash of the file's contents. By default, `False`.
+
+    Returns
+    -------
+    dict
+        The file's path, size in bytes, and modification time (in
+        nanoseconds), and "sha1" if requested. Missing files have a size
+        and modification time of `None`.
+    """
+    fprint = {"path": str(path), "size": None, "mtime": None}
+    if os.path.exists(path):
+        stat = os.stat(path)
+        fprint.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+        if content_hash:
+            sha1 = hashlib.sha1()
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    sha1.update(chunk)
+            fprint["sha1"] = sha1.hexdigest()
+    return fprint
+
+
+def _group_ranks(gids):
+    """Return each row's position within its run of equal, sorted gids."""
+    starts = np.ones(len(gids), dtype=bool)
+    starts[1:] = gids[1:] != gids[:-1]
+    positions = np.arange(len(gids))
+    return positions - np.maximum.accumulate(np.where(starts, positions, 0))
+
+
+def read_tables(paths, reader=read_file, prefetch=2):
+    """Yield tables in order while reading the next few in the background.
+
+    Parameters
+    ----------
+    paths : list
+        Paths to the tables to read.
+    reader : callable, optional
+        Function that reads a path into a data frame. By default,
+        `read_file`.
+    prefetch : int, optional
+        Maximum number of tables to read ahead. By default, 2.
+
+    Yields
+    ------
+    pd.core.frame.DataFrame
+        The table for each path.
+    """
+    paths = iter(paths)
+    with ThreadPoolExecutor(max(prefetch, 1)) as pool:
+        futures = deque(pool.submit(reader, path)
+                        for path in islice(paths, max(prefetch, 1)))
+        while futures:
+            df = futures.popleft().result()
+            for path in islice(paths, 1):
+                futures.append(pool.submit(reader, path))
+            yield df
+
+
+def build_composite(paths, composite_variable="total_lcoe",
+                    composite_function="min", group_col="sc_point_gid", k=1,
+                    prefetch=2, progress=None):
+    """Fold scenario tables into a composite, reading them one at a time.
+
+    Parameters
+    ----------
+    paths : list
+        Paths to the scenario tables.
+    composite_variable : str, optional
+        Variable to compare scenarios on. By default, "total_lcoe".
+    composite_function : str, optional
+        Keep the "min" or "max" value of `composite_variable` for each
+        point. By default, "min".
+    group_col : str, optional
+        Column identifying points across scenarios. By default,
+        "sc_point_gid".
+    k : int, optional
+        Number of best scenarios to keep for each point. By default, 1.
+    prefetch : int, optional
+        Maximum number of tables to read ahead. By default, 2.
+    progress : callable, optional
+        Called with the number of scenarios folded in so far and the
+        total after each one (e.g., `reView.utils.jobs.report_progress`).
+        By default, `None`.
+
+    Returns
+    -------
+    CompositeBuilder
+        Builder holding the composite, rankings, and win counts.
+    """
+    builder = CompositeBuilder(composite_variable, composite_function,
+                               group_col, k=k)
+    tables = read_tables(paths, prefetch=prefetch)
+    for i, df in enumerate(tqdm(tables, total=len(paths))):
+        builder.add(df)
+        if progress is not None:
+            progress(i + 1, len(paths))
+    return builder
+
+
+def ranking_paths(dst):
+    """Return the paths of the files written next to a composite table.
+
+    These use extensions that are not picked up as project scenarios.
+
+    Parameters
+    ----------
+    dst : str | pathlib.Path
+        Path to the composite table.
+
+    Returns
+    -------
+    dict
+        Paths to the "rankings" (Feather) and "wins" (JSON) files.
+    """
+    dst = Path(dst)
+    return {
+        "rankings": dst.with_suffix(".rankings.feather"),
+        "wins": dst.with_suffix(".wins.json"),
+    }
+
+
+def read_wins(dst):
+    """Read the scenario win counts written next to a composite table.
+
+    Parameters
+    ----------
+    dst : str | pathlib.Path
+        Path to the composite table.
+
+    Returns
+    -------
+    pd.Series | None
+        Number of points won, indexed by scenario name, or `None` if the
+        composite was built without win counts.
+    """
+    path = ranking_paths(dst)["wins"]
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as file:
+        wins = json.load(file)
+    return pd.Series(wins, name="wins", dtype=int).rename_axis("scenario")
+
+
+def stream_composite(paths, composite_variable="total_lcoe",
+                     composite_function="min", group_col="sc_point_gid",
+                     prefetch=2):
+    """Build a composite table, reading scenarios one at a time.
+
+    Parameters
+    ----------
+    paths : list
+        Paths to the scenario tables.
+    composite_variable : str, optional
+        Variable to compare scenarios on. By default, "total_lcoe".
+    composite_function : str, optional
+        Keep the "min" or "max" value of `composite_variable` for each
+        point. By default, "min".
+    group_col : str, optional
+        Column identifying points across scenarios. By default,
+        "sc_point_gid".
+    prefetch : int, optional
+        Maximum number of tables to read ahead. By default, 2.
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+        One row for each point with the winning scenario's values and
+        name (in the "scenario" column).
+    """
+    builder = build_composite(paths, composite_variable, composite_function,
+                              group_col, prefetch=prefetch)
+    return builder.result()
+
+
+def write_rankings(builder, dst):
+    """Write a builder's rankings and win counts next to its composite.
+
+    Parameters
+    ----------
+    builder : CompositeBuilder
+        Builder that scenarios have been folded into.
+    dst : str | pathlib.Path
+        Path to the composite table.
+    """
+    paths = ranking_paths(dst)
+    builder.rankings().to_feather(paths["rankings"])
+    with open(paths["wins"], "w", encoding="utf-8") as file:
+        json.dump(builder.wins().to_dict(), file, indent=4)
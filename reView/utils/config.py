@@ -23,6 +23,7 @@ from reView.utils.functions import (
     load_project_configs,
     strip_rev_filename_endings,
 )
+from reView.utils.spatial import HaversineIndex
 
 pd.set_option("mode.chained_assignment", None)
 
@@ -84,6 +85,15 @@ class Config:
         """Return demand data if it exists."""
         return self._safe_read("demand_file")
 
+    @property
+    def demand_index(self):
+        """Return a spatial index over the demand data, if it exists.
+
+        The index is built once for each demand file and its positions
+        match the rows of `demand_data`.
+        """
+        return _demand_index(self._extract_fp_from_config("demand_file"))
+
     @property
     def eos(self):
         """Return capacity-dependent scaling information if available."""
@@ -269,6 +279,15 @@ class Config:
             )
 
 
+@lru_cache(maxsize=16)
+def _demand_index(path):
+    """Build a spatial index over the demand points in a file."""
+    data = _safe_read_csv(path)
+    if data is None:
+        return None
+    return HaversineIndex.from_frame(data)
+
+
 @lru_cache(maxsize=16)
 def _safe_read_csv(path):
     """Read the csv from path without throwing error if it DNE."""
@@ -120,6 +120,32 @@ DEFAULT_LAYOUT = {
     },
 }
 DEFAULT_POINT_SIZE = 5
+MAP_COLUMNS = [  # Always read these in, regardless of the variables selected
+    "annual_energy-means",
+    "area_sq_km",
+    "capacity",
+    "county",
+    "dist_to_h2_load_km",
+    "hybrid_capacity",
+    "hydrogen_annual_kg",
+    "latitude",
+    "lcot",
+    "longitude",
+    "mean_cf",
+    "mean_lcoe",
+    "no_pipe_lcoh_fcr",
+    "offshore",
+    "pipe_lcoh_component",
+    "sc_point_gid",
+    "scenario",
+    "solar_area_sq_km",
+    "state",
+    "total_lcoe",
+    "total_lcoh_fcr",
+    "turbine_x_coords",
+    "turbine_y_coords",
+    "wind_area_sq_km",
+]
 ORIGINAL_FIELDS = [
     "sc_gid",
     "res_gids",
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""Decimate large chart traces before they are drawn.
+
+Cumulative supply curves and scatter charts have one point per site for
+every scenario, far more than can be told apart on screen. `decimate`
+keeps a point budget for each chart:
+
+    - Curves keep the lowest and highest point in each of a number of
+      equal-width x buckets (a min/max envelope), which draws the same
+      line as every point would.
+    - Scatter charts keep one point in each occupied cell of a square
+      grid over the chart, which keeps the shape of the point cloud and
+      its outliers.
+
+Selections on a decimated chart only contain the points that were drawn,
+so box and lasso selections are resolved against every point of the
+chart with a `ChartIndex` instead. Those points are kept on the server
+with `store_chart_index`, and only their cache key is sent to the
+browser.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from reView.app import cache2
+
+MAX_POINTS = 20_000  # Largest number of points to draw in one chart
+MIN_GROUP_POINTS = 1_000  # Smallest budget for each scenario in a chart
+
+
+def decimate(df, x_col, y_col, group_col=None, max_points=MAX_POINTS,
+             method="envelope"):
+    """Return the rows of a chart table to draw for a point budget.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Table with a row for every point in the chart.
+    x_col, y_col : str
+        Columns drawn on the x and y axes.
+    group_col : str, optional
+        Column with the trace (e.g., scenario) of each point. The budget
+        is split evenly between traces, with at least `MIN_GROUP_POINTS`
+        each. By default, `None`, which treats `df` as one trace.
+    max_points : int, optional
+        Largest number of points to draw. Traces within their share of
+        the budget are drawn in full. By default, `MAX_POINTS`.
+    method : {"envelope", "grid"}, optional
+        Keep the lowest and highest point in each x bucket of a curve
+        ("envelope"), or one point in each grid cell of a scatter chart
+        ("grid"). By default, "envelope".
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+        Rows of `df` to draw, in their original order.
+    """
+    if len(df) <= max_points:
+        return df
+
+    if group_col is None:
+        groups = np.zeros(len(df), dtype=int)
+    else:
+        groups = df[group_col].factorize()[0]
+    ngroups = groups.max() + 1
+    budget = max(max_points // ngroups, MIN_GROUP_POINTS)
+
+    x = df[x_col].values.astype(float)
+    y = df[y_col].values.astype(float)
+    keep = []
+    for group in range(ngroups):
+        positions = np.flatnonzero(groups == group)
+        if len(positions) <= budget:
+            keep.append(positions)
+        elif method == "grid":
+            ncells = int(np.sqrt(budget))
+            keep.append(positions[grid_sample(x[positions], y[positions],
+                                              ncells)])
+        else:
+            nbuckets = budget // 2
+            keep.append(positions[minmax_buckets(x[positions], y[positions],
+                                                 nbuckets)])
+
+    return df.iloc[np.sort(np.concatenate(keep))]
+
+
+def grid_sample(x, y, ncells):
+    """Return the first point in each occupied cell of a square grid.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Point coordinates. Points with missing coordinates are dropped.
+    ncells : int
+        Number of grid cells along each axis.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted positions of the sampled points.
+    """
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    cols = _bucket(x[valid], ncells)
+    rows = _bucket(y[valid], ncells)
+    __, first = np.unique(cols * ncells + rows, return_index=True)
+    return np.sort(valid[first])
+
+
+def minmax_buckets(x, y, nbuckets):
+    """Return the lowest and highest point in each x bucket.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Point coordinates. Points with missing coordinates are dropped.
+    nbuckets : int
+        Number of equal-width x buckets.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted positions of the kept points.
+    """
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if valid.size == 0:
+        return valid
+    buckets = _bucket(x[valid], nbuckets)
+    order = np.lexsort((y[valid], buckets))
+    ordered = buckets[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    return np.unique(valid[order[np.r_[starts, ends]]])
+
+
+def read_chart_index(key):
+    """Return the index over every point of a stored chart.
+
+    Parameters
+    ----------
+    key : str
+        Cache key returned by `store_chart_index`.
+
+    Returns
+    -------
+    ChartIndex | None
+        Index over the chart's points, or `None` if there is no key or
+        the points are no longer cached.
+    """
+    if not key:
+        return None
+    points = cache2.get(key)
+    if points is None:
+        return None
+    return ChartIndex(points["x"], points["y"], points["sc_point_gid"])
+
+
+def store_chart_index(points):
+    """Store every point of a chart on the server.
+
+    Decimated charts only send some of their points to the browser, so
+    selections on them are resolved against these points instead (see
+    `read_chart_index`).
+
+    Parameters
+    ----------
+    points : pd.core.frame.DataFrame | None
+        Table with the "x", "y", and "sc_point_gid" of every point in the
+        chart (see `Plots.chart_points`).
+
+    Returns
+    -------
+    str | None
+        Cache key of the points, which is the same for charts with the
+        same points, or `None` if there are no points.
+    """
+    if points is None:
+        return None
+
+    hashes = pd.util.hash_pandas_object(points, index=False).values
+    key = f"chart_{hashlib.sha1(hashes.tobytes()).hexdigest()}"
+    if not cache2.has(key):
+        cache2.set(key, points, timeout=0)
+
+    return key
+
+
+def _bucket(values, nbuckets):
+    """Return the equal-width bucket of each value."""
+    if values.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    vmin, vmax = values.min(), values.max()
+    if vmax <= vmin:
+        return np.zeros(len(values), dtype=np.int64)
+    buckets = ((values - vmin) / (vmax - vmin) * nbuckets).astype(np.int64)
+    return np.minimum(buckets, nbuckets - 1)
+
+
+class ChartIndex:
+    """Resolve box and lasso chart selections against every point."""
+
+    def __init__(self, x, y, gids):
+        """Initialize ChartIndex object.
+
+        Parameters
+        ----------
+        x, y : array-like
+            Coordinates of every point in the chart, including those
+            that were not drawn.
+        gids : array-like
+            Site ID ("sc_point_gid") of each point.
+        """
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.gids = np.asarray(gids)
+
+    def __repr__(self):
+        """Return representation string for ChartIndex object."""
+        return f"<ChartIndex object: {len(self.gids):,} points>"
+
+    def select(self, selection):
+        """Return the IDs of the sites in a chart box or lasso selection.
+
+        Parameters
+        ----------
+        selection : dict
+            Plotly `selectedData` from the chart.
+
+        Returns
+        -------
+        np.ndarray | None
+            Unique IDs of the selected sites, or `None` if the selection
+            has no box or lasso geometry (e.g., clicked points).
+        """
+        if "range" in selection:
+            x_range = selection["range"].get("x")
+            y_range = selection["range"].get("y")
+            if x_range is None or y_range is None:
+                return None
+            inside = ((self.x >= min(x_range)) & (self.x <= max(x_range))
+                      & (self.y >= min(y_range)) & (self.y <= max(y_range)))
+        elif "lassoPoints" in selection:
+            lasso_x = selection["lassoPoints"].get("x")
+            lasso_y = selection["lassoPoints"].get("y")
+            if lasso_x is None or lasso_y is None:
+                return None
+            if len(lasso_x) < 3:
+                return self.gids[:0]
+            shape = shapely.Polygon(np.column_stack([lasso_x, lasso_y]))
+            inside = shapely.contains_xy(shape, self.x, self.y)
+        else:
+            return None
+
+        return np.unique(self.gids[inside])
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""Allocate supply curve sites to demand (load) centers.
+
+Each load center takes its cheapest sites, in order of cost, until their
+cumulative supply meets its demand. Every load center is allocated in a
+single pass: one sort by (load, cost), a grouped cumulative sum, and a
+comparison against each row's load demand. This works the same for one
+or thousands of load centers and does not depend on the Dash app.
+
+The scenario page's demand map functions use the helpers below to find
+the load centers a user selected and the sites that would supply them.
+"""
+import numpy as np
+import pandas as pd
+
+from sklearn.metrics import DistanceMetric
+
+from reView.utils.spatial import EARTH_RADIUS_KM
+
+DIST_METRIC = DistanceMetric.get_metric("haversine")
+
+
+def allocation_mask(loads, costs, supply, demand, include_marginal=False):
+    """Find the sites allocated to each load center.
+
+    Parameters
+    ----------
+    loads : array-like
+        Load center each site could supply (one entry per site).
+    costs : array-like
+        Cost of supplying the load center from each site.
+    supply : array-like
+        Supply available from each site.
+    demand : array-like
+        Demand of the load center for each site.
+    include_marginal : bool, optional
+        Also keep the site whose supply first meets or passes the demand,
+        so that allocated supply covers the demand. Otherwise, only keep
+        sites whose cumulative supply is within the demand, and keep every
+        site of a load center that even the cheapest site oversupplies.
+        By default, `False`.
+
+    Returns
+    -------
+    tuple
+        Positions that sort sites by (load, cost), and, in that order,
+        boolean array of allocated sites and cumulative supply of each
+        site's load center.
+    """
+    loads = np.asarray(loads)
+    costs = np.asarray(costs, dtype=float)
+    supply = np.asarray(supply, dtype=float)
+    demand = np.asarray(demand, dtype=float)
+
+    order = np.lexsort((costs, loads))
+    loads = loads[order]
+    supply = supply[order]
+    demand = demand[order]
+    cumulative = pd.Series(supply).groupby(loads, sort=False).cumsum()
+    cumulative = cumulative.values
+
+    if include_marginal:
+        keep = cumulative - supply < demand
+    else:
+        keep = cumulative <= demand
+
+        # Load centers without any site within their demand keep them all
+        starts = np.flatnonzero(np.r_[True, loads[1:] != loads[:-1]])
+        kept = np.logical_or.reduceat(keep, starts) if len(keep) else keep
+        sizes = np.diff(np.r_[starts, len(keep)])
+        keep |= np.repeat(~kept, sizes)
+
+    return order, keep, cumulative
+
+
+def allocate_supply(df, demand, load_col="h2_load_id",
+                    cost_col="total_lcoh_fcr", supply_col="hydrogen_annual_kg",
+                    include_marginal=False, cumulative_col="h2_supply"):
+    """Return the sites allocated to each load center.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Supply curve table with a row for each site and the load center it
+        could supply.
+    demand : pd.Series
+        Demand of each load center, indexed by the values in `load_col`.
+    load_col : str, optional
+        Column with each site's load center. By default, "h2_load_id".
+    cost_col : str, optional
+        Column with the cost of supplying the load center from each site.
+        By default, "total_lcoh_fcr".
+    supply_col : str, optional
+        Column with the supply available from each site. By default,
+        "hydrogen_annual_kg".
+    include_marginal : bool, optional
+        Also keep the site that first meets the demand (see
+        `allocation_mask`). By default, `False`.
+    cumulative_col : str, optional
+        Name of the column to store the cumulative supply of each site's
+        load center in. By default, "h2_supply".
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+        Allocated sites, ordered by load center and then cost.
+    """
+    order, keep, cumulative = allocation_mask(
+        df[load_col].values,
+        df[cost_col].values,
+        df[supply_col].values,
+        df[load_col].map(demand).values,
+        include_marginal=include_marginal,
+    )
+    df = df.iloc[order].assign(**{cumulative_col: cumulative})
+    return df[keep]
+
+
+def closest_demand_to_coords(selection_coords, demand_index):
+    """Find the demand point closest to a selection.
+
+    Parameters
+    ----------
+    selection_coords : array-like
+        (latitude, longitude) of the selection, in degrees.
+    demand_index : reView.utils.spatial.HaversineIndex
+        Spatial index over the demand data (see `Config.demand_index`).
+
+    Returns
+    -------
+    int
+        Position of the closest demand point in the demand data.
+    """
+    __, inds = demand_index.nearest(selection_coords)
+    return int(inds[0, 0])
+
+
+def closest_load_center(load_center_ind, demand_data):
+    """Return the location and demand of a load center.
+
+    Parameters
+    ----------
+    load_center_ind : int
+        Position of the load center in `demand_data`.
+    demand_data : pd.core.frame.DataFrame
+        Load center table with "latitude", "longitude", and "load"
+        columns.
+
+    Returns
+    -------
+    tuple
+        (latitude, longitude) of the load center, in radians, and its
+        demand.
+    """
+    demand_coords = demand_data[["latitude", "longitude"]].values
+    demand_coords_rad = np.radians(demand_coords)
+    load_center_info = demand_data.iloc[load_center_ind]
+    load_center_coords = demand_coords_rad[load_center_ind]
+    load = load_center_info[["load"]].values[0]
+    return load_center_coords, load
+
+
+def demand_connections(df, demand_data):
+    """Count the selected load centers each site would supply.
+
+    Every load center takes the cheapest sites (by their levelized cost
+    of hydrogen delivered to it) up to and including the site that meets
+    its demand.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Hydrogen supply curve table.
+    demand_data : pd.core.frame.DataFrame
+        Selected load centers, with "latitude", "longitude", and "load"
+        (kg) columns.
+
+    Returns
+    -------
+    np.ndarray
+        Number of load centers each site in `df` is allocated to.
+    """
+    coords = np.radians(demand_data[["latitude", "longitude"]].values)
+    __, lcoh = selected_load_costs(df, coords)
+    nloads, nsites = lcoh.shape
+    order, keep, __ = allocation_mask(
+        np.repeat(np.arange(nloads), nsites),
+        lcoh.ravel(),
+        np.tile(df["hydrogen_annual_kg"].values, nloads),
+        np.repeat(demand_data["load"].values, nsites),
+        include_marginal=True
+    )
+    allocated = np.zeros(nloads * nsites, dtype=bool)
+    allocated[order] = keep
+    return allocated.reshape(nloads, nsites).sum(axis=0)
+
+
+def filter_on_load_selection(df, load_center_ind, demand_data):
+    """Return the sites that supply a selected load center.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Hydrogen supply curve table.
+    load_center_ind : int
+        Position of the selected load center in `demand_data`.
+    demand_data : pd.core.frame.DataFrame
+        Load center table (see `closest_load_center`).
+
+    Returns
+    -------
+    tuple
+        Sites that supply the load center (see
+        `filter_points_by_demand`) and the load center's row of
+        `demand_data`.
+    """
+    load_center_coords, load = closest_load_center(
+        load_center_ind, demand_data
+    )
+    demand_data = demand_data.iloc[load_center_ind: load_center_ind + 1]
+    df = filter_points_by_demand(df, load_center_coords, load)
+    return df, demand_data
+
+
+def filter_points_by_demand(df, load_center_coords, load):
+    """Return the cheapest sites that meet the demand of a load center.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Hydrogen supply curve table.
+    load_center_coords : array-like
+        (latitude, longitude) of the load center, in radians.
+    load : float
+        Demand of the load center (kg).
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+        Sites ordered by their cost of supplying the load center, up to
+        and including the site that meets its demand.
+    """
+    dists, lcoh = selected_load_costs(df, load_center_coords)
+    df["dist_to_selected_load"] = dists[0]
+    df["selected_load_pipe_lcoh_component"] = (
+        df["pipe_lcoh_component"]
+        / df["dist_to_h2_load_km"]
+        * df["dist_to_selected_load"]
+    )
+    df["selected_lcoh"] = lcoh[0]
+    order, keep, supply = allocation_mask(
+        np.zeros(df.shape[0]),
+        df["selected_lcoh"].values,
+        df["hydrogen_annual_kg"].values,
+        np.full(df.shape[0], load),
+        include_marginal=True
+    )
+    df = df.iloc[order].assign(h2_supply=supply)
+    return df[keep]
+
+
+def selected_load_costs(df, load_center_coords):
+    """Return the cost of supplying load centers from each site.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Hydrogen supply curve table.
+    load_center_coords : array-like
+        (latitude, longitude) of one or more load centers, in radians.
+
+    Returns
+    -------
+    tuple
+        (load centers, sites) arrays of the distance (km) to and the
+        levelized cost of hydrogen delivered to each load center.
+    """
+    sc_coords = np.radians(df[["latitude", "longitude"]].values)
+    load_center_coords = np.array(load_center_coords).reshape(-1, 2)
+    dists = DIST_METRIC.pairwise(load_center_coords, sc_coords)
+    dists *= EARTH_RADIUS_KM
+    pipe_cost = df["pipe_lcoh_component"] / df["dist_to_h2_load_km"]
+    lcoh = df["no_pipe_lcoh_fcr"].values + pipe_cost.values * dists
+    return dists, lcoh
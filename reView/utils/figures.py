@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Compact plotly figures before they are sent to the browser.
+
+Plotly serializes numpy arrays as JSON text, so every float64 latitude,
+longitude or color value costs up to ~20 characters. `compact_figure`
+rounds per-point arrays to the precision they can be displayed at,
+replaces arrays that hold a single repeated value with that value, and,
+where the bundled plotly.js can decode them (v2.28+, bundled with Dash
+2.16+), encodes numeric arrays as base64 typed arrays ("bdata") of
+float32 values instead of text.
+"""
+import base64
+import json
+import logging
+
+import dash
+import numpy as np
+
+from plotly.utils import PlotlyJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Per-point data arrays, which are rounded and encoded
+DATA_KEYS = {"customdata", "lat", "lon", "x", "y", "z"}
+
+# Per-point style arrays, which may also hold a single repeated value
+STYLE_KEYS = {"color", "opacity", "size"}
+
+
+def _typed_arrays_supported():
+    """Check if Dash's bundled plotly.js decodes typed array specs."""
+    try:
+        version = tuple(int(v) for v in dash.__version__.split(".")[:2])
+    except ValueError:
+        return False
+    return version >= (2, 16)
+
+
+TYPED_ARRAYS = _typed_arrays_supported()
+
+
+def compact_figure(figure, decimals=None, significant=6,
+                   typed_arrays=TYPED_ARRAYS):
+    """Return a compact, JSON-ready version of a figure.
+
+    Parameters
+    ----------
+    figure : plotly.graph_objs._figure.Figure | dict
+        Figure to compact.
+    decimals : dict, optional
+        Number of decimals to round specific attributes (e.g., "lat" and
+        "lon") to. Other float arrays are rounded to `significant`
+        digits. By default, `None`.
+    significant : int, optional
+        Number of significant digits to keep in other float arrays. By
+        default, 6, which float32 holds exactly.
+    typed_arrays : bool, optional
+        Encode numeric arrays as base64 typed arrays. By default,
+        `TYPED_ARRAYS`, which is `True` if Dash's plotly.js supports
+        them.
+
+    Returns
+    -------
+    dict
+        Figure dictionary with "data" and "layout" entries that Dash can
+        return from a callback.
+    """
+    if hasattr(figure, "to_plotly_json"):
+        fig = figure.to_plotly_json()
+    else:
+        fig = dict(figure)
+    decimals = decimals or {}
+
+    fig["data"] = [
+        _compact_attributes(trace, decimals, significant, typed_arrays)
+        for trace in fig.get("data", [])
+    ]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        before = len(json.dumps(figure, cls=PlotlyJSONEncoder))
+        after = len(json.dumps(fig, cls=PlotlyJSONEncoder))
+        logger.debug("Compacted figure payload from %s to %s bytes (%.0f%%)",
+                     f"{before:,}", f"{after:,}",
+                     100 * (1 - after / max(before, 1)))
+
+    return fig
+
+
+def _compact_array(key, value, decimals, significant, typed_arrays):
+    """Round, collapse or encode one array attribute."""
+    values = np.asarray(value)
+    if values.size == 0:
+        return value
+
+    # Style values repeated for every point only need to be sent once
+    if key in STYLE_KEYS and values.ndim == 1 and _is_constant(values):
+        return values[0].item() if values.dtype.kind != "O" else values[0]
+
+    if values.dtype.kind not in "iuf":
+        return value
+
+    if values.dtype.kind == "f":
+        if key in decimals:
+            values = np.round(values, decimals[key])
+        else:
+            values = _round_significant(values, significant)
+
+    if not typed_arrays:
+        return values
+
+    # Custom data carries site IDs, which need more digits than float32
+    if values.dtype.kind == "f":
+        dtype = "<f8" if key == "customdata" else "<f4"
+    elif values.min() >= -2**31 and values.max() < 2**31:
+        dtype = "<i4"
+    else:
+        return values
+
+    spec = {
+        "dtype": dtype[1:],
+        "bdata": base64.b64encode(
+            np.ascontiguousarray(values, dtype=dtype).tobytes()
+        ).decode("ascii"),
+    }
+    if values.ndim > 1:
+        spec["shape"] = ",".join(str(n) for n in values.shape)
+
+    return spec
+
+
+def _compact_attributes(attrs, decimals, significant, typed_arrays):
+    """Compact the array attributes of a trace or nested attribute."""
+    compacted = {}
+    for key, value in attrs.items():
+        if isinstance(value, dict):
+            value = _compact_attributes(value, decimals, significant,
+                                        typed_arrays)
+        elif key in DATA_KEYS | STYLE_KEYS and _is_array(value):
+            value = _compact_array(key, value, decimals, significant,
+                                   typed_arrays)
+        compacted[key] = value
+    return compacted
+
+
+def _is_array(value):
+    """Check if a value is a per-point array rather than a scalar."""
+    if isinstance(value, np.ndarray):
+        return value.ndim > 0
+    return isinstance(value, (list, tuple)) and len(value) > 1
+
+
+def _is_constant(values):
+    """Check if every value in a 1D array is the same."""
+    try:
+        return bool((values == values[0]).all())
+    except (TypeError, ValueError):
+        return False
+
+
+def _round_significant(values, digits):
+    """Round float values to a number of significant digits.
+
+    Columns of a 2D array (e.g., custom data) are rounded separately, so
+    each keeps the precision of its own values.
+    """
+    if values.ndim > 1:
+        return np.column_stack([_round_significant(column, digits)
+                                for column in values.T])
+    finite = np.isfinite(values)
+    if not finite.any():
+        return values
+    magnitude = np.floor(np.log10(np.abs(values[finite]).max() or 1))
+    return np.round(values, max(int(digits - 1 - magnitude), 0))
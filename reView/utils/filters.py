@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""Compile scenario filter strings into boolean row masks.
+
+Filters are strings such as "capacity >= 10", built from a variable name
+and the query a user typed for it. Each filter may hold several clauses:
+
+    capacity >= 10
+    capacity > 10 and < 50          (clauses inherit the last variable)
+    mean_lcoe between 20 and 40
+    state in ('Colorado', 'Utah')
+    state not in (Texas, Iowa)
+    offshore is null, offshore is not null
+    capacity > 100 or (mean_cf >= 0.3 and not lcot > 5)
+
+The operators are >=, >, <=, <, ==, and !=. Clauses on variables that
+are not in a table are ignored, as are empty filters. A list of filters
+is compiled once (and cached) into a `FilterExpression` that evaluates
+every clause against a data frame in a single pass over its columns.
+"""
+import operator
+import re
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+}
+KEYWORDS = {"and", "or", "not", "between", "in", "is", "null", "none"}
+
+_TOKENS = re.compile(
+    r"""\s*(?:
+        (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?![\w.-])
+        |(?P<string>'[^']*'|"[^"]*")
+        |(?P<operator>>=|<=|==|!=|>|<|=)
+        |(?P<punctuation>[(),])
+        |(?P<word>[^\s(),<>=!'"]+)
+    )""",
+    re.VERBOSE,
+)
+
+
+class FilterExpression:
+    """A compiled list of filters."""
+
+    def __init__(self, node, columns):
+        """Initialize FilterExpression object.
+
+        Parameters
+        ----------
+        node : tuple | None
+            Parsed expression tree, or `None` to keep every row.
+        columns : frozenset
+            Names of the variables the filters refer to.
+        """
+        self.node = node
+        self.columns = columns
+
+    def __repr__(self):
+        """Return representation string for FilterExpression object."""
+        return f"<FilterExpression object: columns={sorted(self.columns)}>"
+
+    def mask(self, df):
+        """Return a boolean mask of the rows that pass the filters.
+
+        Parameters
+        ----------
+        df : pd.core.frame.DataFrame
+            Table to evaluate the filters on.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array with an entry for each row in `df`.
+        """
+        keep = _evaluate(self.node, df)
+        if keep is None:
+            keep = np.ones(df.shape[0], dtype=bool)
+        return keep
+
+
+# A parser reads one filter string, so `parse` is its only entry point
+class _Parser:  # pylint: disable=too-few-public-methods
+    """Recursive descent parser for a single filter string."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.variable = None
+        self.columns = set()
+
+    def parse(self):
+        """Parse the whole filter string into an expression tree."""
+        node = self._or()
+        if self._peek() is not None:
+            self._error(f"unexpected {self._peek()[1]!r}")
+        return node
+
+    def _or(self):
+        nodes = [self._and()]
+        while self._accept("word", "or"):
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _and(self):
+        nodes = [self._factor()]
+        while self._accept("word", "and"):
+            nodes.append(self._factor())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _factor(self):
+        token = self._peek()
+        if token == ("word", "not") and self._peek(1) != ("word", "in"):
+            self.position += 1
+            return ("not", self._factor())
+        if token == ("punctuation", "("):
+            self.position += 1
+            node = self._or()
+            self._expect("punctuation", ")")
+            return node
+        return self._clause()
+
+    def _clause(self):
+        # A clause may start with a variable, or inherit the last one
+        kind, value = self._peek() or (None, None)
+        if kind == "word" and value.lower() not in KEYWORDS:
+            self.variable = value
+            self.columns.add(value)
+            self.position += 1
+        if self.variable is None:
+            self._error("missing a variable name")
+        var = self.variable
+
+        if self._peek() and self._peek()[0] == "operator":
+            operator_ = self._next()[1]
+            return ("compare", var, OPERATORS[operator_], self._value())
+        if self._accept("word", "between"):
+            low = self._value()
+            self._expect("word", "and")
+            return ("between", var, low, self._value())
+        if self._accept("word", "is"):
+            negate = self._accept("word", "not")
+            self._null()
+            return ("null", var, negate)
+        negate = self._accept("word", "not")
+        if self._accept("word", "in"):
+            return ("in", var, self._values(), negate)
+        if negate:
+            self._null()
+            return ("null", var, True)
+        return self._error("expected an operator")
+
+    def _null(self):
+        if not (self._accept("word", "null") or self._accept("word", "none")):
+            self._error("expected 'null'")
+
+    def _value(self):
+        kind, value = self._next() or (None, None)
+        if kind == "number":
+            return float(value)
+        if kind == "string":
+            return value[1:-1]
+        if kind == "word" and value.lower() not in KEYWORDS:
+            return value
+        return self._error("expected a value")
+
+    def _values(self):
+        if self._accept("punctuation", "("):
+            values = [self._value()]
+            while self._accept("punctuation", ","):
+                values.append(self._value())
+            self._expect("punctuation", ")")
+        else:
+            values = [self._value()]
+            while self._accept("punctuation", ","):
+                values.append(self._value())
+        return values
+
+    def _peek(self, offset=0):
+        index = self.position + offset
+        if index < len(self.tokens):
+            kind, value = self.tokens[index]
+            if kind == "word" and value.lower() in KEYWORDS:
+                value = value.lower()
+            return kind, value
+        return None
+
+    def _next(self):
+        token = self._peek()
+        if token is not None:
+            self.position += 1
+        return token
+
+    def _accept(self, kind, value):
+        if self._peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def _expect(self, kind, value):
+        if not self._accept(kind, value):
+            self._error(f"expected {value!r}")
+
+    def _error(self, msg):
+        raise ValueError(f"Invalid filter {self.text!r}: {msg}.")
+
+
+@lru_cache(maxsize=256)
+def compile_filters(filters):
+    """Compile filter strings into a single expression.
+
+    Parameters
+    ----------
+    filters : tuple
+        Filter strings, all of which rows must pass. Empty strings and
+        `None` are skipped.
+
+    Returns
+    -------
+    FilterExpression
+        Compiled filters.
+
+    Raises
+    ------
+    ValueError
+        If a filter string can not be parsed.
+    """
+    nodes, columns = [], set()
+    for filter_ in filters:
+        if filter_:
+            parser = _Parser(filter_)
+            nodes.append(parser.parse())
+            columns.update(parser.columns)
+
+    node = None
+    if len(nodes) == 1:
+        node = nodes[0]
+    elif nodes:
+        node = ("and", nodes)
+
+    return FilterExpression(node, frozenset(columns))
+
+
+def filter_columns(filters):
+    """Return the names of the variables that filters refer to.
+
+    Parameters
+    ----------
+    filters : list
+        Filter strings (see `compile_filters`).
+
+    Returns
+    -------
+    frozenset
+        Variable names.
+    """
+    return compile_filters(tuple(filters)).columns
+
+
+def filter_mask(df, filters):
+    """Return a boolean mask of the rows that pass the string filters.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        A reV supply curve data frame.
+    filters : list
+        Filter strings (see `compile_filters`). Filters on variables not
+        in `df` are ignored.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean array with an entry for each row in `df`.
+    """
+    return compile_filters(tuple(filters)).mask(df)
+
+
+def _evaluate(node, df):
+    """Evaluate an expression tree, `None` meaning "ignored"."""
+    kind = node[0] if node else None
+    if kind is None:
+        return None
+
+    if kind in ("and", "or"):
+        return _evaluate_branches(kind, node[1], df)
+
+    if kind == "not":
+        mask = _evaluate(node[1], df)
+        return None if mask is None else ~mask
+
+    return _evaluate_clause(node, df)
+
+
+def _evaluate_branches(kind, children, df):
+    """Combine the masks of "and" or "or" branches, skipping ignored ones."""
+    keep = None
+    for child in children:
+        mask = _evaluate(child, df)
+        if mask is None:
+            continue
+        if keep is None:
+            keep = mask
+        elif kind == "and":
+            keep &= mask
+        else:
+            keep |= mask
+    return keep
+
+
+def _evaluate_clause(node, df):
+    """Evaluate a clause, or return `None` if its variable is missing."""
+    kind, var = node[0], node[1]
+    if var not in df.columns:
+        return None
+    values = df[var].values
+
+    if kind == "compare":
+        keep = node[2](values, node[3])
+    elif kind == "between":
+        keep = (values >= node[2]) & (values <= node[3])
+    elif kind == "in":
+        keep = np.isin(values, node[2])
+        if node[3]:
+            keep = ~keep
+    else:
+        keep = pd.isnull(values)
+        if node[2]:
+            keep = ~keep
+
+    return np.asarray(keep, dtype=bool)
+
+
+def _tokenize(text):
+    """Split a filter string into (kind, value) tokens."""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKENS.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Invalid filter {text!r}: could not read "
+                             f"{text[position:]!r}.")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
@@ -11,9 +11,7 @@ from pathlib import Path
 
 import h5py
 import pandas as pd
-import pyarrow as pa
 
-from pyarrow.parquet import ParquetFile
 from pygeopkg.conversion.to_geopkg_geom import (
     point_to_gpkg_point,
     make_gpkg_geom_header
@@ -31,6 +29,7 @@ import pyproj
 
 from reView import REVIEW_CONFIG_DIR, REVIEW_DATA_DIR
 from reView.paths import Paths
+from reView.utils.sidecars import read_csv, read_parquet
 
 logger = logging.getLogger(__name__)
 
@@ -394,7 +393,7 @@ def load_project_configs(config_dir=REVIEW_CONFIG_DIR):
     return project_configs
 
 
-def read_file(file, nrows=None):
+def read_file(file, nrows=None, columns=None, sidecar=True):
     """Read a CSV, Parquet, or HDF5 file. Only the meta read for HDF5.
 
     Parameters
@@ -403,6 +402,14 @@ def read_file(file, nrows=None):
         Path to a reV data frame. CSV, Parquet, and HDF5 formats accepted.
     nrows : int
         Number of rows to read in.
+    columns : list, optional
+        Names of the columns to read in. Requested columns that are not
+        in the file are ignored. By default, `None`, which reads in
+        every column.
+    sidecar : bool, optional
+        Read CSV files through their typed Parquet sidecar, writing the
+        sidecar on the first full read if it does not exist yet (see
+        `reView.utils.sidecars`). By default, `True`.
 
     Returns
     -------
@@ -412,22 +419,27 @@ def read_file(file, nrows=None):
     ext = os.path.splitext(file)[-1]
     name = os.path.basename(file)
 
+    # Use a set for quick membership checks on wide tables
+    if columns is not None:
+        columns = set(columns)
+
     # Check extension and read file
     if ext in (".parquet", ".pqt"):
-        if nrows:
-            pf = ParquetFile(file)
-            rows = next(pf.iter_batches(batch_size=nrows))
-            data = pa.Table.from_batches([rows]).to_pandas()
-        else:
-            data = pd.read_parquet(file)
+        data = read_parquet(file, nrows, columns)
     elif ext == ".csv":
-        data = pd.read_csv(file, nrows=nrows, low_memory=False)
+        data = read_csv(file, nrows, columns, sidecar)
     elif ext == ".h5":
         with h5py.File(file, "r") as ds:
+            meta = ds["meta"]
+            if columns is not None:
+                # "meta" is a Dataset, pylint can't tell it from a Group
+                # pylint: disable=no-member
+                fields = [c for c in meta.dtype.names if c in columns]
+                meta = meta.fields(fields)
             if nrows:
-                data = pd.DataFrame(ds["meta"][:nrows])
+                data = pd.DataFrame(meta[:nrows])
             else:
-                data = pd.DataFrame(ds["meta"][:])
+                data = pd.DataFrame(meta[:])
             decode(data)
     else:
         raise OSError(f"{file}'s extension not compatible at the moment.")
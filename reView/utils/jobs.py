@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""Run long tasks in the background and track them on disk.
+
+Dash callbacks have to return before the server's worker timeout, which
+large composite builds, recalculations and downloads can exceed. A
+`JobQueue` writes each submitted call to a job directory and runs it in a
+local process pool. Callbacks store the returned job ID, poll `status`
+(e.g., from a `dcc.Interval`), and render once the job is done.
+
+Jobs are identified by their function and arguments, so submitting a
+call that is already queued or running in any worker process attaches to
+that job instead of starting another one. Long running functions can
+report their progress with `report_progress`.
+"""
+import atexit
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing as mp
+import os
+import pickle
+import tempfile
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from reView.utils.cache import _pid_alive, key_lock, remove_file
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+PROGRESS_INTERVAL = 0.5  # Minimum seconds between progress updates
+
+_CURRENT_JOB = None  # (directory, job ID) of the job run by this process
+_LAST_PROGRESS = 0
+
+
+class JobQueue:
+    """Submit calls to a local process pool backed by a disk queue."""
+
+    def __init__(self, directory, max_workers=2, max_age=86_400):
+        """Initialize JobQueue object.
+
+        Parameters
+        ----------
+        directory : str | pathlib.Path
+            Directory for job calls and status files.
+        max_workers : int, optional
+            Number of processes that run jobs for each process that
+            submits them. By default, 2.
+        max_age : int, optional
+            Seconds after which finished jobs, and files left in
+            `downloads`, are removed from the job directory. By default,
+            86,400 (one day).
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.max_age = max_age
+        self._executor = None
+        self._executor_pid = None
+
+    def __repr__(self):
+        """Return representation string for JobQueue object."""
+        return (f"<JobQueue object: directory={self.directory}, "
+                f"max_workers={self.max_workers}>")
+
+    @property
+    def downloads(self):
+        """Return the directory for files that jobs build for download."""
+        path = self.directory.joinpath("downloads")
+        path.mkdir(exist_ok=True)
+        return path
+
+    @property
+    def executor(self):
+        """Return this process's job pool, starting it if needed."""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                self.max_workers, mp_context=mp.get_context("spawn")
+            )
+            self._executor_pid = os.getpid()
+            atexit.register(self._executor.shutdown, wait=False,
+                            cancel_futures=True)
+        return self._executor
+
+    def job_id(self, func, *args, **kwargs):
+        """Return the ID of a job for a function call.
+
+        Parameters
+        ----------
+        func : callable
+            Module-level function.
+        *args, **kwargs
+            Arguments for `func`.
+
+        Returns
+        -------
+        str
+            SHA1 hex digest of the function name and its arguments.
+        """
+        key = json.dumps([_name(func), args, kwargs], sort_keys=True,
+                         default=_key_default)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def result(self, job_id):
+        """Return the value a finished job returned.
+
+        Parameters
+        ----------
+        job_id : str
+            ID returned by `submit`.
+
+        Returns
+        -------
+        obj
+            The job's return value.
+
+        Raises
+        ------
+        RuntimeError
+            If the job has not finished or has failed.
+        """
+        status = self.status(job_id)
+        if status["status"] != "done":
+            msg = f"Job {job_id} is {status['status']}"
+            if status.get("error"):
+                msg = f"{msg}: {status['error']}"
+            raise RuntimeError(msg)
+        return status.get("result")
+
+    def status(self, job_id):
+        """Return the status of a job.
+
+        Parameters
+        ----------
+        job_id : str
+            ID returned by `submit`.
+
+        Returns
+        -------
+        dict
+            Job status with "id", "name", "status" ("queued", "running",
+            "done", "failed", or "missing"), "progress" (0 to 1),
+            "message", "result", and "error" entries.
+        """
+        status = _read_status(self.directory, job_id)
+        if status is None:
+            return {"id": job_id, "status": "missing", "progress": 0}
+
+        # Jobs whose process has died will never finish
+        if status["status"] in ACTIVE and not _pid_alive(status["pid"]):
+            status = _update_status(
+                self.directory, job_id, status="failed",
+                error="The process running this job exited unexpectedly."
+            )
+
+        return status
+
+    def submit(self, func, *args, **kwargs):
+        """Run a function call in the background.
+
+        Parameters
+        ----------
+        func : callable
+            Module-level function. Its return value is stored in the
+            job's status, so it should be JSON serializable.
+        *args, **kwargs
+            Arguments for `func`.
+
+        Returns
+        -------
+        str
+            Job ID to poll with `status`.
+        """
+        self._prune()
+        job_id = self.job_id(func, *args, **kwargs)
+        with key_lock(job_id, self.directory.joinpath("locks")):
+            if self.status(job_id)["status"] in ACTIVE:
+                return job_id
+
+            with open(self._call_path(job_id), "wb") as file:
+                pickle.dump((func, args, kwargs), file)
+            _write_status(
+                self.directory,
+                {
+                    "id": job_id,
+                    "name": _name(func),
+                    "status": "queued",
+                    "progress": 0,
+                    "message": None,
+                    "result": None,
+                    "error": None,
+                    "pid": os.getpid(),
+                    "submitted": time.time(),
+                }
+            )
+
+        future = self.executor.submit(_run_job, str(self.directory), job_id)
+        future.add_done_callback(functools.partial(self._check_future,
+                                                   job_id))
+        return job_id
+
+    def _check_future(self, job_id, future):
+        """Fail jobs whose pool process broke before recording an outcome."""
+        exc = future.exception()
+        if exc is None:
+            return
+
+        # A broken pool can't run any more jobs, so start a new one next
+        if isinstance(exc, BrokenProcessPool):
+            self._executor = None
+
+        status = _read_status(self.directory, job_id) or {}
+        if status.get("status") in ACTIVE:
+            logger.error("Job %s could not run: %s", job_id, exc)
+            _update_status(self.directory, job_id, status="failed",
+                           error=f"{type(exc).__name__}: {exc}")
+
+    def _call_path(self, job_id):
+        """Return the path to a job's pickled function call."""
+        return self.directory.joinpath(f"{job_id}.pkl")
+
+    def _prune(self):
+        """Remove finished jobs and downloads older than `max_age`."""
+        cutoff = time.time() - self.max_age
+        for path in self.directory.glob("*.json"):
+            if _modified_before(path, cutoff):
+                status = _read_status(self.directory, path.stem) or {}
+                if status.get("status") not in ACTIVE:
+                    remove_file(path)
+                    remove_file(self._call_path(path.stem))
+
+        # Downloads that were never sent (e.g., the user left the page)
+        for path in self.downloads.iterdir():
+            if path.is_file() and _modified_before(path, cutoff):
+                remove_file(path)
+
+
+def report_progress(done, total=None, message=None):
+    """Report the progress of the job running in this process.
+
+    This does nothing outside of a job, so functions may call it whether
+    or not they run in the background.
+
+    Parameters
+    ----------
+    done : int | float
+        Number of steps done, or the fraction done if `total` is `None`.
+    total : int, optional
+        Total number of steps. By default, `None`.
+    message : str, optional
+        Short description of the current step. By default, `None`.
+    """
+    global _LAST_PROGRESS  # pylint: disable=global-statement
+    if _CURRENT_JOB is None:
+        return
+
+    now = time.time()
+    finished = total is not None and done >= total
+    if now - _LAST_PROGRESS < PROGRESS_INTERVAL and not finished:
+        return
+    _LAST_PROGRESS = now
+
+    progress = done / total if total else done
+    _update_status(*_CURRENT_JOB, progress=min(max(progress, 0), 1),
+                   message=message)
+
+
+def _key_default(obj):
+    """Represent arguments JSON can't serialize in a job ID."""
+    if callable(obj):
+        return _name(obj)
+    return str(obj)
+
+
+def _modified_before(path, cutoff):
+    """Return whether a file was last modified before a time."""
+    try:
+        return path.stat().st_mtime < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def _name(func):
+    """Return a function's full name."""
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def _read_status(directory, job_id):
+    """Read a job's status file, or return `None` if it does not exist."""
+    path = Path(directory).joinpath(f"{job_id}.json")
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _run_job(directory, job_id):
+    """Run a submitted job in a pool process and record the outcome."""
+    global _CURRENT_JOB, _LAST_PROGRESS  # pylint: disable=global-statement
+    _CURRENT_JOB = (directory, job_id)
+    _LAST_PROGRESS = 0
+    _update_status(directory, job_id, status="running", pid=os.getpid(),
+                   started=time.time())
+
+    try:
+        with open(Path(directory).joinpath(f"{job_id}.pkl"), "rb") as file:
+            func, args, kwargs = pickle.load(file)
+        result = func(*args, **kwargs)
+        json.dumps(result)
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.error("Job %s failed:\n%s", job_id, traceback.format_exc())
+        _update_status(directory, job_id, status="failed",
+                       error=f"{type(exc).__name__}: {exc}",
+                       finished=time.time())
+    else:
+        _update_status(directory, job_id, status="done", progress=1,
+                       result=result, finished=time.time())
+    finally:
+        _CURRENT_JOB = None
+
+
+def _update_status(directory, job_id, **updates):
+    """Update entries in a job's status file and return the new status."""
+    with key_lock(f"{job_id}.json", Path(directory).joinpath("locks")):
+        status = _read_status(directory, job_id) or {"id": job_id}
+        status.update(updates)
+        _write_status(directory, status)
+    return status
+
+
+def _write_status(directory, status):
+    """Write a job's status file atomically."""
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, suffix=".tmp", delete=False, encoding="utf-8"
+    ) as file:
+        json.dump(status, file)
+    os.replace(file.name, Path(directory).joinpath(f"{status['id']}.json"))
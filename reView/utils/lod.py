@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""Level-of-detail rendering for large scatter maps.
+
+Sending every supply curve site (or every bespoke turbine) to the browser
+makes large maps slow to serialize, transfer and draw. Instead, maps with
+more than `MAX_POINTS` sites are drawn from a grid pyramid: each level
+aggregates the sites into square cells about `CELL_PIXELS` screen pixels
+wide at that zoom level, with the mean color value, total capacity, and
+site count of each cell. Once the user zooms in far enough that the
+visible sites fit in the point budget, the full resolution sites in the
+viewport are sent instead.
+
+The view comes from the map's `relayoutData` (see `map_view`), and
+`LevelOfDetail` decides what to draw for it and whether a new view needs
+a new figure at all.
+"""
+import numpy as np
+import pandas as pd
+
+CELL_PIXELS = 8  # Approximate width of a grid cell on screen
+DEFAULT_VIEW = {"zoom": 2.75, "bounds": None}
+MAX_LEVEL = 12  # Deepest zoom level with aggregated cells
+MAX_POINTS = 20_000  # Largest number of sites to draw at full resolution
+VIEW_PADDING = 0.5  # Fraction of the viewport to also draw on each side
+
+
+def aggregate_grid(df, color_var, level, weight_col="capacity"):
+    """Aggregate sites into the grid cells of one zoom level.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Table with "latitude", "longitude", and `color_var` columns.
+    color_var : str
+        Numeric column to average in each cell. Missing and infinite
+        values are ignored.
+    level : int
+        Zoom level of the grid (see `cell_size`).
+    weight_col : str, optional
+        Column to total in each cell, if it is in `df`. By default,
+        "capacity".
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+        One row for each occupied cell, with the mean site "latitude" and
+        "longitude", mean `color_var`, total `weight_col`, "site_count",
+        and "lod_level". "sc_point_gid" is -1 since cells are not sites.
+    """
+    size = cell_size(level)
+    lats = df["latitude"].values.astype(float)
+    lons = df["longitude"].values.astype(float)
+    cols = np.floor(lons / size).astype(np.int64)
+    rows = np.floor(lats / size).astype(np.int64)
+    if len(df) > 0:
+        cols -= cols.min()
+        rows -= rows.min()
+    __, cells = np.unique(cols * (rows.max(initial=0) + 1) + rows,
+                          return_inverse=True)
+    counts = np.bincount(cells)
+
+    values = df[color_var].values.astype(float)
+    valid = np.isfinite(values)
+    totals = np.bincount(cells[valid], values[valid], minlength=len(counts))
+    nvalid = np.bincount(cells[valid], minlength=len(counts))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = totals / nvalid
+
+    grid = pd.DataFrame(
+        {
+            "sc_point_gid": -1,
+            "latitude": np.bincount(cells, lats) / counts,
+            "longitude": np.bincount(cells, lons) / counts,
+            color_var: means,
+        }
+    )
+    if weight_col in df and weight_col != color_var:
+        weights = df[weight_col].fillna(0).values.astype(float)
+        grid[weight_col] = np.bincount(cells, weights)
+    grid["site_count"] = counts
+    grid["lod_level"] = level
+
+    return grid
+
+
+def build_pyramid(df, color_var, max_level=MAX_LEVEL, min_reduction=0.8):
+    """Aggregate sites into grid cells at every zoom level.
+
+    Parameters
+    ----------
+    df : pd.core.frame.DataFrame
+        Table with "latitude", "longitude", and `color_var` columns.
+    color_var : str
+        Numeric column to average in each cell.
+    max_level : int, optional
+        Deepest zoom level to aggregate. By default, `MAX_LEVEL`.
+    min_reduction : float, optional
+        Stop at the first level with at least this fraction as many cells
+        as there are sites, since deeper levels barely aggregate anything.
+        By default, 0.8.
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+        Cells of every level (see `aggregate_grid`), with levels in the
+        "lod_level" column.
+    """
+    levels = []
+    for level in range(max_level + 1):
+        grid = aggregate_grid(df, color_var, level)
+        levels.append(grid)
+        if len(grid) >= min_reduction * len(df):
+            break
+
+    return pd.concat(levels, ignore_index=True)
+
+
+def cell_size(level):
+    """Return the width of the grid cells at a zoom level, in degrees.
+
+    A web map tile is 256 pixels wide and spans 360 / 2 ** zoom degrees
+    of longitude, so cells are about `CELL_PIXELS` pixels wide.
+
+    Parameters
+    ----------
+    level : int
+        Zoom level.
+
+    Returns
+    -------
+    float
+    """
+    return 360 / 2 ** level * CELL_PIXELS / 256
+
+
+def map_view(relayout_data, width=1_000, height=600):
+    """Return the zoom and bounds of a map from its `relayoutData`.
+
+    Parameters
+    ----------
+    relayout_data : dict | None
+        `relayoutData` of a mapbox figure.
+    width, height : int, optional
+        Size of the map in pixels, used to estimate the bounds if
+        `relayout_data` only has the center and zoom. By default, 1,000
+        by 600.
+
+    Returns
+    -------
+    dict | None
+        "zoom" level and "bounds" (min longitude, max longitude, min
+        latitude, max latitude), or `None` if `relayout_data` does not
+        describe a map view (e.g., an autosize event).
+    """
+    if not relayout_data or "mapbox.zoom" not in relayout_data:
+        return None
+
+    zoom = float(relayout_data["mapbox.zoom"])
+    derived = relayout_data.get("mapbox._derived") or {}
+    coords = derived.get("coordinates")
+    if coords:
+        lons, lats = np.asarray(coords, dtype=float).reshape(-1, 2).T
+        bounds = [lons.min(), lons.max(), lats.min(), lats.max()]
+    elif "mapbox.center" in relayout_data:
+        center = relayout_data["mapbox.center"]
+        half_width = 360 / 2 ** zoom * width / 256 / 2
+        half_height = half_width * height / width
+        bounds = [
+            center["lon"] - half_width,
+            center["lon"] + half_width,
+            max(center["lat"] - half_height, -90),
+            min(center["lat"] + half_height, 90),
+        ]
+    else:
+        bounds = None
+
+    return {"zoom": zoom, "bounds": bounds}
+
+
+class LevelOfDetail:
+    """Choose the sites or grid cells to draw for a map view."""
+
+    def __init__(self, df, color_var, pyramid=None, max_points=MAX_POINTS):
+        """Initialize LevelOfDetail object.
+
+        Parameters
+        ----------
+        df : pd.core.frame.DataFrame
+            Full resolution map table.
+        color_var : str
+            Variable the map is colored by.
+        pyramid : pd.core.frame.DataFrame, optional
+            Cached grid pyramid of `df` (see `build_pyramid`). By
+            default, `None`, which aggregates the level needed on demand.
+        max_points : int, optional
+            Largest number of sites to draw at full resolution. By
+            default, `MAX_POINTS`.
+        """
+        self.df = df
+        self.color_var = color_var
+        self.pyramid = pyramid
+        self.max_points = max_points
+
+    def __repr__(self):
+        """Return representation string for LevelOfDetail object."""
+        return (f"<LevelOfDetail object: {len(self.df):,} sites, "
+                f"color_var={self.color_var}, "
+                f"max_points={self.max_points:,}>")
+
+    @property
+    def enabled(self):
+        """Return whether the map is too large to draw every site."""
+        numeric = pd.api.types.is_numeric_dtype(self.df[self.color_var])
+        return numeric and len(self.df) > self.max_points
+
+    def render(self, view=None):
+        """Return the table to draw for a view and its level of detail.
+
+        Parameters
+        ----------
+        view : dict, optional
+            Map view from `map_view`. By default, `None`, which uses the
+            default map zoom and the whole extent.
+
+        Returns
+        -------
+        tuple
+            Table of sites or grid cells to draw, and a state dictionary
+            with the "level" drawn ("points" or a zoom level) and padded
+            "bounds" that were drawn, or `None` if every site is drawn.
+        """
+        if not self.enabled:
+            return self.df, None
+
+        view = view or DEFAULT_VIEW
+        bounds = _pad(view["bounds"])
+
+        # Draw full resolution sites once they fit in the budget
+        visible = _in_bounds(self.df, bounds)
+        if visible.sum() <= self.max_points:
+            state = {"level": "points", "bounds": bounds}
+            return self.df[visible], state
+
+        level = self._level(view["zoom"])
+        if self.pyramid is None:
+            grid = aggregate_grid(self.df, self.color_var, level)
+        else:
+            grid = self.pyramid[self.pyramid["lod_level"] == level]
+        grid = grid[_in_bounds(grid, bounds)]
+
+        return grid, {"level": level, "bounds": bounds}
+
+    def needs_update(self, state, view):
+        """Return whether a new view needs a different table drawn.
+
+        Parameters
+        ----------
+        state : dict | None
+            State returned by `render` for the figure on the map.
+        view : dict | None
+            New map view from `map_view`.
+
+        Returns
+        -------
+        bool
+        """
+        if not self.enabled or view is None:
+            return False
+        if state is None:
+            return True
+
+        # Panning outside the padded area drawn always needs new data
+        drawn = state["bounds"]
+        if drawn is not None and view["bounds"] is not None:
+            lon_min, lon_max, lat_min, lat_max = view["bounds"]
+            if (lon_min < drawn[0] or lon_max > drawn[1]
+                    or lat_min < drawn[2] or lat_max > drawn[3]):
+                return True
+
+        # Zooming in on full resolution sites needs nothing new
+        if state["level"] == "points":
+            return False
+
+        # Zooming in on cells until their sites fit in the budget does
+        visible = _in_bounds(self.df, _pad(view["bounds"]))
+        if visible.sum() <= self.max_points:
+            return True
+
+        return self._level(view["zoom"]) != state["level"]
+
+    def _level(self, zoom):
+        """Return the pyramid level to draw at a zoom."""
+        max_level = MAX_LEVEL
+        if self.pyramid is not None:
+            max_level = int(self.pyramid["lod_level"].max())
+        return int(np.clip(np.floor(zoom), 0, max_level))
+
+
+def _in_bounds(df, bounds):
+    """Return a boolean array of the rows within bounds."""
+    if bounds is None:
+        return np.ones(len(df), dtype=bool)
+    lon_min, lon_max, lat_min, lat_max = bounds
+    lons = df["longitude"].values
+    lats = df["latitude"].values
+    return ((lons >= lon_min) & (lons <= lon_max)
+            & (lats >= lat_min) & (lats <= lat_max))
+
+
+def _pad(bounds, padding=VIEW_PADDING):
+    """Expand bounds by a fraction of their size on each side."""
+    if bounds is None:
+        return None
+    lon_min, lon_max, lat_min, lat_max = bounds
+    dlon = (lon_max - lon_min) * padding
+    dlat = (lat_max - lat_min) * padding
+    return [float(lon_min - dlon), float(lon_max + dlon),
+            float(max(lat_min - dlat, -90)), float(min(lat_max + dlat, 90))]
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Benchmark characterization capacity adjustments.
+
+Compares the row-by-row JSON parsing that `adjust_capacities` used to do
+(with `DataFrame.apply` and pandarallel's `parallel_apply`) against the
+vectorized `CharacterizationMatrix` path on a synthetic supply curve.
+"""
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from reView.utils.characterizations import CharacterizationMatrix
+
+NROWS = 60_000
+CATEGORIES = ["11", "21", "22", "23", "41", "42", "43", "52", "71", "81",
+              "82", "90", "95"]
+KEEP = ["41", "42", "43"]
+RESOLUTION = 90
+DENSITY = 3
+
+
+def build_supply_curve(nrows=NROWS, seed=0):
+    """Build a synthetic supply curve with a characterization column."""
+    rng = np.random.default_rng(seed)
+    chars = []
+    for _ in range(nrows):
+        cats = rng.choice(CATEGORIES, rng.integers(1, 8), replace=False)
+        counts = rng.uniform(1, 500, len(cats)).round(2)
+        chars.append(json.dumps(dict(zip(cats, counts.tolist()))))
+
+    return pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(nrows),
+            "capacity": rng.uniform(50, 200, nrows),
+            "area_sq_km": rng.uniform(20, 70, nrows),
+            "nlcd": chars,
+        }
+    )
+
+
+def adjust_capacity(row, x_var, cats, res, density):
+    """Keep given categorical capacity, remove the rest (row by row)."""
+    if not isinstance(row[x_var], float):
+        row[x_var] = json.loads(row[x_var])
+        if row[x_var]:
+            remove = {k: v for k, v in row[x_var].items() if k not in cats}
+            removed_cells = sum(remove.values())
+            removed_km2 = (res * res * removed_cells) / 1_000_000
+            removed_cap = removed_km2 * density
+            row["capacity"] -= removed_cap
+            row["area_sq_km"] -= removed_km2
+    return row
+
+
+def adjust_vectorized(df, x_var, cats, res, density):
+    """Keep given categorical capacity, remove the rest (vectorized)."""
+    matrix = CharacterizationMatrix.from_series(df[x_var])
+    removed_km2 = (res * res * matrix.removed_cells(cats)) / 1_000_000
+    df["capacity"] = df["capacity"] - removed_km2 * density
+    df["area_sq_km"] = df["area_sq_km"] - removed_km2
+    return df
+
+
+def timed(label, func, *args, **kwargs):
+    """Run a function once and print how long it took."""
+    start = time.perf_counter()
+    out = func(*args, **kwargs)
+    print(f"{label:<40} {time.perf_counter() - start:>8.3f} s")
+    return out
+
+
+def main():
+    """Time each capacity adjustment path and check they agree."""
+    df = build_supply_curve()
+    kwargs = {"x_var": "nlcd", "cats": KEEP, "res": RESOLUTION,
+              "density": DENSITY}
+    print(f"Adjusting capacities for {len(df):,} rows")
+
+    expected = timed("apply (row by row)", df.copy().apply, adjust_capacity,
+                     axis=1, **kwargs)
+
+    try:
+        from pandarallel import pandarallel  # pylint: disable=C0415
+        pandarallel.initialize(progress_bar=False, verbose=0)
+        timed("parallel_apply (row by row)", df.copy().parallel_apply,
+              adjust_capacity, axis=1, **kwargs)
+    except ImportError:
+        print("pandarallel is not installed, skipping parallel_apply")
+
+    out = timed("CharacterizationMatrix (first parse)", adjust_vectorized,
+                df.copy(), **kwargs)
+    timed("CharacterizationMatrix (cached parse)", adjust_vectorized,
+          df.copy(), **kwargs)
+
+    assert np.allclose(out["capacity"], expected["capacity"])
+    assert np.allclose(out["area_sq_km"], expected["area_sq_km"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Benchmark map hover labels.
+
+Compares the figure payload and serialization time of a scenario map that
+sends a formatted hover string for every point (as `Map.hover_text` used
+to build) against the `Map` figure, which sends compact custom data and a
+single `hovertemplate` that the browser formats, and against the same
+figure after `Map.compact`, which sends rounded typed arrays.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+from reView.components.map import Map
+from reView.utils.functions import convert_to_title
+
+NROWS = 60_000
+STATES = ["Colorado", "Kansas", "Nebraska", "Oklahoma", "Texas", "Wyoming"]
+
+
+def build_supply_curve(nrows=NROWS, seed=0):
+    """Build a synthetic supply curve with location columns."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(nrows),
+            "latitude": rng.uniform(25, 49, nrows),
+            "longitude": rng.uniform(-124, -67, nrows),
+            "capacity": rng.uniform(0, 200, nrows),
+            "mean_lcoe": rng.uniform(20, 80, nrows),
+            "state": rng.choice(STATES, nrows),
+            "county": [f"County {i}" for i in rng.integers(0, 500, nrows)],
+        }
+    )
+
+
+def hover_string_figure(df, color_var, units="$/MWh", point_size=5):
+    """Build the map with a formatted hover string for every point."""
+    df = df.copy()
+    df["state"] = df["state"] + ":"
+    df["county"] = df["county"] + " County, "
+    df["text"] = (
+        df["county"]
+        + df["state"]
+        + f"<br>    {convert_to_title(color_var)}:   "
+        + df[color_var].round(2).astype(str)
+        + " "
+        + units
+    )
+    figure = px.scatter_mapbox(
+        data_frame=df,
+        lon="longitude",
+        lat="latitude",
+        custom_data=["sc_point_gid", "capacity"],
+        hover_name="text",
+    )
+    figure.update_traces(marker={"color": df[color_var], "size": point_size})
+    return figure
+
+
+def hover_template_figure(df, color_var, point_size=5):
+    """Build the map with the `Map` class's hover template."""
+    builder = Map(df, color_var, "Benchmark", color_range=[None, None])
+    return builder.figure(point_size)
+
+
+def compact_figure(df, color_var, point_size=5):
+    """Build the `Map` figure and compact it for the browser."""
+    builder = Map(df, color_var, "Benchmark", color_range=[None, None])
+    return builder.compact(builder.figure(point_size))
+
+
+def timed(label, func, *args, **kwargs):
+    """Build and serialize a figure and print its cost."""
+    start = time.perf_counter()
+    figure = func(*args, **kwargs)
+    built = time.perf_counter()
+    payload = pio.to_json(figure, validate=False)
+    done = time.perf_counter()
+    print(f"{label:<25} build {built - start:>6.3f} s   "
+          f"serialize {done - built:>6.3f} s   "
+          f"payload {len(payload) / 1e6:>6.2f} MB")
+    return figure, payload
+
+
+def main():
+    """Compare hover label approaches and compaction for a large map."""
+    df = build_supply_curve()
+    print(f"Mapping {len(df):,} points")
+
+    __, old = timed("per-point hover strings", hover_string_figure, df,
+                    "mean_lcoe")
+    __, new = timed("hover template", hover_template_figure, df,
+                    "mean_lcoe")
+    __, compact = timed("compact hover template", compact_figure, df,
+                        "mean_lcoe")
+    print(f"Payload reduced by {1 - len(new) / len(old):.0%} with the "
+          f"template, {1 - len(compact) / len(old):.0%} once compacted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Typed Parquet sidecars for CSV supply curves.
+
+The first full read of a CSV writes a Parquet copy of it to
+`SIDECAR_DIR`, and later reads (including reads of just a few columns)
+go through the copy instead of parsing the CSV again.
+"""
+import hashlib
+import logging
+import os
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pyarrow.parquet import ParquetFile, write_table
+
+from reView import REVIEW_CACHE_DIR
+from reView.utils.cache import key_lock
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_DIR = Path(REVIEW_CACHE_DIR).joinpath("sidecars")
+
+
+def read_csv(file, nrows=None, columns=None, sidecar=True):
+    """Read a CSV file, going through its Parquet sidecar if possible.
+
+    Parameters
+    ----------
+    file : str | pathlib.Path
+        Path to a CSV file.
+    nrows : int, optional
+        Number of rows to read in. Partial reads never write a sidecar.
+        By default, `None`.
+    columns : set, optional
+        Names of the columns to read in. By default, `None`, which reads
+        in every column.
+    sidecar : bool, optional
+        Read through, and write, the CSV's sidecar. By default, `True`.
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+    """
+    path = sidecar_path(file) if sidecar else None
+    if path is not None and path.exists():
+        data = read_parquet(path, nrows, columns)
+
+        # Keep CSV-style missing values in object columns
+        ocols = data.select_dtypes(include="object").columns
+        data[ocols] = data[ocols].where(data[ocols].notna(), np.nan)
+
+    # Only write sidecars from full reads of the whole table
+    elif path is not None and not nrows and not path.with_suffix(
+        ".skip"
+    ).exists():
+        data = pd.read_csv(file, low_memory=False)
+        write_sidecar(file, data)
+        if columns is not None:
+            data = data[[col for col in data.columns if col in columns]]
+
+    else:
+        usecols = columns.__contains__ if columns is not None else None
+        data = pd.read_csv(file, nrows=nrows, usecols=usecols,
+                           low_memory=False)
+
+    return data
+
+
+def read_parquet(file, nrows=None, columns=None):
+    """Read a Parquet file, skipping requested columns it lacks.
+
+    Parameters
+    ----------
+    file : str | pathlib.Path
+        Path to a Parquet file.
+    nrows : int, optional
+        Number of rows to read in. By default, `None`.
+    columns : set, optional
+        Names of the columns to read in. By default, `None`, which reads
+        in every column.
+
+    Returns
+    -------
+    pd.core.frame.DataFrame
+    """
+    pf = ParquetFile(file)
+    if columns is not None:
+        fields = [c for c in pf.schema_arrow.names if c in columns]
+    else:
+        fields = None
+    if nrows:
+        rows = next(pf.iter_batches(batch_size=nrows, columns=fields))
+        data = pa.Table.from_batches([rows]).to_pandas()
+    else:
+        data = pf.read(columns=fields).to_pandas()
+    return data
+
+
+def sidecar_path(file):
+    """Return the path to the Parquet sidecar for a CSV file.
+
+    Sidecars are keyed by the CSV's full path, modification time, and
+    size, so an edited or replaced CSV gets a new sidecar.
+
+    Parameters
+    ----------
+    file : str | pathlib.Path
+        Path to a CSV file.
+
+    Returns
+    -------
+    pathlib.Path
+        Path to the (possibly not yet existing) sidecar file.
+    """
+    file = Path(file).expanduser().resolve()
+    stat = file.stat()
+    path_key = hashlib.sha1(str(file).encode()).hexdigest()[:16]
+    state = f"{stat.st_mtime_ns}:{stat.st_size}"
+    state_key = hashlib.sha1(state.encode()).hexdigest()[:16]
+    return SIDECAR_DIR.joinpath(f"{path_key}_{state_key}.parquet")
+
+
+def write_sidecar(file, data=None, overwrite=False):
+    """Write a typed Parquet sidecar for a CSV file.
+
+    Writers of sidecars for the same CSV wait for each other, and older
+    sidecars for the CSV are removed. If the table cannot be
+    converted to Parquet (e.g., a column with mixed types), a marker is
+    left in place of the sidecar so the conversion is not retried until
+    the CSV changes.
+
+    Parameters
+    ----------
+    file : str | pathlib.Path
+        Path to a CSV file.
+    data : pd.core.frame.DataFrame, optional
+        The full CSV table, if it has already been read in. By default,
+        `None`, which reads the CSV.
+    overwrite : bool, optional
+        Rewrite the sidecar even if an up-to-date one exists.
+        By default, `False`.
+
+    Returns
+    -------
+    pathlib.Path | None
+        Path to the sidecar, or `None` if the table could not be
+        converted.
+    """
+    dst = sidecar_path(file)
+    skip = dst.with_suffix(".skip")
+    if dst.exists() and not overwrite:
+        return dst
+
+    if data is None:
+        data = pd.read_csv(file, low_memory=False)
+
+    # Another writer's temporary file matches the cleanup pattern too
+    path_key = dst.name.split("_")[0]
+    with key_lock(path_key, dst.parent.joinpath("locks")):
+        if dst.exists() and not overwrite:
+            return dst
+
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        for old in dst.parent.glob(f"{path_key}_*"):
+            if old not in (dst, skip):
+                old.unlink(missing_ok=True)
+
+        try:
+            table = pa.Table.from_pandas(data, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as exc:
+            logger.warning("Could not write a Parquet sidecar for %s: %s",
+                           file, exc)
+            skip.touch()
+            return None
+
+        # Write to a temporary file first so readers never see partial
+        # files
+        tmp = dst.with_suffix(f".{os.getpid()}.tmp")
+        write_table(table, tmp)
+        os.replace(tmp, dst)
+        skip.unlink(missing_ok=True)
+        logger.debug("Wrote Parquet sidecar for %s to %s", file, dst)
+
+    return dst
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""Spatial indices for latitude/longitude point lookups.
+
+Nearest neighbor and radius queries use a haversine ball tree, so finding
+the closest of n points takes O(log n) time rather than computing every
+pairwise distance. Bounding box and polygon queries narrow the points down
+with a longitude-sorted view before testing latitudes or the polygon.
+Indices are meant to be built once per point set and reused (see
+`Config.demand_index` and `site_index`).
+"""
+import os
+
+from functools import lru_cache
+
+import numpy as np
+import shapely
+
+from sklearn.neighbors import BallTree
+
+from reView.utils.functions import read_file
+
+EARTH_RADIUS_KM = 6373.0
+
+
+class HaversineIndex:
+    """Ball tree index over latitude/longitude points."""
+
+    def __init__(self, lats, lons):
+        """Initialize HaversineIndex object.
+
+        Parameters
+        ----------
+        lats, lons : array-like
+            Latitudes and longitudes of the points, in degrees.
+        """
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        coords = np.radians(np.column_stack([self.lats, self.lons]))
+        self.tree = BallTree(coords, metric="haversine")
+
+    def __len__(self):
+        """Return the number of indexed points."""
+        return len(self.lats)
+
+    def __repr__(self):
+        """Return representation string for HaversineIndex object."""
+        return f"<HaversineIndex object: {len(self)} points>"
+
+    @classmethod
+    def from_frame(cls, df, lat_col="latitude", lon_col="longitude"):
+        """Build an index over the coordinates in a data frame.
+
+        Parameters
+        ----------
+        df : pd.core.frame.DataFrame
+            Table with latitude and longitude columns.
+        lat_col, lon_col : str, optional
+            Names of the latitude and longitude columns. By default,
+            "latitude" and "longitude".
+
+        Returns
+        -------
+        HaversineIndex
+            Index whose positions match the rows of `df`.
+        """
+        return cls(df[lat_col].values, df[lon_col].values)
+
+    def nearest(self, coords, k=1):
+        """Find the `k` nearest indexed points to each coordinate.
+
+        Parameters
+        ----------
+        coords : array-like
+            (latitude, longitude) pair or an (n, 2) array of pairs, in
+            degrees.
+        k : int, optional
+            Number of neighbors to return. By default, 1.
+
+        Returns
+        -------
+        tuple
+            (n, k) arrays of distances (km) and positions of the nearest
+            points, closest first.
+        """
+        coords = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+        dists, inds = self.tree.query(coords, k=min(k, len(self)))
+        return dists * EARTH_RADIUS_KM, inds
+
+    def within(self, coords, radius_km, sort=True):
+        """Find the indexed points within a distance of each coordinate.
+
+        Parameters
+        ----------
+        coords : array-like
+            (latitude, longitude) pair or an (n, 2) array of pairs, in
+            degrees.
+        radius_km : float
+            Search radius in kilometers.
+        sort : bool, optional
+            Order each coordinate's points from closest to farthest. By
+            default, `True`.
+
+        Returns
+        -------
+        tuple
+            Lists of distance (km) and position arrays, one for each
+            coordinate.
+        """
+        coords = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+        inds, dists = self.tree.query_radius(
+            coords, r=radius_km / EARTH_RADIUS_KM, return_distance=True,
+            sort_results=sort
+        )
+        return [d * EARTH_RADIUS_KM for d in dists], list(inds)
+
+
+class SiteIndex(HaversineIndex):
+    """Spatial index over supply curve sites that returns site IDs.
+
+    Besides nearest and radius queries, this answers the bounding box and
+    lasso (polygon) selections made on the scenario map, so selections
+    can be resolved from their geometry rather than a list of every
+    selected point.
+    """
+
+    def __init__(self, gids, lats, lons):
+        """Initialize SiteIndex object.
+
+        Parameters
+        ----------
+        gids : array-like
+            ID of each site (e.g., "sc_point_gid").
+        lats, lons : array-like
+            Latitudes and longitudes of the sites, in degrees.
+        """
+        super().__init__(lats, lons)
+        self.gids = np.asarray(gids)
+        self._lon_order = np.argsort(self.lons, kind="stable")
+        self._sorted_lons = self.lons[self._lon_order]
+
+    def __repr__(self):
+        """Return representation string for SiteIndex object."""
+        return f"<SiteIndex object: {len(self)} sites>"
+
+    @classmethod
+    def from_frame(cls, df, lat_col="latitude", lon_col="longitude",
+                   gid_col="sc_point_gid"):
+        """Build an index over the sites in a data frame.
+
+        Parameters
+        ----------
+        df : pd.core.frame.DataFrame
+            Table with site ID, latitude, and longitude columns.
+        lat_col, lon_col : str, optional
+            Names of the latitude and longitude columns. By default,
+            "latitude" and "longitude".
+        gid_col : str, optional
+            Name of the site ID column. By default, "sc_point_gid".
+
+        Returns
+        -------
+        SiteIndex
+        """
+        return cls(df[gid_col].values, df[lat_col].values,
+                   df[lon_col].values)
+
+    def bbox(self, lon_range, lat_range):
+        """Return the IDs of the sites within a bounding box.
+
+        Parameters
+        ----------
+        lon_range, lat_range : tuple
+            (min, max) longitude and latitude of the box, in degrees.
+
+        Returns
+        -------
+        np.ndarray
+            IDs of the sites in the box, in index order.
+        """
+        return self.gids[self._bbox_positions(lon_range, lat_range)]
+
+    def nearest_sites(self, coords, k=1):
+        """Return the IDs of the `k` sites nearest to each coordinate.
+
+        Parameters
+        ----------
+        coords : array-like
+            (latitude, longitude) pair or an (n, 2) array of pairs, in
+            degrees.
+        k : int, optional
+            Number of sites to return. By default, 1.
+
+        Returns
+        -------
+        np.ndarray
+            (n, k) array of site IDs, closest first.
+        """
+        __, inds = self.nearest(coords, k=k)
+        return self.gids[inds]
+
+    def polygon(self, lons, lats):
+        """Return the IDs of the sites within a polygon.
+
+        Parameters
+        ----------
+        lons, lats : array-like
+            Longitudes and latitudes of the polygon's vertices, in
+            degrees.
+
+        Returns
+        -------
+        np.ndarray
+            IDs of the sites in the polygon, in index order.
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        if len(lons) < 3:
+            return self.gids[:0]
+
+        # Only test sites within the polygon's bounding box
+        candidates = self._bbox_positions(
+            (lons.min(), lons.max()), (lats.min(), lats.max())
+        )
+        shape = shapely.Polygon(np.column_stack([lons, lats]))
+        inside = shapely.contains_xy(shape, self.lons[candidates],
+                                     self.lats[candidates])
+        return self.gids[candidates[inside]]
+
+    def radius(self, coords, radius_km):
+        """Return the IDs of the sites within a distance of a coordinate.
+
+        Parameters
+        ----------
+        coords : array-like
+            (latitude, longitude) of the center, in degrees.
+        radius_km : float
+            Search radius in kilometers.
+
+        Returns
+        -------
+        np.ndarray
+            IDs of the sites within the radius, closest first.
+        """
+        __, inds = self.within(coords, radius_km)
+        return self.gids[inds[0]]
+
+    def select(self, selection):
+        """Return the IDs of the sites in a map box or lasso selection.
+
+        Parameters
+        ----------
+        selection : dict
+            Plotly `selectedData` from a map, or just its "range" or
+            "lassoPoints" entry (see `selection_geometry`).
+
+        Returns
+        -------
+        np.ndarray | None
+            IDs of the selected sites, or `None` if the selection has
+            no map geometry.
+        """
+        geometry = selection_geometry(selection)
+        if geometry is None:
+            return None
+        kind, coords = geometry
+        lons, lats = coords[:, 0], coords[:, 1]
+        if kind == "range":
+            return self.bbox((lons.min(), lons.max()),
+                             (lats.min(), lats.max()))
+        return self.polygon(lons, lats)
+
+    def _bbox_positions(self, lon_range, lat_range):
+        """Return the sorted positions of the sites in a bounding box."""
+        start = np.searchsorted(self._sorted_lons, lon_range[0], "left")
+        end = np.searchsorted(self._sorted_lons, lon_range[1], "right")
+        positions = self._lon_order[start:end]
+        lats = self.lats[positions]
+        inside = (lats >= lat_range[0]) & (lats <= lat_range[1])
+        return np.sort(positions[inside])
+
+
+def compact_selection(selection):
+    """Drop the points from a map selection that has a geometry.
+
+    Box and lasso selections on a map can be resolved with a `SiteIndex`,
+    so there is no need to pass (or hash, for cache keys) every selected
+    point along with them. Click and chart selections are returned as is.
+
+    Parameters
+    ----------
+    selection : dict | None
+        Plotly `selectedData` or `clickData`.
+
+    Returns
+    -------
+    dict | None
+        The selection's geometry entries, or the original selection if
+        it has no map geometry.
+    """
+    if selection_geometry(selection) is None:
+        return selection
+    return {key: selection[key] for key in ("range", "lassoPoints")
+            if key in selection}
+
+
+def selection_geometry(selection):
+    """Return the geometry of a map box or lasso selection.
+
+    Parameters
+    ----------
+    selection : dict | None
+        Plotly `selectedData` from a map.
+
+    Returns
+    -------
+    tuple | None
+        "range" or "lasso" and an (n, 2) array of (longitude, latitude)
+        vertices, or `None` if the selection has no map geometry (e.g.,
+        clicks and chart selections).
+    """
+    if not selection:
+        return None
+    for key, kind in [("lassoPoints", "lasso"), ("range", "range")]:
+        coords = (selection.get(key) or {}).get("mapbox")
+        if coords:
+            return kind, np.asarray(coords, dtype=float).reshape(-1, 2)
+    return None
+
+
+def selection_gids(selection, index=None):
+    """Return the site IDs in a plotly selection.
+
+    Parameters
+    ----------
+    selection : dict
+        Plotly `selectedData` from the map or chart.
+    index : SiteIndex | reView.utils.decimate.ChartIndex, optional
+        Index to resolve map or chart box and lasso selections with. By
+        default, `None`, which uses the selection's points.
+
+    Returns
+    -------
+    list
+        Selected "sc_point_gid" values.
+    """
+    if index is not None:
+        gids = index.select(selection)
+        if gids is not None:
+            return gids.tolist()
+    points = selection.get("points", [])
+    return [p.get("customdata", [None])[0] for p in points]
+
+
+def site_index(path):
+    """Return a spatial index over the sites of a supply curve table.
+
+    Indices are built from just the site ID and coordinate columns and
+    kept for each version of the table, so they are rebuilt only when
+    the file changes.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        Path to a supply curve table or an HDF5 file with a site meta.
+
+    Returns
+    -------
+    SiteIndex | None
+        Index over the table's sites, or `None` if the table is missing
+        or has no site coordinates.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+    return _site_index(str(path), mtime)
+
+
+@lru_cache(maxsize=32)
+def _site_index(path, mtime):  # pylint: disable=unused-argument
+    """Build the spatial index of one version of a table."""
+    columns = ["sc_point_gid", "latitude", "longitude"]
+    df = read_file(path, columns=columns)
+    if not set(columns).issubset(df.columns):
+        return None
+    df = df.dropna(subset=columns).drop_duplicates("sc_point_gid")
+    return SiteIndex.from_frame(df)
@@ -10,12 +10,21 @@ import pandas as pd
 import geopandas as gpd
 
 import reView.utils.config
+import reView.utils.sidecars
 from reView import TEST_DATA_DIR
 from reView.utils.functions import load_project_configs
 
 from tests import helper
 
 
+@pytest.fixture(autouse=True)
+def sidecar_dir(tmp_path, monkeypatch):
+    """Keep Parquet sidecars written during tests out of the user cache."""
+    path = tmp_path.joinpath("sidecars")
+    monkeypatch.setattr(reView.utils.sidecars, "SIDECAR_DIR", path)
+    return path
+
+
 @pytest.fixture
 def data_dir_test():
     """Return TEST_DATA_DIR as a `Path` object."""
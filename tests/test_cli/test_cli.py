@@ -17,8 +17,10 @@ from reView.cli import (
     make_maps,
     map_column,
     histogram,
+    make_sidecars,
     TECH_CHOICES
 )
+from reView.utils.sidecars import sidecar_path
 
 
 def test_main(cli_runner):
@@ -1040,5 +1042,26 @@ def test_histogram_nonnumeric_column(
     )
 
 
+def test_make_sidecars(tmp_path, cli_runner):
+    """Test make_sidecars() CLI command."""
+
+    sub_dir = tmp_path.joinpath("project", "scenarios")
+    sub_dir.mkdir(parents=True)
+    csvs = [tmp_path.joinpath("project", "a.csv"), sub_dir.joinpath("b.csv")]
+    for csv in csvs:
+        pd.DataFrame({"sc_point_gid": [0, 1], "state": ["A", None]}).to_csv(
+            csv, index=False
+        )
+
+    result = cli_runner.invoke(
+        make_sidecars, [tmp_path.joinpath("project").as_posix()]
+    )
+    assert result.exit_code == 0, (
+        f"Command failed with error {result.exception}"
+    )
+    for csv in csvs:
+        assert sidecar_path(csv).exists()
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])
@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 """Component logic tests."""
+import numpy as np
+import pandas as pd
 import pytest
 
-from reView.components.logic import tab_styles
+from reView.components.logic import (
+    format_capacity_title,
+    store_capacity,
+    tab_styles
+)
 
 
 @pytest.mark.parametrize("tab_choice", ["a", "b", "c", "d", "e"])
@@ -32,3 +38,55 @@ def test_tab_styles_map(tab_choice):
         tab_choice, options=["state", "region", "basemap", "color"]
     )
     assert sum(s != {"display": "none"} for s in styles) == 1
+
+
+def test_format_capacity_title():
+    """Test capacity totals from the server-side capacity summary."""
+    df = pd.DataFrame(
+        {
+            "sc_point_gid": [30, 10, 20, 20, 40],
+            "capacity": [300.0, 100.0, 150.0, 50.0, np.nan],
+        }
+    )
+    key = store_capacity(df)
+    assert key == store_capacity(df.sample(frac=1, random_state=0))
+
+    def _points(*gids):
+        return {"points": [{"customdata": [gid, 0]} for gid in gids]}
+
+    assert format_capacity_title(key) == ("600.00 MW", "5")
+    assert format_capacity_title(key, _points(20, 30, 99)) == (
+        "500.00 MW", "3"
+    )
+    assert format_capacity_title(key, _points()) == ("0.00 MW", "0")
+
+    # Grid cells (see reView.utils.lod) are not sites
+    assert format_capacity_title(key, _points(-1, -1)) == ("0.00 MW", "0")
+
+    assert format_capacity_title(None) == ("--", "--")
+    assert format_capacity_title("capacity_missing") == ("--", "--")
+
+
+def test_format_capacity_title_geometry():
+    """Test that box and lasso selections of grid cells sum their sites."""
+    df = pd.DataFrame(
+        {
+            "sc_point_gid": [10, 20, 30, 40],
+            "capacity": [100.0, 200.0, 300.0, 400.0],
+            "latitude": [35.0, 36.0, 40.0, 45.0],
+            "longitude": [-100.0, -99.0, -95.0, -90.0],
+        }
+    )
+    key = store_capacity(df)
+    cells = [{"customdata": [-1, 0]}, {"customdata": [-1, 0]}]
+
+    box = {"points": cells, "range": {"mapbox": [[-101, 37], [-98, 34]]}}
+    assert format_capacity_title(key, box) == ("300.00 MW", "2")
+
+    lasso = {
+        "points": cells,
+        "lassoPoints": {
+            "mapbox": [[-96, 39], [-94, 39], [-94, 41], [-96, 41]]
+        },
+    }
+    assert format_capacity_title(key, lasso) == ("300.00 MW", "1")
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Map component tests."""
+import numpy as np
+import pandas as pd
+
+import reView.utils.config
+from reView.components.map import Map, Title, restyle
+from reView.utils.bespoke import BespokeUnpacker
+from reView.utils.lod import LevelOfDetail
+
+
+def _sites(nsites=100, seed=0):
+    """Random sites with locations."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(nsites),
+            "latitude": rng.uniform(25, 49, nsites),
+            "longitude": rng.uniform(-124, -67, nsites),
+            "capacity": rng.uniform(0, 200, nsites),
+            "mean_lcoe": rng.uniform(20, 80, nsites),
+            "state": rng.choice(["Colorado", "Texas"], nsites),
+            "county": rng.choice(["Adams", "Baca"], nsites),
+        }
+    )
+    df.loc[0, "county"] = np.nan
+    return df
+
+
+def _apply_patch(figure, patch):
+    """Apply the assignments of a partial update to a figure."""
+    figure = figure.to_plotly_json()
+    for operation in patch.to_plotly_json()["operations"]:
+        assert operation["operation"] == "Assign"
+        *keys, last = operation["location"]
+        target = figure
+        for key in keys:
+            target = target[key]
+        target[last] = operation["params"]["value"]
+    return figure
+
+
+def test_map_hover_template():
+    """Test that hover labels are formatted from custom data."""
+    df = _sites()
+    original = df.copy()
+    figure = Map(df, "mean_lcoe", "Test", color_range=[None, None]).figure(5)
+    trace = figure.data[0]
+
+    pd.testing.assert_frame_equal(df, original)
+    assert "text" not in df
+    assert trace.hovertext[0] == "N/A County, " + df["state"][0] + ":"
+    assert trace.hovertext[1] == f"{df['county'][1]} County, {df['state'][1]}:"
+    assert "%{marker.color:.2f}" in trace.hovertemplate
+    assert np.array_equal(trace.customdata[:, 0], df["sc_point_gid"])
+    assert np.allclose(trace.customdata[:, 1], df["capacity"])
+
+
+def test_map_hover_template_extras():
+    """Test that optional hover fields index the right custom data."""
+    df = _sites().drop(columns=["state", "county"])
+    df["site_count"] = np.arange(len(df))
+    figure = Map(df, "mean_lcoe", "Test", color_range=[None, None]).figure(5)
+    trace = figure.data[0]
+
+    assert trace.hovertext is None
+    assert "%{customdata[2]:,}" in trace.hovertemplate
+    assert np.array_equal(trace.customdata[:, 2], df["site_count"])
+
+
+def test_bespoke_declick(bespoke_supply_curve):
+    """Test that clicked sites are found by their site ID."""
+    df = pd.read_csv(bespoke_supply_curve)
+    df = df[df["turbine_x_coords"] != "[]"].iloc[::-1]
+    gid = df["sc_point_gid"].iloc[3]
+    click = {"points": [{"customdata": [gid, 0], "pointIndex": 0}]}
+
+    unpacker = BespokeUnpacker(df, click)
+    assert unpacker.index == 3
+    assert unpacker.county == df["county"].iloc[3]
+    assert BespokeUnpacker(df, sc_point_gid=gid).index == 3
+
+    turbines = unpacker.unpack_turbines(drop_sc_points=True)
+    assert (turbines["sc_point_gid"] == gid).all()
+
+
+def test_restyle():
+    """Test that recoloring matches a map built with the new colors."""
+    df = _sites()
+    builder = Map(df, "mean_lcoe", "Test", color_range=[None, None])
+    figure = builder.figure(5)
+    style = builder.style(figure)
+    assert style["range"] == [df["mean_lcoe"].min(), df["mean_lcoe"].max()]
+
+    patch = restyle(style, "Cividis", color_range=(None, 50))
+    restyled = _apply_patch(figure, patch)
+
+    expected = Map(df, "mean_lcoe", "Test", colorscale="Cividis",
+                   color_range=[None, 50])
+    expected = expected.figure(5).to_plotly_json()
+    marker = restyled["data"][0]["marker"]
+    for key in ["cmin", "cmax"]:
+        assert marker[key] == expected["data"][0]["marker"][key]
+    assert [list(c) for c in marker["colorscale"]] == [
+        list(c) for c in expected["data"][0]["marker"]["colorscale"]
+    ]
+    assert np.array_equal(marker["color"], df["mean_lcoe"])
+
+    # Categorical maps keep their discrete colors
+    style["category"] = True
+    assert not restyle(style, "Cividis").to_plotly_json()["operations"]
+
+
+def test_map_title_grid_selection(tmp_path, monkeypatch):
+    """Test that selecting grid cells averages the sites inside them."""
+    monkeypatch.setitem(
+        reView.utils.config.PROJECT_CONFIGS,
+        "LOD",
+        {"project_name": "LOD", "directory": str(tmp_path)},
+    )
+    df = _sites(30_000)
+    path = tmp_path.joinpath("test_sc.csv")
+    df.to_csv(path, index=False)
+
+    cells, __ = LevelOfDetail(df, "mean_lcoe").render()
+    inside = (cells["longitude"].between(-100, -95)
+              & cells["latitude"].between(35, 40))
+    selection = {
+        "points": [{"customdata": [gid, 0]}
+                   for gid in cells["sc_point_gid"][inside]],
+        "range": {"mapbox": [[-100, 40], [-95, 35]]},
+    }
+    assert (cells["sc_point_gid"][inside] == -1).all()
+
+    signal_dict = {"path": str(path), "path2": None}
+    title = Title(df, signal_dict, "mean_lcoe", "LOD",
+                  map_selection=selection).map_title
+
+    sites = df[df["longitude"].between(-100, -95)
+               & df["latitude"].between(35, 40)]
+    average = np.average(sites["mean_lcoe"], weights=sites["capacity"])
+    assert f"Average: {average:.2f}" in title
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Scenario Model characterization selection tests."""
+import json
+
+import numpy as np
+import pandas as pd
+
+import reView.utils.config
+from reView.pages.rev.model import adjust_capacities
+
+
+def test_adjust_capacities(characterization_supply_curve, data_dir_test,
+                           monkeypatch):
+    """Test that `adjust_capacities` only keeps the selected categories."""
+    monkeypatch.setitem(
+        reView.utils.config.PROJECT_CONFIGS,
+        "Characterizations",
+        {"project_name": "Characterizations",
+         "directory": str(data_dir_test),
+         "characterization_cols": {"nlcd_2019_90x90": {}},
+         "capacity_density": 3,
+         "resolution": 90},
+    )
+    df = pd.read_csv(characterization_supply_curve)
+    df.loc[0, "nlcd_2019_90x90"] = np.nan
+    selection = {"points": [{"label": "41"}, {"label": "42"}]}
+
+    adjusted = adjust_capacities(
+        df.copy(), "Characterizations", {"path": None}, "nlcd_2019_90x90",
+        selection
+    )
+
+    removed_km2 = []
+    for str_dict in df["nlcd_2019_90x90"]:
+        counts = json.loads(str_dict) if isinstance(str_dict, str) else {}
+        cells = sum(v for k, v in counts.items() if k not in {"41", "42"})
+        removed_km2.append(90 * 90 * cells / 1_000_000)
+    capacity = df["capacity"] - np.array(removed_km2) * 3
+    area = df["area_sq_km"] - np.array(removed_km2)
+    keep = capacity > 0
+
+    assert np.allclose(adjusted["capacity"], capacity[keep])
+    assert np.allclose(adjusted["area_sq_km"], area[keep])
+    assert adjusted["nlcd_2019_90x90"].equals(df["nlcd_2019_90x90"][keep])
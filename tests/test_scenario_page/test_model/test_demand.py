@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Scenario Model demand selection tests."""
+import numpy as np
+import pandas as pd
+
+from reView.utils.demand import demand_connections, filter_points_by_demand
+
+
+def test_demand_connections():
+    """Test that connections match filtering each load center in turn."""
+    rng = np.random.default_rng(0)
+    nsites = 1_000
+    df = pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(nsites),
+            "latitude": rng.uniform(30, 45, nsites),
+            "longitude": rng.uniform(-110, -90, nsites),
+            "hydrogen_annual_kg": rng.uniform(1e3, 1e5, nsites),
+            "no_pipe_lcoh_fcr": rng.uniform(1, 5, nsites),
+            "pipe_lcoh_component": rng.uniform(0.1, 2, nsites),
+            "dist_to_h2_load_km": rng.uniform(1, 300, nsites),
+        }
+    )
+    demand_data = pd.DataFrame(
+        {
+            "latitude": [35, 40, 42],
+            "longitude": [-100, -95, -105],
+            "load": [1e6, 5e6, 1e4],
+        }
+    )
+
+    counts = demand_connections(df, demand_data)
+
+    expected = np.zeros(nsites, dtype=int)
+    for _, row in demand_data.iterrows():
+        coords = np.radians([row["latitude"], row["longitude"]])
+        selected = filter_points_by_demand(df.copy(), coords, row["load"])
+        assert selected["selected_lcoh"].is_monotonic_increasing
+        assert (selected["h2_supply"].iloc[:-1] < row["load"]).all()
+        assert selected["h2_supply"].iloc[-1] >= row["load"]
+        expected[selected["sc_point_gid"].values] += 1
+
+    assert np.array_equal(counts, expected)
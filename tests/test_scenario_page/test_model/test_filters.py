@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Scenario Model filter tests."""
+import numpy as np
+import pandas as pd
+
+from reView.pages.rev.model import apply_filters, filter_mask
+
+
+def test_filter_mask(data_dir_test):
+    """Test that `filter_mask` combines every filter on known columns."""
+    df = pd.read_csv(
+        data_dir_test / 'hydrogen' / 'sample_data' / 'scenario_0.csv'
+    )
+    capacity = df["capacity"].median()
+    filters = [f"capacity >= {capacity}", "", "not_a_column < 0"]
+
+    keep = filter_mask(df, filters)
+
+    assert keep.dtype == bool
+    assert np.array_equal(keep, (df["capacity"] >= capacity).values)
+    assert apply_filters(df, filters).equals(df[keep])
+    assert filter_mask(df, []).all()
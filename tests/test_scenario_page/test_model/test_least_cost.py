@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Scenario Model least cost composite tests."""
+import os
+
+import pandas as pd
+
+from reView.pages.rev.model import calc_least_cost
+from reView.utils.composite import read_wins
+
+
+def test_calc_least_cost_rebuilds_stale(tmp_path, data_dir_test):
+    """Test that composites are rebuilt only when an input changes."""
+    src = data_dir_test / "hydrogen" / "sample_data"
+    paths = []
+    for i in range(2):
+        paths.append(tmp_path.joinpath(f"scenario_{i}_sc.csv"))
+        df = pd.read_csv(src / f"scenario_{i}.csv")
+        df.to_csv(paths[-1], index=False)
+    dst = tmp_path.joinpath("review_outputs", "composite_sc.csv")
+    dst.parent.mkdir()
+
+    calc_least_cost(paths, dst, composite_variable="capacity")
+    wins = read_wins(dst)
+    assert wins.sum() == pd.read_csv(dst).shape[0]
+    built = os.stat(dst).st_mtime_ns
+
+    calc_least_cost(paths, dst, composite_variable="capacity")
+    assert os.stat(dst).st_mtime_ns == built
+
+    # Regenerating a scenario rebuilds the composite
+    pd.read_csv(paths[0]).iloc[:1].to_csv(paths[0], index=False)
+    calc_least_cost(paths, dst, composite_variable="capacity")
+    assert os.stat(dst).st_mtime_ns != built
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Scenario Model selection tests."""
+import numpy as np
+import pandas as pd
+
+from reView.pages.rev.model import point_filter
+from reView.utils.spatial import compact_selection, site_index
+
+
+def test_point_filter_site_index(tmp_path):
+    """Test that map selections resolve the same with and without points."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(500),
+            "latitude": rng.uniform(30, 45, 500),
+            "longitude": rng.uniform(-110, -90, 500),
+            "capacity": rng.uniform(1, 100, 500),
+        }
+    )
+    path = tmp_path.joinpath("test_sc.csv")
+    df.to_csv(path, index=False)
+    index = site_index(path)
+    assert site_index(path) is index
+    assert site_index(tmp_path.joinpath("missing.csv")) is None
+
+    inside = (df["longitude"].between(-100, -95)
+              & df["latitude"].between(35, 40))
+    points = [{"customdata": [gid]} for gid in df["sc_point_gid"][inside]]
+    selection = {
+        "points": points,
+        "range": {"mapbox": [[-100, 40], [-95, 35]]},
+    }
+    expected = point_filter(selection)
+    assert sorted(point_filter(selection, index=index)) == sorted(expected)
+    assert sorted(point_filter(compact_selection(selection),
+                               index=index)) == sorted(expected)
+
+    chart = {"points": [{"customdata": [gid]} for gid in range(100)]}
+    gids = point_filter(compact_selection(selection), chart, index=index)
+    assert gids == set(expected) & set(range(100))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Chart binning tests."""
+import numpy as np
+import pandas as pd
+
+from reView.utils.binning import (
+    bin_edges,
+    box_statistics,
+    group_codes,
+    grouped_counts,
+    grouped_means,
+    lower_edge_index,
+    upper_edge_index
+)
+
+
+def test_grouped_counts():
+    """Test that grouped counts match a histogram of each group."""
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=10_000)
+    groups = rng.choice(["b", "a", "c"], 10_000)
+
+    edges = bin_edges(np.r_[values, np.nan], 25)
+    codes, names = group_codes(groups)
+    counts = grouped_counts(lower_edge_index(values, edges), codes, 25, 3)
+
+    assert list(names) == ["a", "b", "c"]
+    for i, name in enumerate(names):
+        expected, __ = np.histogram(values[groups == name], bins=edges)
+        assert np.array_equal(counts[i], expected)
+
+
+def test_lower_edge_index():
+    """Test that values on an edge go in the bin above it."""
+    edges = np.array([0.0, 1.0, 2.0, 3.0])
+    index = lower_edge_index([0, 0.5, 1, 2.5, 3], edges)
+    assert list(index) == [0, 0, 1, 2, 2]
+
+
+def test_grouped_means():
+    """Test grouped means against the first edge at or above values."""
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(
+        {
+            "x": rng.uniform(0, 100, 5_000),
+            "y": rng.normal(size=5_000),
+            "group": rng.choice(["a", "b"], 5_000),
+        }
+    )
+    df.loc[::50, "y"] = np.nan
+    edges = np.arange(df["x"].min(), df["x"].max() + 7, 7)
+
+    xbins = upper_edge_index(df["x"].values, edges)
+    codes, names = group_codes(df["group"])
+    means = grouped_means(df["y"].values, xbins, codes, len(edges), 2)
+
+    df["xbin"] = [edges[edges >= x][0] for x in df["x"]]
+    expected = df.groupby(["group", "xbin"])["y"].mean()
+    for (group, xbin), mean in expected.items():
+        row = list(names).index(group)
+        col = np.flatnonzero(edges == xbin)[0]
+        assert np.isclose(means[row, col], mean)
+    assert np.array_equal(edges[xbins], df["xbin"])
+
+
+def test_box_statistics():
+    """Test box statistics, whiskers, and the outlier sample."""
+    rng = np.random.default_rng(2)
+    values = np.r_[rng.lognormal(3, 0.5, 10_000), np.nan, np.inf]
+
+    stats, outliers = box_statistics(values)
+    finite = values[np.isfinite(values)]
+    lower_quartile, median, upper_quartile = np.percentile(
+        finite, [25, 50, 75]
+    )
+    reach = 1.5 * (upper_quartile - lower_quartile)
+    inside = finite[(finite >= lower_quartile - reach)
+                    & (finite <= upper_quartile + reach)]
+
+    assert stats["count"] == finite.size
+    assert np.allclose([stats["q1"], stats["median"], stats["q3"]],
+                       [lower_quartile, median, upper_quartile])
+    assert stats["lowerfence"] == inside.min()
+    assert stats["upperfence"] == inside.max()
+    assert np.all((values[outliers] < stats["lowerfence"])
+                  | (values[outliers] > stats["upperfence"]))
+    assert len(outliers) == finite.size - inside.size
+
+    # Large sets of outliers are sampled, keeping the extremes
+    __, sample = box_statistics(values, max_outliers=10)
+    assert len(sample) == 10
+    assert values[sample].max() == finite.max()
+    assert box_statistics([np.nan])[0] is None
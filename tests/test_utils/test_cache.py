@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Data frame cache tests."""
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+from flask_caching import Cache
+from pandas.testing import assert_frame_equal
+
+from reView.utils.cache import (
+    ArrowFileSystemCache,
+    SharedTableStore,
+    single_flight
+)
+
+
+def _frame(nrows=1_000):
+    """Build a small supply curve-like data frame."""
+    return pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(nrows),
+            "capacity": np.linspace(0, 100, nrows),
+            "state": ["Colorado"] * nrows,
+        }
+    )
+
+
+def test_arrow_cache_round_trip(tmp_path):
+    """Test that data frames are stored in Arrow and read back intact."""
+    cache = ArrowFileSystemCache(tmp_path)
+    df = _frame()
+    dfs = {"a": df, "b": df.iloc[10:20]}
+
+    assert cache.set("frame", df)
+    assert cache.set("frames", dfs)
+    assert cache.set("other", [1, 2, 3])
+    assert len(list(tmp_path.glob("*.arrow"))) == 3
+
+    assert_frame_equal(cache.get("frame"), df)
+    assert_frame_equal(cache.get("frames")["b"], dfs["b"])
+    assert cache.get("other") == [1, 2, 3]
+
+    cache.delete("frames")
+    assert cache.get("frames") is None
+    assert len(list(tmp_path.glob("*.arrow"))) == 1
+
+    cache.clear()
+    assert not list(tmp_path.iterdir())
+
+
+def test_arrow_cache_mixed_types(tmp_path):
+    """Test that frames Arrow can not convert are still cached."""
+    cache = ArrowFileSystemCache(tmp_path)
+    df = pd.DataFrame({"mode": ["nan", 1, 2.5]})
+
+    assert cache.set("mixed", df)
+    assert not list(tmp_path.glob("*.arrow"))
+    assert_frame_equal(cache.get("mixed"), df)
+
+
+def test_arrow_cache_missing_file(tmp_path):
+    """Test that an entry without its Arrow file is a cache miss."""
+    cache = ArrowFileSystemCache(tmp_path)
+    cache.set("frame", _frame())
+    for file in tmp_path.glob("*.arrow"):
+        os.remove(file)
+
+    assert cache.get("frame") is None
+    assert not cache.has("frame")
+
+
+def test_arrow_cache_lru_eviction(tmp_path):
+    """Test that the least recently used entries are evicted by size."""
+    df = _frame()
+    cache = ArrowFileSystemCache(tmp_path, byte_limit=0)
+    cache.set("size", df)
+    size = sum(file.stat().st_size for file in tmp_path.iterdir())
+    cache.clear()
+
+    cache = ArrowFileSystemCache(tmp_path, byte_limit=2.5 * size)
+    cache.set("a", df)
+    for file in tmp_path.iterdir():
+        os.utime(file, (0, 0))
+    cache.set("b", df)
+    for file in tmp_path.iterdir():
+        if file.stat().st_mtime > 1:
+            os.utime(file, (1, 1))
+    cache.get("a")  # Reading "a" makes "b" the least recently used
+    cache.set("c", df)
+
+    assert cache.has("a")
+    assert not cache.has("b")
+    assert cache.has("c")
+
+
+def test_shared_table_store(tmp_path):
+    """Test that tables are published once and attached by other workers."""
+    src = tmp_path.joinpath("table.csv")
+    _frame().to_csv(src, index=False)
+    calls = []
+
+    def loader(file, columns=None):
+        calls.append(file)
+        return pd.read_csv(file, usecols=columns)
+
+    store = SharedTableStore(tmp_path.joinpath("tables"))
+    assert not store.has(src, loader, columns=["capacity"])
+    df = store.load(src, loader, columns=["capacity"])
+    assert list(df.columns) == ["capacity"]
+    assert len(calls) == 1
+    assert store.has(src, loader, columns=["capacity"])
+    assert not store.has(src, loader)
+    assert not store.has(tmp_path.joinpath("missing.csv"), loader)
+
+    # A second worker attaches to the published table
+    other = SharedTableStore(tmp_path.joinpath("tables"))
+    assert other.has(src, loader, columns=["capacity"])
+    assert_frame_equal(other.load(src, loader, columns=["capacity"]), df)
+    assert len(calls) == 1
+    assert len(list(store.directory.glob("*.lease"))) == 1
+
+    # Editing the source file publishes a new table
+    _frame(10).to_csv(src, index=False)
+    assert other.load(src, loader, columns=["capacity"]).shape[0] == 10
+    assert len(calls) == 2
+
+
+def test_shared_table_store_eviction(tmp_path):
+    """Test that only tables without live leases are evicted."""
+    store = SharedTableStore(tmp_path.joinpath("tables"), max_attached=1)
+    srcs = []
+    for i in range(3):
+        srcs.append(tmp_path.joinpath(f"table_{i}.csv"))
+        _frame().to_csv(srcs[-1], index=False)
+
+    store.load(srcs[0], pd.read_csv)
+    store.load(srcs[1], pd.read_csv)  # Releases the first table
+    assert len(list(store.directory.glob("*.lease"))) == 1
+
+    # Another (live) worker still holds a lease on the first table
+    first = min(store.directory.glob("*.arrow"), key=os.path.getmtime)
+    stem = first.name.split(".")[0]
+    lease = first.with_name(f"{stem}.{os.getppid()}.lease")
+    lease.touch()
+
+    store.byte_limit = 1
+    store.load(srcs[2], pd.read_csv)
+    assert first.exists()
+    assert len(list(store.directory.glob("*.arrow"))) == 2
+
+    lease.unlink()
+    store.load(srcs[1], pd.read_csv)
+    assert not first.exists()
+
+
+def test_single_flight(tmp_path):
+    """Test that concurrent calls with the same key run only once."""
+    cache = Cache(
+        Flask(__name__),
+        config={
+            "CACHE_TYPE": "reView.utils.cache.ArrowFileSystemCache",
+            "CACHE_DIR": tmp_path.joinpath("cache"),
+        }
+    )
+    calls = []
+
+    @single_flight(tmp_path.joinpath("locks"))
+    @cache.memoize()
+    def build(nrows):
+        calls.append(nrows)
+        time.sleep(0.2)
+        return _frame(nrows)
+
+    with ThreadPoolExecutor(4) as pool:
+        dfs = list(pool.map(build, [10, 10, 10, 20]))
+
+    assert sorted(calls) == [10, 20]
+    assert all(df.shape[0] == 10 for df in dfs[:3])
+    assert cache.has(build.cache_key(10))
+    assert not cache.has(build.cache_key(5))
+    assert build.uncached(5).shape[0] == 5
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """Characterizations unit tests."""
 import json
+from collections import Counter
 
 import numpy as np
 import pytest
@@ -9,7 +10,7 @@ from pandas.testing import assert_frame_equal
 
 from reView.utils.characterizations import (
     unpack_characterizations, validate_characterization_remapper,
-    recast_categories
+    recast_categories, CharacterizationMatrix
 )
 
 
@@ -190,5 +191,42 @@ def test_recast_categories_recast_to_area(char_map):
         )
 
 
+def test_characterization_matrix(characterization_supply_curve):
+    """
+    Test that CharacterizationMatrix gives the same modes, removed cells,
+    and category totals as parsing each JSON string on its own.
+    """
+
+    in_df = pd.read_csv(characterization_supply_curve)
+    series = in_df["nlcd_2019_90x90"].copy()
+    series.iloc[0] = np.nan
+    series.iloc[1] = "{}"
+    dicts = [json.loads(x) if isinstance(x, str) else {} for x in series]
+
+    matrix = CharacterizationMatrix.from_series(series)
+    assert CharacterizationMatrix.from_series(series.copy()) is matrix
+
+    modes = [Counter(d).most_common()[0][0] if d else "nan" for d in dicts]
+    assert list(matrix.modes()) == modes
+
+    keep = ["41", "42"]
+    removed = [sum(v for k, v in d.items() if k not in keep) for d in dicts]
+    assert np.allclose(matrix.removed_cells(keep), removed)
+
+    totals = {}
+    for dct in dicts:
+        for key, value in dct.items():
+            totals[key] = totals.get(key, 0) + value
+    sums = matrix.sums()
+    assert list(sums.index) == list(totals)
+    assert np.allclose(sums.values, list(totals.values()))
+
+    index = series.index[::-3]
+    subset = matrix.subset(index)
+    assert list(subset.modes()) == [modes[i] for i in index]
+    with pytest.raises(KeyError):
+        matrix.subset(pd.Index([-1]))
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Composite builder tests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from reView.utils.composite import (
+    CompositeBuilder,
+    CompositeManifest,
+    build_composite,
+    composite_digest,
+    ranking_paths,
+    read_tables,
+    read_wins,
+    stream_composite,
+    write_rankings
+)
+
+
+def _scenarios(nscenarios=5, npoints=200, seed=0):
+    """Build scenario tables with ties, missing values and missing points."""
+    rng = np.random.default_rng(seed)
+    dfs = []
+    for i in range(nscenarios):
+        gids = np.sort(rng.choice(npoints, npoints - 20, replace=False))
+        lcoe = rng.integers(20, 30, len(gids)).astype(float)
+        lcoe[rng.random(len(gids)) < 0.1] = np.nan
+        dfs.append(
+            pd.DataFrame(
+                {
+                    "sc_point_gid": gids,
+                    "total_lcoe": lcoe,
+                    "capacity": rng.uniform(0, 100, len(gids)),
+                    "scenario": f"scenario_{i}",
+                }
+            )
+        )
+    return dfs
+
+
+def _expected(dfs, composite_function):
+    """Build the composite by concatenating every scenario table."""
+    bdf = pd.concat(dfs, ignore_index=True)
+    values = bdf["total_lcoe"]
+    if composite_function == "max":
+        values = -values
+    bdf["_key"] = values.fillna(np.inf)
+    bdf = bdf.sort_values(["sc_point_gid", "_key"], kind="stable")
+    bdf = bdf.drop_duplicates("sc_point_gid").drop(columns="_key")
+    return bdf.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("composite_function", ["min", "max"])
+def test_composite_builder(composite_function):
+    """Test that folding scenarios matches a single concatenated pass."""
+    dfs = _scenarios()
+    builder = CompositeBuilder(composite_function=composite_function)
+    for df in dfs:
+        builder.add(df)
+
+    out = builder.result()
+
+    pd.testing.assert_frame_equal(out, _expected(dfs, composite_function))
+    assert out["sc_point_gid"].is_unique
+
+
+def test_stream_composite(tmp_path):
+    """Test that scenarios read from disk are composited in order."""
+    dfs = _scenarios(nscenarios=4)
+    paths = []
+    for df in dfs:
+        paths.append(tmp_path.joinpath(f"{df['scenario'].iloc[0]}_sc.csv"))
+        df.drop(columns="scenario").to_csv(paths[-1], index=False)
+
+    tables = list(read_tables(paths, reader=pd.read_csv, prefetch=2))
+    assert [table.shape[0] for table in tables] == [180] * 4
+
+    out = stream_composite(paths)
+    expected = _expected(dfs, "min")
+    assert np.array_equal(out["scenario"], expected["scenario"])
+    assert np.allclose(out["capacity"], expected["capacity"])
+
+
+def test_composite_rankings(tmp_path):
+    """Test per-point rankings, spreads and scenario win counts."""
+    dfs = _scenarios()
+    builder = CompositeBuilder(k=3)
+    for df in dfs:
+        builder.add(df)
+
+    # The top ranked rows are the composite itself
+    expected = _expected(dfs, "min")
+    pd.testing.assert_frame_equal(builder.result(), expected)
+
+    rankings = builder.rankings()
+    bdf = pd.concat(dfs, ignore_index=True)
+    for gid in [0, 57, 199]:
+        rows = bdf[bdf["sc_point_gid"] == gid]
+        rows = rows.assign(_key=rows["total_lcoe"].fillna(np.inf))
+        rows = rows.sort_values("_key", kind="stable").iloc[:3]
+        ranked = rankings[rankings["sc_point_gid"] == gid].iloc[0]
+        for rank, (_, row) in enumerate(rows.iterrows(), start=1):
+            assert ranked[f"scenario_{rank}"] == row["scenario"]
+        spread = abs(rows["total_lcoe"].iloc[1] - rows["total_lcoe"].iloc[0])
+        assert np.isclose(ranked["total_lcoe_spread"], spread,
+                          equal_nan=True)
+
+    wins = builder.wins()
+    assert wins.sum() == expected.shape[0]
+    assert wins.to_dict() == expected["scenario"].value_counts().to_dict()
+    assert wins.is_monotonic_decreasing
+
+    write_rankings(builder, tmp_path.joinpath("composite_sc.csv"))
+    paths = ranking_paths(tmp_path.joinpath("composite_sc.csv"))
+    written = pd.read_feather(paths["rankings"])
+    assert list(written.columns) == list(rankings.columns)
+    assert written["total_lcoe_spread"].equals(rankings["total_lcoe_spread"])
+    pd.testing.assert_series_equal(
+        read_wins(tmp_path.joinpath("composite_sc.csv")), wins
+    )
+    assert read_wins(tmp_path.joinpath("other_sc.csv")) is None
+
+
+@pytest.mark.parametrize("content_hash", [False, True])
+def test_composite_manifest(tmp_path, content_hash):
+    """Test that composites go stale when their inputs change."""
+    paths = []
+    for i, df in enumerate(_scenarios(nscenarios=2)):
+        paths.append(tmp_path.joinpath(f"scenario_{i}_sc.csv"))
+        df.to_csv(paths[-1], index=False)
+    dst = tmp_path.joinpath("review_outputs", "composite_sc.csv")
+    manifest = CompositeManifest(dst.parent, content_hash=content_hash)
+    args = (paths, "min", "total_lcoe")
+
+    assert not manifest.is_current(dst, *args)
+    dst.parent.mkdir()
+    builder = build_composite(paths)
+    builder.result().to_csv(dst, index=False)
+    write_rankings(builder, dst)
+    assert not manifest.is_current(dst, *args)
+
+    manifest.record(dst, *args)
+    assert manifest.is_current(dst, *args)
+    assert manifest.is_current(dst, paths[::-1], "min", "total_lcoe")
+    assert not manifest.is_current(dst, paths, "max", "total_lcoe")
+    assert not manifest.is_current(dst, paths[:1], "min", "total_lcoe")
+
+    # Regenerating an input makes the composite stale
+    pd.read_csv(paths[0]).iloc[:10].to_csv(paths[0], index=False)
+    assert not manifest.is_current(dst, *args)
+
+    assert composite_digest(*args) == composite_digest(paths[::-1], "min",
+                                                       "total_lcoe")
+    assert composite_digest(*args) != composite_digest(paths, "max",
+                                                       "total_lcoe")
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Chart decimation tests."""
+import numpy as np
+import pandas as pd
+
+from reView.utils.decimate import (
+    ChartIndex,
+    decimate,
+    grid_sample,
+    minmax_buckets,
+    read_chart_index,
+    store_chart_index
+)
+
+
+def test_minmax_buckets():
+    """Test that the envelope keeps the extremes of each bucket."""
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(0, 10, 50_000))
+    y = np.sort(rng.lognormal(3, 1, 50_000))
+    y[::1_000] = np.nan
+
+    keep = minmax_buckets(x, y, 500)
+
+    assert len(keep) <= 1_000
+    assert np.all(np.diff(keep) > 0)
+    assert np.all(np.isfinite(y[keep]))
+    assert np.nanmin(y) in y[keep] and np.nanmax(y) in y[keep]
+    valid = np.flatnonzero(np.isfinite(y))
+    assert valid[0] in keep and valid[-1] in keep
+
+
+def test_grid_sample():
+    """Test that the grid sample fits the budget and keeps outliers."""
+    rng = np.random.default_rng(1)
+    x = np.r_[rng.normal(size=100_000), 50]
+    y = np.r_[rng.normal(size=100_000), -50]
+
+    keep = grid_sample(x, y, 100)
+
+    assert len(keep) <= 100 * 100
+    assert len(np.unique(keep)) == len(keep)
+    assert 100_000 in keep
+
+
+def test_buckets_offset():
+    """Test that data far from zero is spread over every bucket."""
+    rng = np.random.default_rng(4)
+    x = rng.uniform(1_000, 1_010, 100_000)
+    y = rng.uniform(size=100_000)
+    assert len(minmax_buckets(x, y, 5_000)) == 10_000
+
+    lons = rng.uniform(-124, -67, 100_000)
+    lats = rng.uniform(25, 49, 100_000)
+    assert len(grid_sample(lons, lats, 141)) > 15_000
+
+    empty = np.array([])
+    assert len(minmax_buckets(empty, empty, 10)) == 0
+    assert len(grid_sample(empty, empty, 10)) == 0
+
+
+def test_decimate():
+    """Test that each group gets a share of the point budget."""
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame(
+        {
+            "x": rng.uniform(size=30_000),
+            "y": rng.uniform(size=30_000),
+            "group": np.repeat(["a", "b", "c"], 10_000),
+        }
+    )
+
+    assert decimate(df, "x", "y", "group", max_points=30_000) is df
+    for method in ["envelope", "grid"]:
+        out = decimate(df, "x", "y", "group", max_points=6_000,
+                       method=method)
+        counts = out["group"].value_counts()
+        assert set(counts.index) == {"a", "b", "c"}
+        assert counts.max() <= 2_000
+        assert out.index.is_monotonic_increasing
+
+
+def test_chart_index():
+    """Test box and lasso selections against every point."""
+    rng = np.random.default_rng(3)
+    x, y = rng.uniform(0, 10, 10_000), rng.uniform(0, 10, 10_000)
+    gids = np.arange(10_000) % 5_000
+    index = ChartIndex(x, y, gids)
+
+    box = {"points": [], "range": {"x": [6, 2], "y": [3, 5]}}
+    inside = (x >= 2) & (x <= 6) & (y >= 3) & (y <= 5)
+    assert np.array_equal(index.select(box), np.unique(gids[inside]))
+
+    lasso = {"points": [], "lassoPoints": {"x": [0, 10, 0], "y": [0, 0, 10]}}
+    inside = x + y < 10
+    assert np.array_equal(index.select(lasso), np.unique(gids[inside]))
+
+    assert index.select({"points": [{"customdata": [1]}]}) is None
+
+
+def test_store_chart_index():
+    """Test that stored chart points read back as the same index."""
+    points = pd.DataFrame(
+        {"x": [0.0, 1.0, 2.0], "y": [1.0, 2.0, 3.0], "sc_point_gid": [4, 5, 6]}
+    )
+    key = store_chart_index(points)
+    assert store_chart_index(points.copy()) == key
+
+    index = read_chart_index(key)
+    selection = {"range": {"x": [0.5, 2], "y": [0, 5]}}
+    assert list(index.select(selection)) == [5, 6]
+    assert store_chart_index(None) is None
+    assert read_chart_index(None) is None
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Demand allocation tests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from reView.utils.demand import allocate_supply
+
+
+def _sites(nsites=2_000, nloads=50, seed=0):
+    """Random sites assigned to load centers."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(nsites),
+            "h2_load_id": rng.integers(0, nloads, nsites),
+            "total_lcoh_fcr": rng.uniform(1, 10, nsites),
+            "hydrogen_annual_kg": rng.uniform(1e3, 1e5, nsites),
+        }
+    )
+    demand = pd.Series(rng.uniform(0, 1e6, nloads))
+    demand.iloc[:5] = 10  # Smaller than any site's supply
+    return df, demand
+
+
+def _allocate_loop(df, demand, include_marginal):
+    """Allocate sites one load center at a time."""
+    kept = []
+    for load_id in df["h2_load_id"].unique():
+        sub = df[df["h2_load_id"] == load_id].sort_values("total_lcoh_fcr")
+        supply = sub["hydrogen_annual_kg"].cumsum().values
+        if include_marginal:
+            met = np.where(supply >= demand[load_id])[0]
+            if met.size > 0:
+                sub = sub.iloc[:met.min() + 1]
+        else:
+            within = np.where(supply <= demand[load_id])[0]
+            if within.size > 0:
+                sub = sub.iloc[:within.max() + 1]
+        kept.append(sub)
+    return pd.concat(kept)
+
+
+@pytest.mark.parametrize("include_marginal", [False, True])
+def test_allocate_supply(include_marginal):
+    """Test that one grouped pass matches allocating each load center."""
+    df, demand = _sites()
+    out = allocate_supply(df, demand, include_marginal=include_marginal)
+    expected = _allocate_loop(df, demand, include_marginal)
+
+    assert set(out["sc_point_gid"]) == set(expected["sc_point_gid"])
+    for load_id, group in out.groupby("h2_load_id"):
+        assert group["total_lcoh_fcr"].is_monotonic_increasing
+        assert np.allclose(group["h2_supply"],
+                           group["hydrogen_annual_kg"].cumsum())
+        if include_marginal:
+            assert (group["h2_supply"].iloc[:-1] < demand[load_id]).all()
+
+    # Load centers smaller than their cheapest site keep every site
+    small = df[df["h2_load_id"] < 5]
+    if not include_marginal:
+        assert set(small["sc_point_gid"]) <= set(out["sc_point_gid"])
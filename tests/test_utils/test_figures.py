@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Figure compaction tests."""
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from plotly.utils import PlotlyJSONEncoder
+
+from reView.utils.figures import compact_figure
+
+
+def _decode(spec):
+    """Decode a typed array spec."""
+    values = np.frombuffer(base64.b64decode(spec["bdata"]), spec["dtype"])
+    if "shape" in spec:
+        values = values.reshape([int(n) for n in spec["shape"].split(",")])
+    return values
+
+
+def _map_figure(npoints=1_000, seed=0):
+    """Scatter map with per-point data and a constant marker size."""
+    rng = np.random.default_rng(seed)
+    return go.Figure(
+        go.Scattermapbox(
+            lat=rng.uniform(25, 49, npoints),
+            lon=rng.uniform(-124, -67, npoints),
+            customdata=np.column_stack([np.arange(npoints) + 10_000_000,
+                                        rng.uniform(0, 200, npoints)]),
+            marker={"color": rng.uniform(20, 80, npoints),
+                    "size": np.full(npoints, 5)},
+            selectedpoints=[0],
+        )
+    )
+
+
+def test_compact_figure_typed_arrays():
+    """Test that numeric arrays round trip through typed arrays."""
+    figure = _map_figure()
+    original = figure.data[0]
+    trace = compact_figure(figure, decimals={"lat": 5, "lon": 5},
+                           typed_arrays=True)["data"][0]
+
+    assert trace["lat"]["dtype"] == "f4"
+    assert np.allclose(_decode(trace["lat"]), original.lat, atol=1e-4)
+    assert np.allclose(_decode(trace["marker"]["color"]),
+                       original.marker.color, atol=1e-4)
+
+    # Site IDs in custom data keep every digit
+    customdata = _decode(trace["customdata"])
+    assert customdata.shape == (1_000, 2)
+    assert np.array_equal(customdata[:, 0], original.customdata[:, 0])
+
+    # Constant styles are sent once and other attributes are untouched
+    assert trace["marker"]["size"] == 5
+    assert list(trace["selectedpoints"]) == [0]
+
+    before = json.dumps(figure, cls=PlotlyJSONEncoder)
+    after = json.dumps(compact_figure(figure, typed_arrays=True),
+                       cls=PlotlyJSONEncoder)
+    assert len(after) < 0.6 * len(before)
+
+
+def test_compact_figure_rounding():
+    """Test rounding to display precision without typed arrays."""
+    figure = _map_figure()
+    trace = compact_figure(figure, decimals={"lat": 5, "lon": 5},
+                           typed_arrays=False)["data"][0]
+
+    assert np.array_equal(trace["lat"], np.round(figure.data[0].lat, 5))
+    color = np.asarray(trace["marker"]["color"])
+    assert np.allclose(color, figure.data[0].marker.color, atol=1e-4)
+    assert not np.array_equal(color, figure.data[0].marker.color)
+
+
+def test_compact_figure_customdata_columns():
+    """Test that each custom data column keeps its own precision."""
+    customdata = np.column_stack([np.arange(1_000) + 100_000,
+                                  np.full(1_000, 0.4131),
+                                  np.full(1_000, 12.3456)])
+    figure = go.Figure(go.Scattermapbox(lat=np.arange(1_000),
+                                        customdata=customdata))
+    for typed_arrays in [True, False]:
+        trace = compact_figure(figure, typed_arrays=typed_arrays)["data"][0]
+        values = trace["customdata"]
+        if typed_arrays:
+            values = _decode(values)
+        assert np.allclose(values, customdata)
+
+
+def test_compact_figure_non_numeric():
+    """Test that dates and text are left as they are."""
+    dates = pd.date_range("2012-01-01", periods=24, freq="h")
+    figure = go.Figure(
+        go.Scatter(x=dates, y=np.arange(24.5, 48.5),
+                   text=[f"Hour {i}" for i in range(24)])
+    )
+    trace = compact_figure(figure, typed_arrays=True)["data"][0]
+
+    assert np.array_equal(trace["x"], figure.data[0].x)
+    assert list(trace["text"]) == list(figure.data[0].text)
+    assert np.array_equal(_decode(trace["y"]), np.arange(24.5, 48.5))
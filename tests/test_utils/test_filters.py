@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Filter compiler tests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from reView.utils.filters import compile_filters, filter_columns, filter_mask
+
+
+@pytest.fixture(name="table")
+def fixture_table():
+    """Small supply curve-like table."""
+    return pd.DataFrame(
+        {
+            "capacity": [5.0, 10.0, 20.0, 40.0, np.nan],
+            "mean_cf": [0.1, 0.2, 0.3, 0.4, 0.5],
+            "state": ["Colorado", "Utah", "Texas", "Utah", None],
+            "2016_30m_cdls": [1, 2, 3, 4, 5],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        (["capacity >= 10"], [0, 1, 1, 1, 0]),
+        (["capacity >= 10", "mean_cf < 0.4"], [0, 1, 1, 0, 0]),
+        (["capacity > 5 and < 40"], [0, 1, 1, 0, 0]),
+        (["capacity between 10 and 20"], [0, 1, 1, 0, 0]),
+        (["capacity < 10 or mean_cf >= 0.4"], [1, 0, 0, 1, 1]),
+        (["capacity < 10 or (mean_cf > 0.1 and not state == Utah)"],
+         [1, 0, 1, 0, 1]),
+        (["state in ('Utah', \"Texas\")"], [0, 1, 1, 1, 0]),
+        (["state not in Utah, Texas"], [1, 0, 0, 0, 1]),
+        (["capacity is null"], [0, 0, 0, 0, 1]),
+        (["capacity IS NOT NULL"], [1, 1, 1, 1, 0]),
+        (["state != Utah"], [1, 0, 1, 0, 1]),
+        (["2016_30m_cdls >= 2e0"], [0, 1, 1, 1, 1]),
+        (["not_a_column < 0 or capacity > 30"], [0, 0, 0, 1, 0]),
+        (["not not_a_column < 0", ""], [1, 1, 1, 1, 1]),
+    ],
+)
+def test_filter_mask(table, filters, expected):
+    """Test that compiled filters keep the expected rows."""
+    keep = filter_mask(table, filters)
+    assert keep.dtype == bool
+    assert np.array_equal(keep, np.array(expected, dtype=bool))
+
+
+def test_compile_filters_cached():
+    """Test that filters are compiled once and report their columns."""
+    filters = ("capacity > 5 and mean_cf < 1", "state in (Utah)")
+    assert compile_filters(filters) is compile_filters(filters)
+    assert filter_columns(list(filters)) == {"capacity", "mean_cf", "state"}
+
+
+@pytest.mark.parametrize(
+    "filter_",
+    ["> 10", "capacity", "capacity >=", "capacity between 1 or 2",
+     "capacity > 1 )", "capacity in (1, 2", "capacity is 3"],
+)
+def test_compile_filters_invalid(filter_):
+    """Test that malformed filters raise a ValueError."""
+    with pytest.raises(ValueError):
+        compile_filters((filter_,))
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 """Util function tests."""
+from concurrent.futures import ThreadPoolExecutor
+
+import h5py
+import numpy as np
 import pytest
 import pandas as pd
+from pandas.testing import assert_frame_equal
 
 from reView.utils.functions import (
     convert_to_title,
@@ -14,8 +19,11 @@ from reView.utils.functions import (
     shorten,
     as_float,
     safe_convert_percentage_to_decimal,
-    find_capacity_column
+    find_capacity_column,
+    read_file,
+    to_sarray
 )
+from reView.utils.sidecars import sidecar_path, write_sidecar
 
 
 @pytest.mark.parametrize(
@@ -236,3 +244,79 @@ def test_find_capacity_column_none_found(map_supply_curve_solar):
     candidates = ["capacity", "capacity_mw"]
     with pytest.raises(ValueError):
         find_capacity_column(solar_df, cap_col_candidates=candidates)
+
+
+@pytest.mark.parametrize("ext", [".csv", ".parquet", ".h5"])
+def test_read_file_columns(data_dir_test, tmp_path, ext):
+    """Test that `read_file` only reads in the requested columns."""
+    src = data_dir_test / "hydrogen" / "sample_data" / "scenario_0.csv"
+    df = pd.read_csv(src)
+    dst = tmp_path / f"scenario_0{ext}"
+    if ext == ".csv":
+        df.to_csv(dst, index=False)
+    elif ext == ".parquet":
+        df.to_parquet(dst, index=False)
+    else:
+        meta = df[["sc_point_gid", "capacity", "mean_cf", "state"]]
+        array, dtypes = to_sarray(meta)
+        with h5py.File(dst, "w") as file:
+            file.create_dataset("meta", data=array, dtype=dtypes)
+
+    columns = ["sc_point_gid", "capacity", "state", "not_a_column"]
+    data = read_file(dst, columns=columns)
+
+    assert set(data.columns) == {"sc_point_gid", "capacity", "state",
+                                 "scenario"}
+    assert data.shape[0] == df.shape[0]
+    assert (data["capacity"].values == df["capacity"].values).all()
+
+    data = read_file(dst, nrows=1, columns=columns)
+    assert data.shape[0] == 1
+    assert "mean_cf" not in data
+
+    assert "mean_cf" in read_file(dst)
+
+
+def test_read_file_sidecar(data_dir_test, tmp_path):
+    """Test that CSVs are read through an up-to-date Parquet sidecar."""
+    src = data_dir_test / "hydrogen" / "sample_data" / "scenario_0.csv"
+    dst = tmp_path / "scenario_0.csv"
+    df = pd.read_csv(src)
+    df.loc[0, "state"] = None
+    df.to_csv(dst, index=False)
+
+    # Peeking at the first few rows does not write a sidecar
+    read_file(dst, nrows=5)
+    assert not sidecar_path(dst).exists()
+
+    first = read_file(dst)
+    sidecar = sidecar_path(dst)
+    assert sidecar.exists()
+
+    second = read_file(dst)
+    assert_frame_equal(first, second)
+    assert np.isnan(second["state"].iloc[0])
+
+    data = read_file(dst, columns=["sc_point_gid", "capacity"])
+    assert set(data.columns) == {"sc_point_gid", "capacity", "scenario"}
+
+    # Editing the CSV replaces the stale sidecar
+    df.iloc[:2].to_csv(dst, index=False)
+    assert read_file(dst).shape[0] == 2
+    assert not sidecar.exists()
+    assert sidecar_path(dst).exists()
+
+
+def test_write_sidecar_concurrent(data_dir_test):
+    """Test that concurrent writers of one sidecar do not collide."""
+    src = data_dir_test / "hydrogen" / "sample_data" / "scenario_0.csv"
+    df = pd.read_csv(src)
+
+    with ThreadPoolExecutor(8) as pool:
+        paths = list(pool.map(
+            lambda __: write_sidecar(src, df, overwrite=True), range(16)
+        ))
+
+    assert set(paths) == {sidecar_path(src)}
+    assert not list(paths[0].parent.glob("*.tmp"))
+    assert_frame_equal(pd.read_parquet(paths[0]), df)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Background job queue tests."""
+import json
+import os
+import time
+
+import pytest
+
+from reView.utils.jobs import JobQueue, report_progress
+
+
+def _count_rows(path, steps=3, delay=0.1):
+    """Record a run, report progress, and return the number of runs."""
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("run\n")
+    for step in range(steps):
+        time.sleep(delay)
+        report_progress(step + 1, steps)
+    with open(path, encoding="utf-8") as file:
+        return len(file.readlines())
+
+
+def _fail():
+    """Raise an error."""
+    raise ValueError("bad inputs")
+
+
+def _wait(queue, job_id, timeout=60):
+    """Wait for a job to finish and return its status."""
+    start = time.time()
+    while time.time() - start < timeout:
+        status = queue.status(job_id)
+        if status["status"] not in ("queued", "running"):
+            return status
+        time.sleep(0.1)
+    raise TimeoutError(job_id)
+
+
+def test_job_queue(tmp_path):
+    """Test that jobs run once in the background and report results."""
+    queue = JobQueue(tmp_path.joinpath("jobs"), max_workers=2)
+    runs = tmp_path.joinpath("runs.txt")
+
+    job_id = queue.submit(_count_rows, str(runs), delay=0.5)
+    assert queue.submit(_count_rows, str(runs), delay=0.5) == job_id
+    assert queue.status(job_id)["status"] in ("queued", "running")
+
+    status = _wait(queue, job_id)
+    assert status["status"] == "done"
+    assert status["progress"] == 1
+    assert queue.result(job_id) == 1
+
+    # Finished jobs run again when resubmitted
+    assert queue.submit(_count_rows, str(runs), delay=0.5) == job_id
+    assert _wait(queue, job_id)["result"] == 2
+
+    failed = queue.submit(_fail)
+    status = _wait(queue, failed)
+    assert status["status"] == "failed"
+    assert "bad inputs" in status["error"]
+    with pytest.raises(RuntimeError):
+        queue.result(failed)
+
+    assert queue.status("missing")["status"] == "missing"
+
+
+def test_job_queue_dead_process(tmp_path):
+    """Test that jobs of processes that exited are marked as failed."""
+    queue = JobQueue(tmp_path)
+    job_id = queue.job_id(_fail)
+    status = {"id": job_id, "status": "running", "pid": 2 ** 22 + 1}
+    with open(tmp_path.joinpath(f"{job_id}.json"), "w",
+              encoding="utf-8") as file:
+        json.dump(status, file)
+
+    assert queue.status(job_id)["status"] == "failed"
+
+
+def test_job_queue_prune(tmp_path):
+    """Test that old finished jobs and unsent downloads are removed."""
+    queue = JobQueue(tmp_path, max_age=60)
+    old = queue.downloads.joinpath("old.gpkg")
+    new = queue.downloads.joinpath("new.gpkg")
+    old.touch()
+    new.touch()
+    stale = time.time() - 120
+    os.utime(old, (stale, stale))
+
+    job_id = queue.submit(_fail)
+    assert _wait(queue, job_id)["status"] == "failed"
+    os.utime(tmp_path.joinpath(f"{job_id}.json"), (stale, stale))
+
+    queue.submit(_count_rows, str(tmp_path.joinpath("runs.txt")), steps=0)
+    assert not old.exists()
+    assert new.exists()
+    assert queue.status(job_id)["status"] == "missing"
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Level-of-detail map rendering tests."""
+import numpy as np
+import pandas as pd
+
+from reView.utils.lod import (
+    LevelOfDetail,
+    aggregate_grid,
+    build_pyramid,
+    cell_size,
+    map_view
+)
+
+
+def _sites(nsites=5_000, seed=0):
+    """Random sites over the contiguous US."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "sc_point_gid": np.arange(nsites),
+            "latitude": rng.uniform(25, 49, nsites),
+            "longitude": rng.uniform(-124, -67, nsites),
+            "capacity": rng.uniform(0, 100, nsites),
+            "mean_lcoe": rng.uniform(20, 80, nsites),
+        }
+    )
+    df.loc[:9, "mean_lcoe"] = np.nan
+    return df
+
+
+def _relayout(lon_min, lon_max, lat_min, lat_max, zoom):
+    """Map relayoutData for a view."""
+    return {
+        "mapbox.center": {"lon": (lon_min + lon_max) / 2,
+                          "lat": (lat_min + lat_max) / 2},
+        "mapbox.zoom": zoom,
+        "mapbox._derived": {
+            "coordinates": [[lon_min, lat_max], [lon_max, lat_max],
+                            [lon_max, lat_min], [lon_min, lat_min]]
+        },
+    }
+
+
+def test_aggregate_grid():
+    """Test that cells total and average the sites in them."""
+    df = _sites()
+    grid = aggregate_grid(df, "mean_lcoe", level=3)
+
+    size = cell_size(3)
+    cells = [np.floor(df["longitude"].values / size),
+             np.floor(df["latitude"].values / size)]
+    expected = df.groupby(cells).agg(
+        site_count=("capacity", "size"),
+        capacity=("capacity", "sum"),
+        mean_lcoe=("mean_lcoe", "mean"),
+        latitude=("latitude", "mean"),
+    )
+    grid = grid.sort_values(["site_count", "capacity"])
+    expected = expected.sort_values(["site_count", "capacity"])
+
+    assert grid["site_count"].sum() == len(df)
+    assert len(grid) == len(expected)
+    for col in ["site_count", "capacity", "mean_lcoe", "latitude"]:
+        assert np.allclose(grid[col], expected[col], equal_nan=True)
+    assert (grid["sc_point_gid"] == -1).all()
+
+
+def test_build_pyramid():
+    """Test that the pyramid stops once cells stop aggregating sites."""
+    df = _sites()
+    pyramid = build_pyramid(df, "mean_lcoe")
+    counts = pyramid.groupby("lod_level").size()
+
+    assert counts.index[0] == 0
+    assert counts.is_monotonic_increasing
+    assert counts.iloc[-1] >= 0.8 * len(df)
+    assert counts.iloc[:-1].max() < 0.8 * len(df)
+
+
+def test_map_view():
+    """Test reading map views from relayoutData."""
+    view = map_view(_relayout(-100, -90, 30, 40, 5))
+    assert view == {"zoom": 5, "bounds": [-100, -90, 30, 40]}
+
+    view = map_view({"mapbox.center": {"lon": 0, "lat": 0},
+                     "mapbox.zoom": 0})
+    assert view["bounds"][0] < -180 and view["bounds"][1] > 180
+
+    assert map_view({"autosize": True}) is None
+    assert map_view(None) is None
+
+
+def test_level_of_detail():
+    """Test drawing cells, then sites in view, as the map zooms in."""
+    df = _sites()
+    lod = LevelOfDetail(df, "mean_lcoe", max_points=1_000)
+    assert LevelOfDetail(df, "mean_lcoe").enabled is False
+
+    grid, state = lod.render()
+    assert state == {"level": 2, "bounds": None}
+    assert grid["site_count"].sum() == len(df)
+    assert len(grid) < 1_000
+
+    # Zooming in within the same level needs nothing new
+    view = map_view(_relayout(-124, -67, 25, 49, 2.5))
+    assert not lod.needs_update(state, view)
+
+    # A small enough view draws its sites at full resolution
+    view = map_view(_relayout(-100, -95, 35, 40, 6))
+    assert lod.needs_update(state, view)
+    points, state = lod.render(view)
+    assert state["level"] == "points"
+    assert points["sc_point_gid"].is_unique
+    assert points["longitude"].between(*state["bounds"][:2]).all()
+    assert len(points) <= 1_000
+
+    # Which only changes when the view leaves the padded area drawn
+    view = map_view(_relayout(-99, -96, 36, 39, 7))
+    assert not lod.needs_update(state, view)
+    view = map_view(_relayout(-110, -105, 35, 40, 6))
+    assert lod.needs_update(state, view)
+
+    # Cached pyramid levels match cells aggregated on demand
+    pyramid = build_pyramid(df, "mean_lcoe")
+    cached = LevelOfDetail(df, "mean_lcoe", pyramid, max_points=1_000)
+    cells, __ = cached.render()
+    assert np.allclose(np.sort(cells["capacity"]), np.sort(grid["capacity"]))
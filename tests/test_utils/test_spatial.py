@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Spatial index tests."""
+import numpy as np
+import pandas as pd
+
+import reView.utils.config
+from reView.utils.config import Config
+from reView.utils.spatial import (
+    EARTH_RADIUS_KM,
+    HaversineIndex,
+    SiteIndex,
+    compact_selection
+)
+
+
+def _haversine(lat, lon, lats, lons):
+    """Brute force haversine distances (km)."""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = (np.sin((lats - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _points(npoints=2_000, seed=0):
+    """Random points over the contiguous US."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "latitude": rng.uniform(25, 49, npoints),
+            "longitude": rng.uniform(-124, -67, npoints),
+        }
+    )
+
+
+def test_haversine_index():
+    """Test nearest and radius queries against brute force distances."""
+    df = _points()
+    index = HaversineIndex.from_frame(df)
+    queries = _points(20, seed=1).values
+
+    dists, inds = index.nearest(queries, k=3)
+    assert dists.shape == inds.shape == (20, 3)
+    for (lat, lon), dist, ind in zip(queries, dists, inds):
+        expected = _haversine(lat, lon, df["latitude"], df["longitude"])
+        assert np.array_equal(ind, np.argsort(expected.values)[:3])
+        assert np.allclose(dist, np.sort(expected.values)[:3])
+
+    dists, inds = index.within(queries, 150)
+    for (lat, lon), dist, ind in zip(queries, dists, inds):
+        expected = _haversine(lat, lon, df["latitude"], df["longitude"])
+        assert set(ind) == set(np.where(expected <= 150)[0])
+        assert np.all(np.diff(dist) >= 0)
+
+    __, inds = index.nearest(queries[0])
+    assert inds.shape == (1, 1)
+
+
+def test_site_index():
+    """Test site box, lasso, radius and nearest queries."""
+    df = _points()
+    df["sc_point_gid"] = np.arange(len(df)) * 10
+    index = SiteIndex.from_frame(df)
+    lats, lons = df["latitude"], df["longitude"]
+
+    gids = index.bbox((-100, -90), (30, 40))
+    inside = lons.between(-100, -90) & lats.between(30, 40)
+    assert np.array_equal(gids, df["sc_point_gid"][inside])
+
+    # A triangle holds about half of its bounding box
+    lasso = [[-100, 30], [-90, 30], [-100, 40]]
+    gids = index.polygon(*np.array(lasso).T)
+    below = (lats - 30) < (-90 - lons)
+    assert np.array_equal(gids, df["sc_point_gid"][inside & below])
+
+    # Plotly map selections resolve to the same sites
+    box = {"points": [], "range": {"mapbox": [[-100, 40], [-90, 30]]}}
+    assert np.array_equal(index.select(box), index.bbox((-100, -90),
+                                                        (30, 40)))
+    selection = {"points": [{"customdata": [0]}],
+                 "lassoPoints": {"mapbox": lasso}}
+    assert compact_selection(selection) == {"lassoPoints": {"mapbox": lasso}}
+    assert np.array_equal(index.select(compact_selection(selection)), gids)
+    assert index.select({"points": [], "range": {"x": [0, 1]}}) is None
+
+    dists = _haversine(35, -95, lats, lons)
+    gids = index.radius((35, -95), 200)
+    expected = df["sc_point_gid"][dists <= 200]
+    assert np.array_equal(gids,
+                          expected.iloc[np.argsort(dists[dists <= 200])])
+    nearest = index.nearest_sites((35, -95), k=2)
+    assert np.array_equal(nearest[0], gids[:2])
+
+
+def test_config_demand_index(tmp_path, monkeypatch):
+    """Test that the demand index is built once per demand file."""
+    demand_file = tmp_path.joinpath("demand.csv")
+    _points(100).to_csv(demand_file, index=False)
+    monkeypatch.setitem(
+        reView.utils.config.PROJECT_CONFIGS,
+        "Demand",
+        {"project_name": "Demand", "directory": str(tmp_path),
+         "demand_file": str(demand_file)},
+    )
+
+    index = Config("Demand").demand_index
+    assert len(index) == Config("Demand").demand_data.shape[0]
+    assert Config("Demand").demand_index is index